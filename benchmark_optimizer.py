@@ -0,0 +1,178 @@
+import argparse
+import copy
+import io
+import json
+import numpy as np
+import platform
+import pulp as plp
+import scipy
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+from renewable_energy_optimization import SITE_TYPES, SOLVER_BACKENDS, RenewableEnergyOptimizer
+
+# 基準測試的時間解析度: 月份 x TOU 時段 (42)、每日 (365)、每小時 (8,760)、每 10 分鐘 (52,560)
+BENCHMARK_RESOLUTIONS = ["tou", "daily", "hourly", "10min"]
+
+# 預設執行的時間解析度: 10 分鐘解析度的 cbc 與 highs 每次求解約 14-32 秒，完整矩陣需數小時，
+# 需以 --resolutions 明確指定
+DEFAULT_RESOLUTIONS = ["tou", "daily", "hourly"]
+
+# 預設的每次求解時間上限 (秒)，達到時記錄為 "Not Solved"
+DEFAULT_TIME_LIMIT = 60.0
+
+# 預設的可再生能源目標比例 (百分比)，包含不可行的目標
+DEFAULT_TARGET_RATIOS = [10, 50, 90, 150]
+
+# 目標年份與年度用電增長率 (目標值 = 年度用電量 x 目標比例)
+TARGET_YEAR = 2024
+GROWTH_RATE = 0.0
+
+# 記錄中位數的階段時間 (秒)，來自 optimize_portfolio 的 instrumentation
+PHASES = ["alignment", "precheck", "build", "solve", "extraction"]
+
+
+def daily_optimizer(backend):
+    """
+    建立每日解析度 (365 個時段) 的優化器
+
+    優化器沒有每日解析度的數據，改以每小時解析度的供需矩陣依日期加總，
+    其餘求解路徑與每小時解析度相同。
+
+    參數:
+    backend (str): 求解器後端
+
+    返回:
+    RenewableEnergyOptimizer: 供需矩陣已加總為每日的優化器
+    """
+    hourly = RenewableEnergyOptimizer(solver=backend, resolution="hourly")
+    n_days = len(hourly.bucket_index) // 24
+    daily = copy.copy(hourly)
+    daily.bucket_index = hourly.bucket_index.iloc[::24][["month", "day"]].reset_index(drop=True)
+    daily.supply_matrix = hourly.supply_matrix.reshape(n_days, 24, -1).sum(axis=1)
+    daily.demand_matrix = hourly.demand_matrix.reshape(n_days, 24, -1).sum(axis=1)
+    # 每日數據為快照，不隨檔案變更重新載入為每小時數據
+    daily.data_signatures = {}
+    daily.exact_cuts = {}
+    daily.models = {}
+    return daily
+
+
+def _run_once(optimizer, site_type, annual_consumption, target_ratio):
+    """
+    以優化器實際的求解路徑 (optimize_portfolio) 求解一次並返回效能指標
+
+    每次求解前清除精確解法累積的割平面，使重複求解的時間可互相比較。
+
+    返回:
+    dict: optimize_portfolio 的 instrumentation (各階段時間、模型規模、求解器狀態與峰值記憶體)
+    """
+    optimizer.exact_cuts.clear()
+    with redirect_stdout(io.StringIO()):
+        result = optimizer.optimize_portfolio(site_type, annual_consumption, target_ratio, TARGET_YEAR,
+                                              GROWTH_RATE, instrument=True)
+    return result["instrumentation"]
+
+
+def run_benchmark(backends=SOLVER_BACKENDS, resolutions=DEFAULT_RESOLUTIONS, site_types=SITE_TYPES,
+                  target_ratios=DEFAULT_TARGET_RATIOS, annual_consumption=1e8, repeats=3, profile_memory=False,
+                  time_limit=DEFAULT_TIME_LIMIT):
+    """
+    執行基準測試
+
+    每個 (後端, 解析度) 建立一個 RenewableEnergyOptimizer，以 optimize_portfolio 的
+    instrumentation 記錄各階段時間，與使用者實際執行的程式碼相同 (含可行性預檢、
+    依時段數切換的 HiGHS 演算法等)。每日解析度由每小時數據加總 (daily_optimizer)。
+    cbc 與 highs 每次求解以 time_limit 為上限，達到時狀態記錄為 "Not Solved"。
+
+    參數:
+    backends (list): 求解器後端
+    resolutions (list): BENCHMARK_RESOLUTIONS 中的時間解析度
+    site_types (list): 場址類型
+    target_ratios (list): 可再生能源目標比例 (百分比)
+    annual_consumption (float): 年度用電量 (kWh)
+    repeats (int): 每個組合重複次數，記錄各階段時間的中位數
+    profile_memory (bool): 是否另外求解一次量測峰值記憶體 (不影響計時，但基準測試時間加倍)
+    time_limit (float): 每次求解的時間上限 (秒)，None 表示不限制
+
+    返回:
+    dict: metadata 與 results (每個組合一筆)
+    """
+    results = []
+    for resolution in resolutions:
+        for backend in backends:
+            start = time.perf_counter()
+            if resolution == "daily":
+                optimizer = daily_optimizer(backend)
+            else:
+                optimizer = RenewableEnergyOptimizer(solver=backend, resolution=resolution)
+            load_time = time.perf_counter() - start
+            optimizer.solver_msg = False
+            optimizer.profile_memory = profile_memory
+            optimizer.time_limit = time_limit
+            for site_type in site_types:
+                for ratio in target_ratios:
+                    runs = [_run_once(optimizer, site_type, annual_consumption, ratio) for _ in range(repeats)]
+                    record = {
+                        "backend": backend,
+                        "resolution": resolution,
+                        "n_buckets": len(optimizer.bucket_index),
+                        "site_type": site_type,
+                        "target_ratio": ratio,
+                        "load_s": load_time,  # 優化器載入與對齊數據的時間 (每個後端與解析度一次)
+                        "status": runs[-1]["status"],
+                        "solver_status": runs[-1]["solver_status"],
+                        "iterations": runs[-1]["iterations"],
+                        "n_variables": runs[-1]["n_variables"],
+                        "n_constraints": runs[-1]["n_constraints"],
+                        "nonzeros": runs[-1]["nonzeros"],
+                        "peak_memory_bytes": runs[-1]["peak_memory_bytes"]
+                    }
+                    for phase in PHASES:
+                        record[f"{phase}_s"] = float(np.median([run["phases"].get(phase, 0.0) for run in runs]))
+                    record["total_s"] = float(np.median([run["total_time"] for run in runs]))
+                    results.append(record)
+                    print(f"{resolution:>6} {backend:>5} 場址 {site_type} 目標 {ratio:>3}%: "
+                          f"{record['status']:<10} 預檢 {record['precheck_s']:.4f}s 建模 {record['build_s']:.4f}s "
+                          f"求解 {record['solve_s']:.4f}s 整理 {record['extraction_s']:.4f}s")
+
+    metadata = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "pulp": plp.__version__,
+        "annual_consumption": annual_consumption,
+        "target_year": TARGET_YEAR,
+        "growth_rate": GROWTH_RATE,
+        "repeats": repeats,
+        "profile_memory": profile_memory,
+        "time_limit": time_limit
+    }
+    return {"metadata": metadata, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="可再生能源組合優化器基準測試")
+    parser.add_argument("--backends", nargs="+", default=SOLVER_BACKENDS, choices=SOLVER_BACKENDS)
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS, choices=BENCHMARK_RESOLUTIONS,
+                        help="時間解析度 (10min 需明確指定)")
+    parser.add_argument("--target-ratios", nargs="+", type=float, default=DEFAULT_TARGET_RATIOS)
+    parser.add_argument("--annual-consumption", type=float, default=1e8)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--profile-memory", action="store_true", help="另外求解一次量測峰值記憶體")
+    parser.add_argument("--time-limit", type=float, default=DEFAULT_TIME_LIMIT, help="每次求解的時間上限 (秒)")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON 結果檔案")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.backends, args.resolutions, SITE_TYPES, args.target_ratios,
+                           args.annual_consumption, args.repeats, args.profile_memory, args.time_limit)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n已將基準測試結果保存至：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import time
+
+from renewable_energy_optimization import (
+    EVALUATION_CHUNK_ELEMENTS, SITE_TYPES, TECHNOLOGIES, RenewableEnergyOptimizer
+)
+
+# 24/7 匹配的計分粒度與每個計分時段包含的 10 分鐘時段數
+CFE_GRANULARITIES = {"10min": 1, "hourly": 6}
+
+# 各計分時段餘電量的分位數
+SURPLUS_QUANTILES = [0.5, 0.9, 0.99]
+
+# 判斷供應不足的相對容許誤差
+CFE_TOLERANCE = 1e-9
+
+
+class CFEScorer:
+    def __init__(self, optimizer=None):
+        """
+        初始化 24/7 無碳電力 (CFE) 匹配計分引擎
+
+        以 G2.weighted_performance 的 10 分鐘發電表現計算組合的逐時段供應，與投影到同一時段
+        網格的需求曲線比較。TOU 彙總的匹配率會把同一 (月份, TOU 時段) 內不同時間的
+        餘電與缺電互相抵銷，逐小時或逐 10 分鐘的 CFE 分數則不會。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 10 分鐘解析度的優化器，提供供需矩陣與成本係數
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer(resolution="10min")
+        if self.optimizer.resolution != "10min":
+            raise ValueError("CFE 計分需要 10 分鐘解析度的優化器")
+        self.supply_matrix = self.optimizer.supply_matrix  # (52560, 4) kWh/kW
+        bucket_index = self.optimizer.bucket_index
+        self.n_days = len(bucket_index) // 144
+
+        # (月份, TOU 時段) 的 0/1 加總矩陣，用於比較 TOU 彙總的匹配率
+        codes, _ = pd.factorize(pd.MultiIndex.from_frame(bucket_index[["month", "tou"]]))
+        n_slots = len(codes)
+        self.tou_aggregation = sp.csr_matrix((np.ones(n_slots), (codes, np.arange(n_slots))),
+                                             shape=(codes.max() + 1, n_slots))
+
+    def demand_profiles(self, site_types, annual_consumption):
+        """
+        將 4 clustor TOU 的需求因子投影到 10 分鐘時段
+
+        參數:
+        site_types (list): 場址類型 (0-3)
+        annual_consumption (float or array-like): 各需求曲線的年度用電量 (kWh)
+
+        返回:
+        np.ndarray: (d, 52560) 各需求曲線在各 10 分鐘時段的需求 (kWh)
+        """
+        unknown = sorted(set(site_types) - set(SITE_TYPES))
+        if unknown:
+            raise ValueError(f"未知的場址類型: {unknown}")
+        consumption = np.broadcast_to(np.asarray(annual_consumption, dtype=float), (len(site_types),))
+        return (self.optimizer.demand_matrix[:, [SITE_TYPES.index(t) for t in site_types]] * consumption).T
+
+    def score(self, capacities, demands, granularity="hourly"):
+        """
+        以單一向量化流程計算每個組合對每條需求曲線的 24/7 匹配指標
+
+        組合數 x 需求曲線數 x 時段數超過 EVALUATION_CHUNK_ELEMENTS 時依組合分批計算。
+
+        參數:
+        capacities (array-like): (k, 4) 依 TECHNOLOGIES 順序的容量 (kW)
+        demands (array-like): (d, 52560) 各 10 分鐘時段的需求 (kWh)，例如 demand_profiles 的輸出
+        granularity (str): 計分粒度，"hourly" 或 "10min"
+
+        返回:
+        tuple: (pd.DataFrame: 每個 (portfolio, demand) 一列，含 cfe_score (逐時段匹配量 / 總需求)、
+                tou_score (月份 x TOU 彙總的匹配率)、unmatched_hours (供應不足的時數)、
+                matched_energy、total_surplus (kWh)、surplus_hours 與各計分時段餘電量的分位數
+                (surplus_p50 等, kWh)、total_cost (NTD)，
+                np.ndarray: (k, d, 24) 各小時 (一天中的時刻) 的全年餘電量 (kWh))
+        """
+        if granularity not in CFE_GRANULARITIES:
+            raise ValueError(f"不支援的計分粒度: {granularity}，請選擇 {list(CFE_GRANULARITIES)}")
+        capacities = np.atleast_2d(np.asarray(capacities, dtype=float))
+        demands = np.atleast_2d(np.asarray(demands, dtype=float))
+        n_slots = len(self.supply_matrix)
+        if capacities.shape[1] != len(TECHNOLOGIES):
+            raise ValueError(f"容量須為 (k, {len(TECHNOLOGIES)}) 的陣列")
+        if demands.shape[1] != n_slots:
+            raise ValueError(f"需求曲線須有 {n_slots} 個 10 分鐘時段")
+        k, d = len(capacities), len(demands)
+        group = CFE_GRANULARITIES[granularity]
+        period_hours = group / 6
+
+        # 需求: (d, 計分時段數) 與 (d, TOU 時段數)
+        demand = demands.reshape(d, -1, group).sum(axis=2)
+        demand_tou = (self.tou_aggregation @ demands.T).T
+        total_demand = demand.sum(axis=1)
+        demand_floor = demand * (1 - CFE_TOLERANCE)
+
+        metrics = {name: np.empty((k, d)) for name in
+                   ["matched_energy", "tou_matched", "unmatched_hours", "total_surplus", "surplus_hours"]}
+        quantiles = np.empty((len(SURPLUS_QUANTILES), k, d))
+        surplus_by_hour = np.empty((k, d, 24))
+
+        size = max(1, EVALUATION_CHUNK_ELEMENTS // (d * demand.shape[1]))
+        for start in range(0, k, size):
+            rows = slice(start, start + size)
+            supply_slots = capacities[rows] @ self.supply_matrix.T  # (chunk, 52560)
+            supply = supply_slots.reshape(len(supply_slots), -1, group).sum(axis=2)[:, None, :]  # (chunk, 1, 計分時段)
+            matched = np.minimum(supply, demand)  # (chunk, d, 計分時段)
+            surplus = supply - matched
+
+            metrics["matched_energy"][rows] = matched.sum(axis=2)
+            metrics["unmatched_hours"][rows] = (supply < demand_floor).sum(axis=2) * period_hours
+            metrics["total_surplus"][rows] = surplus.sum(axis=2)
+            metrics["surplus_hours"][rows] = (surplus > 0).sum(axis=2) * period_hours
+            quantiles[:, rows] = np.quantile(surplus, SURPLUS_QUANTILES, axis=2)
+            surplus_by_hour[rows] = surplus.reshape(len(supply), d, self.n_days, 24, -1).sum(axis=(2, 4))
+
+            supply_tou = (self.tou_aggregation @ supply_slots.T).T[:, None, :]
+            metrics["tou_matched"][rows] = np.minimum(supply_tou, demand_tou).sum(axis=2)
+
+        portfolio, demand_index = np.meshgrid(np.arange(k), np.arange(d), indexing="ij")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cfe_score = np.where(total_demand > 0, metrics["matched_energy"] / total_demand, 0.0)
+            tou_score = np.where(total_demand > 0, metrics["tou_matched"] / total_demand, 0.0)
+        table = pd.DataFrame({
+            "portfolio": portfolio.ravel(),
+            "demand": demand_index.ravel(),
+            "cfe_score": cfe_score.ravel(),  # 逐時段匹配率
+            "tou_score": tou_score.ravel(),  # 月份 x TOU 彙總的匹配率
+            "unmatched_hours": metrics["unmatched_hours"].ravel(),  # 供應不足的時數
+            "matched_energy": metrics["matched_energy"].ravel(),  # 逐時段實際使用量 (kWh)
+            "total_surplus": metrics["total_surplus"].ravel(),  # 總餘電量 (kWh)
+            "surplus_hours": metrics["surplus_hours"].ravel(),  # 有餘電的時數
+            **{f"surplus_p{int(q * 100)}": quantiles[i].ravel() for i, q in enumerate(SURPLUS_QUANTILES)},
+            "total_cost": np.repeat(capacities @ self.optimizer.cost_vector(), d)  # 總成本 (NTD)
+        })
+        return table, surplus_by_hour
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(resolution="10min")
+    scorer = CFEScorer(optimizer)
+
+    # 候選組合: 每種場址類型在 TOU 匹配下的最佳組合
+    tou_optimizer = RenewableEnergyOptimizer(solver="exact")
+    portfolios = []
+    for site_type in SITE_TYPES:
+        result = tou_optimizer.optimize_portfolio(site_type, 1e8, 60, 2030, 2)
+        portfolios.append([result[f"{tech}_prime"] for tech in TECHNOLOGIES])
+    demands = scorer.demand_profiles(SITE_TYPES, 1e8)
+
+    start = time.perf_counter()
+    table, _ = scorer.score(portfolios, demands, granularity="hourly")
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"24/7 CFE 計分: {len(portfolios)} 個組合 x {len(demands)} 條需求曲線 (耗時 {elapsed:.2f} 秒)")
+    print("=" * 60)
+    for row in table.itertuples():
+        print(f"組合 {row.portfolio} / 場址類型 {SITE_TYPES[row.demand]}: CFE {row.cfe_score:.2%} "
+              f"(TOU 彙總 {row.tou_score:.2%})，供應不足 {row.unmatched_hours:,.0f} 小時，"
+              f"餘電 {row.total_surplus:,.0f} kWh")
+
+
+if __name__ == "__main__":
+    main()
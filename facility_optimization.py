@@ -0,0 +1,283 @@
+import numpy as np
+import os
+import pandas as pd
+import scipy.sparse as sp
+import time
+
+from high_resolution_profiles import PROFILE_FILES, load_facility_profiles
+from renewable_energy_optimization import SITE_TYPES, TECHNOLOGIES, RenewableEnergyOptimizer, build_portfolio_lp
+from stochastic_optimization import bucket_aggregation
+
+# G1 月度統計表的技術標記與 G2 發電表現欄位對應的技術代號 (名稱含「離岸」的風場為離岸風電)
+PLANT_TECHNOLOGIES = {"solar": "s", "wind": "w", "hydro": "h"}
+PROFILE_TECHNOLOGIES = dict(zip(PROFILE_FILES, TECHNOLOGIES))
+
+# G1 的時段分類沒有週六半尖峰 (週六的半尖峰時間計入 mid-peak)
+PLANT_TOU_LABELS = {"Sat. mid-p": "mid-peak"}
+
+# 可採購單位表的欄位
+UNIT_FIELDS = ["name", "technology", "cost", "capacity"]
+
+
+def plant_technology(plant_name):
+    """
+    由 G1 案場名稱 (例如 "崙尾光 (solar)") 判斷技術代號
+
+    參數:
+    plant_name (str): 案場名稱
+
+    返回:
+    str: TECHNOLOGIES 中的技術代號
+    """
+    base, _, tech = plant_name.rpartition(" (")
+    tech = tech.rstrip(")")
+    if tech not in PLANT_TECHNOLOGIES:
+        raise ValueError(f"無法判斷案場 {plant_name} 的技術")
+    if tech == "wind" and "離岸" in base:
+        return "ow"
+    return PLANT_TECHNOLOGIES[tech]
+
+
+def load_plant_capacities(stats_file):
+    """
+    G1 月度統計表中各案場的裝置容量
+
+    參數:
+    stats_file (str): G1 monthly_stats.csv 路徑
+
+    返回:
+    pd.Series: 以案場名稱為索引的裝置容量 (kW)，未記錄 (0) 的案場為 nan
+    """
+    stats = pd.read_csv(stats_file, encoding="utf-8-sig", usecols=["案場名稱", "裝置容量"])
+    installed = stats[stats["裝置容量"] > 0].groupby("案場名稱")["裝置容量"].max() * 1000
+    return installed.reindex(sorted(stats["案場名稱"].unique()))
+
+
+def load_plant_tou_supply(stats_file, bucket_index, hours):
+    """
+    由 G1 的月度統計表建立各案場在 TOU 時段的每 kW 發電量
+
+    同一案場同一 (月份, 時段) 的各年份平均使用率取平均；週六半尖峰使用 mid-peak 的使用率，
+    缺少的 (月份, 時段) 依序以該案場同一時段的全年平均、該案場的整體平均補齊。
+    每 kW 發電量 = 使用率 (%) / 100 x 時段時數。
+
+    參數:
+    stats_file (str): G1 monthly_stats.csv 路徑
+    bucket_index (pd.DataFrame): 優化器時段的 month 與 tou
+    hours (np.ndarray): (n,) 各時段的時數
+
+    返回:
+    tuple: (案場名稱 list, (n, m) 每 kW 發電量 np.ndarray (kWh/kW))
+    """
+    stats = pd.read_csv(stats_file, encoding="utf-8-sig", usecols=["案場名稱", "月份", "時間分類", "平均使用率"])
+    stats.columns = ["plant", "month", "tou", "usage"]
+    plants = sorted(stats["plant"].unique())
+
+    usage = stats.pivot_table(index=["month", "tou"], columns="plant", values="usage", aggfunc="mean")
+    tou = bucket_index["tou"].replace(PLANT_TOU_LABELS)
+    keys = pd.MultiIndex.from_arrays([bucket_index["month"].astype(int), tou])
+    profile = usage.reindex(index=keys, columns=plants)
+
+    # 缺值: 同一時段的全年平均，其次為案場整體平均
+    tou_mean = stats.groupby(["tou", "plant"])["usage"].mean().unstack().reindex(index=tou, columns=plants)
+    profile = profile.fillna(pd.DataFrame(tou_mean.to_numpy(), index=profile.index, columns=plants))
+    profile = profile.fillna(stats.groupby("plant")["usage"].mean()).fillna(0.0)
+
+    supply = profile.to_numpy(dtype=float) / 100 * np.asarray(hours, dtype=float)[:, None]
+    return plants, supply
+
+
+def plant_units(optimizer, source=None):
+    """
+    建立個別案場的可採購單位與供應矩陣
+
+    TOU 解析度預設使用 G1 月度統計表的 17 個案場；每小時與 10 分鐘解析度使用
+    G2 發電表現中各案場的 10 分鐘數據 (加總到優化器的時段)。
+    成本為該技術的成本係數，容量上限為案場裝置容量 (未知時為該技術的容量上限)。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 提供時段、成本係數與容量上限
+    source (str): "G1" 或 "G2"，None 表示依解析度選擇
+
+    返回:
+    tuple: (pd.DataFrame: UNIT_FIELDS 欄位的可採購單位, (n, m) 每 kW 發電量 np.ndarray (kWh/kW))
+    """
+    source = source or ("G1" if optimizer.resolution == "tou" else "G2")
+    stats_file = os.path.join(optimizer.base_path, "G1.origin data_performance_visualization", "monthly_stats.csv")
+    if source == "G1":
+        if optimizer.resolution != "tou":
+            raise ValueError("G1 月度統計表只有 TOU 時段，請使用 tou 解析度")
+        hours = optimizer.bucket_index.merge(optimizer.supply_data[["month", "tou", "theoretical_hours"]],
+                                             on=["month", "tou"], how="left")["theoretical_hours"]
+        names, supply = load_plant_tou_supply(stats_file, optimizer.bucket_index, hours.to_numpy())
+        technologies = [plant_technology(name) for name in names]
+        installed = load_plant_capacities(stats_file).reindex(names).to_numpy()
+    elif source == "G2":
+        profiles, profile_columns = load_facility_profiles(optimizer.profile_dir)
+        names = list(profiles.columns)
+        # 每 kW 容量在一個 10 分鐘時段的發電量為 表現(%) / 100 x 1/6 (kWh)
+        supply = bucket_aggregation(optimizer) @ (profiles.to_numpy(dtype=float) / 100 / 6)
+        technologies = [PROFILE_TECHNOLOGIES[profile_columns[name]] for name in names]
+        # G1 的案場名稱帶有技術標記，去除後對應裝置容量
+        installed = load_plant_capacities(stats_file)
+        installed.index = [name.rpartition(" (")[0] for name in installed.index]
+        installed = installed.reindex(names).to_numpy()
+    else:
+        raise ValueError(f"不支援的案場數據來源: {source}，請選擇 ['G1', 'G2']")
+
+    tech_cost = optimizer.cost_vector()
+    tech_capacity = optimizer.capacity_vector()
+    index = np.array([TECHNOLOGIES.index(tech) for tech in technologies])
+    units = pd.DataFrame({
+        "name": names,
+        "technology": technologies,
+        "cost": tech_cost[index],
+        "capacity": np.where(np.isnan(installed), tech_capacity[index], installed)
+    })
+    return units, supply
+
+
+class FacilityOptimizer:
+    def __init__(self, optimizer=None, units=None, supply_matrix=None, technology_caps=True):
+        """
+        初始化任意數量可採購單位 (個別案場) 的組合優化器
+
+        每個單位有自己的每 kW 發電曲線、成本與容量上限，線性規劃以 build_portfolio_lp
+        的稀疏矩陣一次建立 (非零元素為 時段數 x 單位數)，適用於上百個單位的
+        TOU 或每小時問題。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供時段、需求、目標計算與求解器後端
+        units (pd.DataFrame or list of dict): UNIT_FIELDS 欄位 (name、technology、cost NTD/kW、capacity kW)，
+                                              None 表示使用 plant_units 的個別案場
+        supply_matrix (np.ndarray): (n, m) 各單位每 kW 在優化器各時段的發電量 (kWh)，與 units 一同提供
+        technology_caps (bool): 是否另以優化器的技術容量上限限制同一技術的單位總容量
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        if units is None:
+            units, supply_matrix = plant_units(self.optimizer)
+        elif supply_matrix is None:
+            raise ValueError("提供 units 時必須同時提供 supply_matrix")
+
+        self.units = pd.DataFrame(units, columns=UNIT_FIELDS).reset_index(drop=True)
+        self.supply_matrix = np.asarray(supply_matrix, dtype=float)
+        if self.supply_matrix.shape != (len(self.optimizer.bucket_index), len(self.units)):
+            raise ValueError(f"supply_matrix 的形狀 {self.supply_matrix.shape} 與時段數 "
+                             f"{len(self.optimizer.bucket_index)} 或單位數 {len(self.units)} 不符")
+        unknown = sorted(set(self.units["technology"]) - set(TECHNOLOGIES))
+        if unknown:
+            raise ValueError(f"未知的技術代號: {unknown}")
+        self.technology_caps = technology_caps
+
+    def build_lp(self, demand, re_target):
+        """
+        建立單位層級的組合優化線性規劃
+
+        在 build_portfolio_lp 的模型上，以每種技術一列的稀疏不等式
+        Σ_{j∈技術} x_j <= 技術容量上限 限制同一技術的單位總容量。
+
+        參數:
+        demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+        re_target (float): 可再生能源目標值 (kWh)
+
+        返回:
+        dict: build_portfolio_lp 的輸出，另有 unit_names
+        """
+        cost = self.units["cost"].to_numpy(dtype=float)
+        capacity = self.units["capacity"].to_numpy(dtype=float)
+        lp = build_portfolio_lp(self.supply_matrix, demand, cost, capacity, re_target)
+        # CBC 的變數名稱 (案場名稱含非 ASCII 字元)
+        lp["unit_names"] = [f"unit_{j}" for j in range(len(self.units))]
+
+        if self.technology_caps:
+            tech_capacity = self.optimizer.capacity_vector()
+            rows = self.units["technology"].map(TECHNOLOGIES.index).to_numpy()
+            # 只有容量上限有限且會被單位上限總和超過的技術才需要一列
+            unit_total = np.bincount(rows, weights=capacity, minlength=len(TECHNOLOGIES))
+            needed = np.flatnonzero(np.isfinite(tech_capacity) & (unit_total > tech_capacity))
+            if needed.size:
+                row_of = np.full(len(TECHNOLOGIES), -1)
+                row_of[needed] = np.arange(needed.size)
+                cols = np.flatnonzero(row_of[rows] >= 0)
+                lp["A_ub"] = sp.csr_matrix((np.ones(cols.size), (row_of[rows[cols]], cols)),
+                                           shape=(needed.size, len(lp["c"])))
+                lp["b_ub"] = tech_capacity[needed]
+        return lp
+
+    def optimize(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+        """
+        求解各單位的最低成本採購容量
+
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        target_ratio (float): 可再生能源目標比例 (百分比)
+        target_year (int): 目標年份 (2026-2050)
+        growth_rate (float): 年度用電增長率 (百分比)
+
+        返回:
+        dict: status、message；最佳解時另有 units (各單位的 capacity_prime (kW)、purchase_cost (NTD)、
+              generation (kWh))、各技術合計容量 (s_prime 等)、total_cost、re_target、unit_cost、
+              total_surplus、total_generation、surplus_ratio、build_time 與 solve_time
+        """
+        optimizer = self.optimizer
+        re_target = optimizer.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        demand = optimizer.demand_vector(site_type, annual_consumption)
+
+        start = time.perf_counter()
+        lp = self.build_lp(demand, re_target)
+        build_time = time.perf_counter() - start
+
+        stats = {}
+        status, values, _ = optimizer.solve_lp(lp, stats)
+        if status != "Optimal":
+            return {"status": status, "message": "無法找到最佳解決方案",
+                    "build_time": build_time + stats["build"], "solve_time": stats["solve"]}
+
+        n, m = lp["n_buckets"], lp["n_units"]
+        capacities = values[:m]
+        units = self.units.copy()
+        units["capacity_prime"] = capacities  # 採購容量 (kW)
+        units["purchase_cost"] = units["cost"] * capacities  # 採購成本 (NTD)
+        units["generation"] = self.supply_matrix.sum(axis=0) * capacities  # 年發電量 (kWh)
+
+        total_cost = float(units["purchase_cost"].sum())
+        total_surplus = float(values[m + n:m + 2 * n].sum())
+        total_generation = re_target + total_surplus
+        technology_totals = units.groupby("technology")["capacity_prime"].sum()
+        result = {
+            "status": "最佳解決方案找到",
+            "units": units,
+            **{f"{tech}_prime": float(technology_totals.get(tech, 0.0)) for tech in TECHNOLOGIES},
+            "total_cost": total_cost,  # 總成本 (NTD)
+            "re_target": re_target,  # 可再生能源目標 (kWh)
+            "unit_cost": total_cost / re_target if re_target > 0 else 0,  # 單位成本 (NTD/kWh)
+            "total_surplus": total_surplus,  # 總餘電量 (kWh)
+            "total_generation": total_generation,  # 總發電量 (kWh)
+            "surplus_ratio": total_surplus / total_generation if total_generation > 0 else 0,  # 餘電比例
+            "build_time": build_time + stats["build"],  # 模型建立時間 (秒)
+            "solve_time": stats["solve"]  # 求解時間 (秒)
+        }
+        return result
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="highs")
+    facility = FacilityOptimizer(optimizer)
+
+    for site_type in SITE_TYPES:
+        result = facility.optimize(site_type, 1e8, 60, 2030, 2)
+        print("=" * 60)
+        print(f"場址類型 {site_type}: {result['status']}")
+        print("=" * 60)
+        if "units" not in result:
+            continue
+        print(f"總成本: {result['total_cost']:,.0f} NTD，單位成本 {result['unit_cost']:.2f} NTD/kWh，"
+              f"餘電比例 {result['surplus_ratio']:.2%} (求解 {result['solve_time']:.3f} 秒)")
+        for unit in result["units"].itertuples():
+            if unit.capacity_prime > 1e-6:
+                print(f"{unit.name:<20} {unit.capacity_prime:>12,.0f} kW / 上限 {unit.capacity:>12,.0f} kW")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import calendar
+import os
+import numpy as np
+import pandas as pd
+
+# 各技術的 10 分鐘加權發電表現檔案 (G2.weighted_performance) 與欄位
+PROFILE_FILES = {
+    "SAP": "solar_average_performance.csv",
+    "WAP": "wind_average_performance.csv",
+    "HAP": "hydro_average_performance.csv",
+    "OWAP": "offshore_wind_average_performance.csv"
+}
+
+# 可選用的時間解析度: 月份 x TOU 時段、每小時、每 10 分鐘
+TIME_RESOLUTIONS = ["tou", "hourly", "10min"]
+
+# 每個解析度一個時段的分鐘數
+SLOT_MINUTES = {"hourly": 60, "10min": 10}
+
+# tou_analysis_2025.py 的時段名稱與需求檔案不同者
+DEMAND_TOU_LABELS = {"Sat. mid-p": "Sat. mid-peak"}
+
+
+def classify_tou(month, day, weekday, minute_of_day):
+    """
+    向量化判斷各時段的 TOU 時段，規則與 tou_analysis_2025.py 相同
+
+    參數:
+    month (np.ndarray): 月份 (1-12)
+    day (np.ndarray): 日期 (1-31)
+    weekday (np.ndarray): 星期 (0 為週一，6 為週日)
+    minute_of_day (np.ndarray): 時段起始的當日分鐘數 (0-1439)
+
+    返回:
+    np.ndarray: TOU 時段名稱 ("peak", "mid-peak", "off-peak", "Sat. mid-p")
+    """
+    month, day, weekday = np.asarray(month), np.asarray(day), np.asarray(weekday)
+    hour = np.asarray(minute_of_day) // 60
+
+    # 夏季 (5/16-10/15)
+    is_summer = ((month > 5) & (month < 10)) | ((month == 5) & (day >= 16)) | ((month == 10) & (day <= 15))
+    summer_mid = ((hour >= 9) & (hour <= 15)) | (hour >= 22)
+    other_mid = ((hour >= 6) & (hour <= 10)) | (hour >= 14)
+
+    saturday_mid = np.where(is_summer, hour >= 9, other_mid)
+    weekday_peak = is_summer & (hour >= 16) & (hour <= 21)
+    weekday_mid = np.where(is_summer, summer_mid, other_mid)
+
+    return np.select(
+        [weekday == 6, weekday == 5, weekday_peak, weekday_mid],
+        ["off-peak", np.where(saturday_mid, "Sat. mid-p", "off-peak"), "peak", "mid-peak"],
+        default="off-peak"
+    )
+
+
+def load_performance_profiles(profile_dir):
+    """
+    載入四種技術的 10 分鐘發電表現並對齊到完整的 365 x 144 時段網格
+
+    原始數據含有非整 10 分鐘的時間戳記與重複或缺漏的時段: 時間戳記向下取整到
+    10 分鐘、同一時段取平均，缺漏時段以線性內插補齊。太陽能的缺值代表夜間，
+    視為 0。
+
+    參數:
+    profile_dir (str): G2.weighted_performance 資料夾路徑
+
+    返回:
+    pd.DataFrame: 依 (date, slot) 排序的 52,560 列，欄位為 date、slot (當日第幾個 10 分鐘)
+                  與 SAP、WAP、HAP、OWAP (發電表現, %)
+    """
+    columns = {}
+    for column, filename in PROFILE_FILES.items():
+        data = pd.read_csv(os.path.join(profile_dir, filename), usecols=["date", "time", column])
+        columns[column] = _snap_to_grid(data, [column], fill_zero=(column == "SAP"))[column]
+    return pd.DataFrame(columns).reset_index()
+
+
+def load_facility_year_profiles(profile_dir):
+    """
+    載入各技術每個歷史年份的 10 分鐘發電表現
+
+    發電表現檔案保留各案場每年的欄位 (例如 南鹽光_2022)；同一技術同一年份的
+    各案場欄位取平均，時段網格與缺值處理同 load_performance_profiles。
+
+    參數:
+    profile_dir (str): G2.weighted_performance 資料夾路徑
+
+    返回:
+    tuple: (年份 list, (年份數, 52560, 4) 發電表現 np.ndarray (%)，技術順序同 PROFILE_FILES)
+    """
+    frames = {}
+    for column, filename in PROFILE_FILES.items():
+        data = pd.read_csv(os.path.join(profile_dir, filename))
+        facility_columns = [c for c in data.columns if c not in ("date", "time", column)]
+        snapped = _snap_to_grid(data, facility_columns, fill_zero=(column == "SAP"))
+        years = sorted({c.rsplit("_", 1)[1] for c in facility_columns})
+        frames[column] = {
+            year: snapped[[c for c in facility_columns if c.rsplit("_", 1)[1] == year]].mean(axis=1).to_numpy()
+            for year in years
+        }
+
+    years = sorted(set.intersection(*(set(profiles) for profiles in frames.values())))
+    profiles = np.stack([np.column_stack([frames[column][year] for column in PROFILE_FILES]) for year in years])
+    return [int(year) for year in years], profiles
+
+
+def load_facility_profiles(profile_dir):
+    """
+    載入各案場的 10 分鐘發電表現 (各歷史年份取平均)
+
+    參數:
+    profile_dir (str): G2.weighted_performance 資料夾路徑
+
+    返回:
+    tuple: (pd.DataFrame: 依 (date, slot) 排序的 52,560 列，每個案場一欄 (發電表現, %),
+            dict: 案場名稱對應的 PROFILE_FILES 技術欄位 (SAP、WAP、HAP、OWAP))
+    """
+    columns, technologies = {}, {}
+    for column, filename in PROFILE_FILES.items():
+        data = pd.read_csv(os.path.join(profile_dir, filename))
+        facility_columns = [c for c in data.columns if c not in ("date", "time", column)]
+        snapped = _snap_to_grid(data, facility_columns, fill_zero=(column == "SAP"))
+        for facility in dict.fromkeys(c.rsplit("_", 1)[0] for c in facility_columns):
+            years = [c for c in facility_columns if c.rsplit("_", 1)[0] == facility]
+            columns[facility] = snapped[years].mean(axis=1).to_numpy()
+            technologies[facility] = column
+    return pd.DataFrame(columns), technologies
+
+
+def _snap_to_grid(data, columns, fill_zero):
+    """
+    將時間戳記向下取整到 10 分鐘並對齊完整的 365 x 144 時段網格
+    """
+    dates = pd.date_range("2025-01-01", "2025-12-31").strftime("%m-%d")
+    grid = pd.MultiIndex.from_product([dates, np.arange(144)], names=["date", "slot"])
+
+    minutes = data["time"].str.slice(0, 2).astype(int) * 60 + data["time"].str.slice(3, 5).astype(int)
+    data = data.assign(slot=minutes // 10)
+    profile = data.groupby(["date", "slot"])[columns].mean().reindex(grid)
+    if fill_zero:
+        return profile.fillna(0.0)
+    return profile.interpolate(limit_direction="both").fillna(0.0)
+
+
+def slot_calendar(resolution="10min", year=2025):
+    """
+    全年各時段的月份、日期、起始分鐘與 TOU 時段
+
+    參數:
+    resolution (str): "hourly" 或 "10min"
+    year (int): 判斷星期使用的年份
+
+    返回:
+    pd.DataFrame: month, day, minute, tou，依時間順序排列
+    """
+    dates = pd.date_range(f"{year}-01-01", f"{year}-12-31")
+    dates = dates[~((dates.month == 2) & (dates.day == 29))]
+    minutes = np.arange(0, 24 * 60, SLOT_MINUTES[resolution])
+    month = np.repeat(dates.month.to_numpy(), len(minutes))
+    day = np.repeat(dates.day.to_numpy(), len(minutes))
+    weekday = np.repeat(dates.weekday.to_numpy(), len(minutes))
+    minute = np.tile(minutes, len(dates))
+    return pd.DataFrame({"month": month, "day": day, "minute": minute,
+                         "tou": classify_tou(month, day, weekday, minute)})
+
+
+def build_high_resolution_matrices(profiles, demand_data, site_columns, resolution, year=2025):
+    """
+    建立每小時或每 10 分鐘的供需矩陣
+
+    每 kW 容量在一個 10 分鐘時段的發電量為 表現(%) / 100 x 1/6 (kWh)；
+    每小時解析度為 6 個 10 分鐘時段的加總。需求以需求檔案中 (月份, TOU 時段)
+    的用電占比平均分配到該月份該 TOU 時段的所有時段。
+
+    參數:
+    profiles (pd.DataFrame): load_performance_profiles 的輸出
+    demand_data (pd.DataFrame): 需求檔案 (month, tou, 各場址類型用電占比)
+    site_columns (list): 依場址類型順序的需求欄位名稱
+    resolution (str): "hourly" 或 "10min"
+    year (int): 判斷星期使用的年份
+
+    返回:
+    tuple: (bucket_index (pd.DataFrame: month, day, minute, tou),
+            supply_matrix (n, 4) kWh/kW, demand_matrix (n, 4) 需求歸一化係數)
+    """
+    if resolution not in SLOT_MINUTES:
+        raise ValueError(f"不支援的時間解析度: {resolution}，請選擇 {list(SLOT_MINUTES)}")
+    if calendar.isleap(year):
+        raise ValueError("發電表現數據沒有 2 月 29 日，請使用非閏年")
+    group = SLOT_MINUTES[resolution] // 10
+
+    # (n_slots, 4) 每 kW 的 10 分鐘發電量，再依解析度加總
+    supply = profiles[list(PROFILE_FILES)].to_numpy(dtype=float) / 100 / 6
+    supply = supply.reshape(-1, group, supply.shape[1]).sum(axis=1)
+
+    bucket_index = slot_calendar(resolution, year)
+
+    # 需求占比平均分配到 (月份, TOU 時段) 內的各時段
+    shares = demand_data.drop_duplicates(["month", "tou"]).copy()
+    shares["tou"] = shares["tou"].replace({v: k for k, v in DEMAND_TOU_LABELS.items()})
+    counts = bucket_index.groupby(["month", "tou"]).size().rename("slots").reset_index()
+    shares = shares.merge(counts, on=["month", "tou"], how="inner")
+    shares[site_columns] = shares[site_columns].div(shares["slots"], axis=0)
+    demand = bucket_index[["month", "tou"]].merge(shares, on=["month", "tou"], how="left")
+    demand_matrix = demand[site_columns].fillna(0.0).to_numpy(dtype=float)
+
+    return bucket_index, supply, demand_matrix
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_file(path):
+    """
+    計算檔案內容的 SHA-256 雜湊值
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _json_default(obj):
+    """
+    將 NumPy 純量與陣列轉為 Python 原生型別 (例如 capacity_vector() 或 pandas 讀入的數值)
+    """
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"無法序列化的型別: {type(obj).__name__}")
+
+
+def hash_object(obj):
+    """
+    計算可 JSON 序列化物件 (例如約束條件、成本係數) 的 SHA-256 雜湊值
+
+    NumPy 純量與陣列先轉為 Python 原生型別，與相同數值的 int/float 得到相同雜湊值。
+    """
+    return hashlib.sha256(json.dumps(obj, sort_keys=True, default=_json_default).encode("utf-8")).hexdigest()
+
+
+def request_fingerprint(site_type, annual_consumption, target_ratio, target_year, growth_rate, data_fingerprint,
+                        solver=None, storage=None, capacity_blocks=None, sites=None):
+    """
+    計算優化請求的指紋: 正規化後的輸入參數加上數據指紋、求解器後端與模型設定
+
+    不同求解器後端 (例如交叉驗證 exact 與 highs) 或不同儲能、容量區塊設定的結果不會互相命中。
+
+    參數:
+    site_type (int or tuple): 0-3 代表不同場址類型 (多場址合併時為各場址類型)
+    annual_consumption (float): 2024年年度用電量 (kWh)
+    target_ratio (float): 可再生能源目標比例 (百分比)
+    target_year (int): 目標年份 (2026-2050)
+    growth_rate (float): 年度用電增長率 (百分比)
+    data_fingerprint (str): 供需檔案、約束條件與成本係數的合併雜湊值
+    solver (str): 求解器後端
+    storage (dict): 儲能參數，None 表示不含儲能
+    capacity_blocks (dict): 容量區塊設定，None 表示連續容量
+    sites (list): 多場址合併時依順序的 (場址類型, 年度用電量)，None 表示單一場址
+
+    返回:
+    str: 請求指紋
+    """
+    site_type = [int(t) for t in site_type] if isinstance(site_type, (tuple, list)) else int(site_type)
+    if sites is not None:
+        sites = [[int(t), float(consumption)] for t, consumption in sites]
+    normalized = [site_type, float(annual_consumption), float(target_ratio), int(target_year), float(growth_rate),
+                  data_fingerprint, solver, storage, capacity_blocks, sites]
+    return hash_object(normalized)
+
+
+class OptimizationCache:
+    def __init__(self, max_entries=256, path=None):
+        """
+        初始化優化結果快取
+
+        記憶體中為有上限的 LRU；指定 path 時另以 SQLite 檔案持久保存，重新啟動後仍可命中。
+        每筆結果都記錄產生時的數據指紋，數據改變時可用 prune 清除指定數據版本或過舊的結果；
+        update_data_version 另記錄各數據來源最後使用的數據指紋，重新啟動後也能清除舊版本的結果。
+
+        參數:
+        max_entries (int): 記憶體中最多保留的結果數
+        path (str): SQLite 檔案路徑，None 表示只使用記憶體
+        """
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.data_versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, data_fingerprint TEXT, result TEXT, created REAL)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS data_versions (source TEXT PRIMARY KEY, data_fingerprint TEXT)"
+            )
+            self.connection.commit()
+
+    def get(self, key):
+        """
+        查詢快取結果，沒有命中時回傳 None
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return dict(self.entries[key][1])
+
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT data_fingerprint, result FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    result = json.loads(row[1])
+                    self._remember(key, row[0], result)
+                    self.hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, result, data_fingerprint):
+        """
+        儲存優化結果
+        """
+        with self.lock:
+            self._remember(key, data_fingerprint, dict(result))
+            if self.connection is not None:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                    (key, data_fingerprint, json.dumps(result, ensure_ascii=False, default=_json_default), time.time())
+                )
+                self.connection.commit()
+
+    def _remember(self, key, data_fingerprint, result):
+        """
+        放入記憶體 LRU，超過上限時淘汰最久未使用的結果
+        """
+        self.entries[key] = (data_fingerprint, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def prune(self, stale_fingerprints=(), max_age=None):
+        """
+        清除指定數據版本產生的結果，以及超過 max_age 秒的持久化結果
+
+        只刪除明確指定的數據指紋，共用同一個 SQLite 檔案的其他數據版本的結果不受影響。
+
+        參數:
+        stale_fingerprints (iterable): 要清除的數據指紋
+        max_age (float): 持久化結果的最長保留秒數，None 表示不依時間清除
+
+        返回:
+        int: 清除的持久化結果數量
+        """
+        stale = set(stale_fingerprints)
+        with self.lock:
+            for key in [k for k, (fp, _) in self.entries.items() if fp in stale]:
+                del self.entries[key]
+            if self.connection is None:
+                return 0
+            removed = 0
+            if stale:
+                placeholders = ", ".join("?" * len(stale))
+                removed += self.connection.execute(
+                    f"DELETE FROM results WHERE data_fingerprint IN ({placeholders})", tuple(stale)
+                ).rowcount
+            if max_age is not None:
+                removed += self.connection.execute(
+                    "DELETE FROM results WHERE created < ?", (time.time() - max_age,)
+                ).rowcount
+            self.connection.commit()
+            return removed
+
+    def update_data_version(self, source, data_fingerprint):
+        """
+        記錄數據來源目前的數據指紋，並清除同一來源先前數據版本產生的結果
+
+        持久化檔案保存各數據來源最後使用的數據指紋，程序重新啟動後數據已改變時仍會清除
+        舊版本的結果；其他數據來源 (例如共用同一個 SQLite 檔案的其他優化器) 的結果不受影響。
+
+        參數:
+        source (str): 數據來源識別 (例如時間解析度與供需檔案路徑的雜湊值)
+        data_fingerprint (str): 目前的數據指紋
+
+        返回:
+        int: 清除的持久化結果數量
+        """
+        with self.lock:
+            previous = self.data_versions.get(source)
+            if self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT data_fingerprint FROM data_versions WHERE source = ?", (source,)
+                ).fetchone()
+                if row is not None:
+                    previous = row[0]
+                self.connection.execute("INSERT OR REPLACE INTO data_versions VALUES (?, ?)", (source, data_fingerprint))
+                self.connection.commit()
+            self.data_versions[source] = data_fingerprint
+        if previous is None or previous == data_fingerprint:
+            return 0
+        return self.prune([previous])
+
+    def clear(self):
+        """
+        清除所有快取結果
+        """
+        with self.lock:
+            self.entries.clear()
+            self.data_versions.clear()
+            if self.connection is not None:
+                self.connection.execute("DELETE FROM results")
+                self.connection.execute("DELETE FROM data_versions")
+                self.connection.commit()
+
+    def close(self):
+        """
+        關閉持久化連線
+        """
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
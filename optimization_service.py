@@ -0,0 +1,219 @@
+import argparse
+import json
+import math
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from optimization_cache import request_fingerprint
+from renewable_energy_optimization import RenewableEnergyOptimizer, SCENARIO_FIELDS, SITE_TYPES
+
+
+def _integer(value, name):
+    """
+    將請求中的整數參數轉為 int；布林值、非整數 (例如 1.7) 與非數值一律拒絕
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not float(value).is_integer():
+        raise ValueError(f"無效的{name}，請輸入整數")
+    return int(value)
+
+
+class OptimizationService:
+    def __init__(self, optimizer=None, cache_path=None):
+        """
+        初始化常駐優化服務
+
+        供需數據只在啟動時載入一次。每個請求都經過 optimize_portfolio (可行性預檢、結果快取
+        與優化器設定的求解器後端)；highs 後端以各場址類型的常駐模型 (PortfolioModel) 熱啟動求解。
+        同一場址類型一次只執行一個求解；相同參數且仍在求解中的請求會合併為一次求解。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 已載入數據的優化器，None 時建立新的優化器
+        cache_path (str): 優化器尚未啟用快取時，結果快取的 SQLite 檔案路徑 (None 表示只使用記憶體)
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        self.optimizer.resident_models = True
+        if self.optimizer.cache is None:
+            self.optimizer.enable_cache(path=cache_path)
+        if self.optimizer.solver == "highs" and self.optimizer.capacity_blocks is None:
+            # 啟動時預先建立常駐模型，第一個請求不需等待建模
+            for site_type in SITE_TYPES:
+                self.optimizer.get_model(site_type)
+        self.site_locks = {site_type: threading.Lock() for site_type in SITE_TYPES}
+
+        # 求解中的請求: 指紋 -> Future
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.stats = {"requests": 0, "solves": 0, "cache_hits": 0, "coalesced": 0}
+
+    @staticmethod
+    def parse_request(payload):
+        """
+        驗證並正規化請求參數
+
+        參數:
+        payload (dict): 包含 SCENARIO_FIELDS 欄位的請求內容
+
+        返回:
+        tuple: 依 SCENARIO_FIELDS 順序的參數
+        """
+        missing = [field for field in SCENARIO_FIELDS if field not in payload]
+        if missing:
+            raise ValueError(f"缺少參數: {', '.join(missing)}")
+
+        site_type = _integer(payload["site_type"], "場址類型")
+        if site_type not in SITE_TYPES:
+            raise ValueError("無效的場址類型，請選擇0-3之間的數字")
+        target_year = _integer(payload["target_year"], "目標年份")
+        if target_year < 2026 or target_year > 2050:
+            raise ValueError("無效的目標年份，請選擇2026-2050之間的年份")
+        annual_consumption = float(payload["annual_consumption"])
+        if not math.isfinite(annual_consumption) or annual_consumption < 0:
+            raise ValueError("無效的年度用電量，請輸入非負的有限數值")
+        target_ratio = float(payload["target_ratio"])
+        if not math.isfinite(target_ratio) or target_ratio < 0 or target_ratio > 100:
+            raise ValueError("無效的目標比例，請輸入0-100之間的數值")
+        growth_rate = float(payload["growth_rate"])
+        if not math.isfinite(growth_rate):
+            raise ValueError("無效的年度用電增長率，請輸入有限數值")
+        return site_type, annual_consumption, target_ratio, target_year, growth_rate
+
+    def optimize(self, payload):
+        """
+        處理一筆優化請求，相同參數的並行請求只求解一次
+
+        參數:
+        payload (dict): 包含 SCENARIO_FIELDS 欄位的請求內容
+
+        返回:
+        dict: 與 optimize_portfolio 相同格式的結果，另附 coalesced 欄位
+        """
+        scenario = self.parse_request(payload)
+        key = request_fingerprint(*scenario, self.optimizer.data_fingerprint(), self.optimizer.solver,
+                                  self.optimizer.storage, self.optimizer.capacity_blocks)
+
+        with self.in_flight_lock:
+            self.stats["requests"] += 1
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            result = dict(future.result())
+            result["coalesced"] = True
+            return result
+
+        try:
+            result = self._solve(*scenario)
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+
+        result = dict(result)
+        result["coalesced"] = False
+        return result
+
+    def _solve(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+        """
+        以 optimize_portfolio 求解 (同一場址類型一次只執行一個求解)
+        """
+        with self.site_locks[site_type]:
+            result = self.optimizer.optimize_portfolio(site_type, annual_consumption, target_ratio,
+                                                       target_year, growth_rate)
+        with self.in_flight_lock:
+            self.stats["cache_hits" if result.get("cache_hit") else "solves"] += 1
+        return result
+
+
+class OptimizationRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP/JSON 介面:
+    POST /optimize  請求內容為 SCENARIO_FIELDS 欄位的 JSON 物件
+    GET  /health    服務狀態與請求統計
+    """
+    service = None
+
+    def _send_json(self, status, body):
+        try:
+            # 標準 JSON 不允許 NaN 與 Infinity
+            data = json.dumps(body, ensure_ascii=False, allow_nan=False).encode("utf-8")
+        except ValueError:
+            status = 500
+            data = json.dumps({"error": "結果含有非有限數值"}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"找不到路徑: {self.path}"})
+            return
+        self._send_json(200, {"status": "ok", **self.service.stats})
+
+    def do_POST(self):
+        if self.path != "/optimize":
+            self._send_json(404, {"error": f"找不到路徑: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            result = self.service.optimize(payload)
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        # 只在標準輸出記錄簡短的請求資訊
+        print(f"[{time.strftime('%H:%M:%S')}] {self.address_string()} {format % args}")
+
+
+def create_server(host="127.0.0.1", port=8000, service=None):
+    """
+    建立多執行緒 HTTP 伺服器
+
+    參數:
+    host (str): 監聽位址
+    port (int): 監聽埠號
+    service (OptimizationService): 共用的優化服務，None 時建立新的服務
+
+    返回:
+    ThreadingHTTPServer: 尚未啟動的伺服器
+    """
+    handler = type("BoundOptimizationRequestHandler", (OptimizationRequestHandler,),
+                   {"service": service or OptimizationService()})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="可再生能源組合優化服務")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址")
+    parser.add_argument("--port", type=int, default=8000, help="監聽埠號")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port)
+    print(f"可再生能源組合優化服務已啟動: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服務已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
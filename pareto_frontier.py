@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+import time
+
+from portfolio_atlas import parametric_path
+from portfolio_model import PortfolioModel, highs_status
+from renewable_energy_optimization import TECHNOLOGIES, RenewableEnergyOptimizer
+
+
+class ParetoFrontier:
+    def __init__(self, optimizer, site_type, annual_consumption, re_target):
+        """
+        初始化成本與餘電量的 Pareto 前緣 (epsilon-constraint 法)
+
+        在常駐的 HiGHS 模型上加入一列 總餘電量 <= ε。最小成本 f(ε) 對 ε 為凸且
+        分段線性的遞減函數，其斜率即為該列的對偶值，因此以 parametric_path 的切線交點
+        夾擠法自動放置斷點；每次求解只修改該列的右手邊，由前一次的基底熱啟動。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供供需數據、約束條件、成本係數與儲能設定
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        re_target (float): 可再生能源目標值 (kWh)
+        """
+        self.model = PortfolioModel(optimizer, site_type, annual_consumption, re_target)
+        self.re_target = float(re_target)
+        self.iterations = 0
+
+        # 總餘電量 = Σ 餘電 (+ Σ 充電 - Σ 放電，含儲能時)
+        lp = self.model.lp
+        n, m = lp["n_buckets"], lp["n_units"]
+        self.surplus_coefficients = np.zeros(len(lp["c"]))
+        self.surplus_coefficients[m + n:m + 2 * n] = 1.0
+        if lp["storage"]:
+            self.surplus_coefficients[m + 2 * n + 1:m + 3 * n + 1] = 1.0
+            self.surplus_coefficients[m + 3 * n + 1:m + 4 * n + 1] = -1.0
+        indices = np.flatnonzero(self.surplus_coefficients).astype(np.int32)
+        self.surplus_row = self.model.highs.getNumRow()
+        self.model.highs.addRow(-np.inf, np.inf, len(indices), indices, self.surplus_coefficients[indices])
+
+    def _run(self):
+        """
+        求解目前的模型，返回 (狀態, 變數值)
+        """
+        self.model.highs.run()
+        self.iterations += self.model.highs.getInfo().simplex_iteration_count
+        status = highs_status(self.model.highs.getModelStatus())
+        if status != "Optimal":
+            return status, None
+        return status, np.asarray(self.model.highs.getSolution().col_value)
+
+    def surplus_range(self):
+        """
+        前緣兩端的總餘電量
+
+        返回:
+        tuple: (最小可能的總餘電量, 最低成本解的總餘電量) (kWh)；目標不可行時拋出 ValueError
+        """
+        highs = self.model.highs
+        cost = np.asarray(highs.getLp().col_cost_)
+        columns = np.arange(len(cost), dtype=np.int32)
+
+        # 最小餘電情境: 暫時以總餘電量為目標函數
+        highs.changeRowBounds(self.surplus_row, -np.inf, np.inf)
+        highs.changeColsCost(len(columns), columns, self.surplus_coefficients)
+        status, values = self._run()
+        highs.changeColsCost(len(columns), columns, cost)
+        if status != "Optimal":
+            raise ValueError(f"無法建立 Pareto 前緣: 目標 {self.re_target:.2f} kWh 狀態為 {status}")
+        min_surplus = float(self.surplus_coefficients @ values)
+
+        # 最低成本情境
+        status, values = self._run()
+        max_surplus = float(self.surplus_coefficients @ values)
+        return min_surplus, max(max_surplus, min_surplus)
+
+    def trace(self, rtol=1e-6):
+        """
+        找出前緣的所有斷點
+
+        參數:
+        rtol (float): 判斷區間為線性的相對容許誤差
+
+        返回:
+        pd.DataFrame: 依總餘電量遞增的斷點，斷點之間的容量線性內插亦位於前緣上
+        """
+        min_surplus, max_surplus = self.surplus_range()
+        # 略為放寬最小餘電量，避免求解器在邊界上的數值誤差
+        floor = min_surplus + 1e-9 * max(abs(min_surplus), self.re_target, 1.0)
+        m = self.model.n_units
+
+        def solve(t):
+            self.model.highs.changeRowBounds(self.surplus_row, -np.inf, floor + t)
+            status, values = self._run()
+            if status != "Optimal":
+                raise ValueError(f"Pareto 前緣求解失敗: 餘電上限 {floor + t:.2f} kWh 狀態為 {status}")
+            slope = float(self.model.highs.getSolution().row_dual[self.surplus_row])
+            surplus = float(self.surplus_coefficients @ values)
+            return float(self.model.highs.getObjectiveValue()), np.append(values[:m], [surplus, -slope]), slope
+
+        targets, costs, solutions = parametric_path(solve, max(max_surplus - floor, 0.0), rtol=rtol)
+        frontier = pd.DataFrame(solutions[:, :m], columns=[f"{tech}_prime" for tech in TECHNOLOGIES])
+        frontier.insert(0, "surplus_limit", floor + targets)
+        frontier["total_cost"] = costs
+        frontier["total_surplus"] = solutions[:, m]
+        frontier["unit_cost"] = costs / self.re_target if self.re_target > 0 else 0.0
+        frontier["total_generation"] = self.re_target + frontier["total_surplus"]
+        frontier["surplus_ratio"] = frontier["total_surplus"] / frontier["total_generation"]
+        # 餘電上限列的對偶值: 每減少 1 kWh 餘電所增加的成本 (NTD/kWh)
+        frontier["marginal_cost"] = solutions[:, m + 1]
+        return frontier
+
+
+def pareto_frontier(optimizer, site_type, annual_consumption, target_ratio, target_year, growth_rate, n_points=None):
+    """
+    計算買家的成本與總餘電量 Pareto 前緣
+
+    前緣兩端分別為 README 的最小餘電情境與最小成本情境。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 優化器 (任何解析度，可含儲能)
+    site_type (int): 0-3 代表不同場址類型
+    annual_consumption (float): 2024年年度用電量 (kWh)
+    target_ratio (float): 可再生能源目標比例 (百分比)
+    target_year (int): 目標年份 (2026-2050)
+    growth_rate (float): 年度用電增長率 (百分比)
+    n_points (int): 若提供，在兩端之間等距取 n_points 個總餘電量，以斷點內插取得容量與成本
+
+    返回:
+    pd.DataFrame: 前緣上的點 (surplus_limit、各技術容量、total_cost、total_surplus、unit_cost 等)
+    """
+    re_target = optimizer.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+    frontier = ParetoFrontier(optimizer, site_type, annual_consumption, re_target).trace()
+    if n_points is None or len(frontier) < 2:
+        return frontier
+
+    # 前緣為分段線性，斷點之間的線性內插即為最佳解
+    limits = np.linspace(frontier["surplus_limit"].iloc[0], frontier["surplus_limit"].iloc[-1], n_points)
+    columns = [column for column in frontier.columns if column not in ("surplus_limit", "marginal_cost")]
+    dense = pd.DataFrame({"surplus_limit": limits})
+    for column in columns:
+        dense[column] = np.interp(limits, frontier["surplus_limit"], frontier[column])
+    dense["surplus_ratio"] = dense["total_surplus"] / dense["total_generation"]
+    return dense
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="highs")
+    site_type, annual_consumption = 2, 1e8
+
+    start = time.perf_counter()
+    frontier = pareto_frontier(optimizer, site_type, annual_consumption, 60, 2030, 2)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"成本與餘電量 Pareto 前緣 ({len(frontier)} 個斷點，耗時 {elapsed:.2f} 秒)")
+    print("=" * 60)
+    for _, row in frontier.iterrows():
+        print(f"餘電 {row['total_surplus']:>16,.0f} kWh ({row['surplus_ratio']:.2%})  "
+              f"總成本 {row['total_cost']:>16,.0f} NTD  單位成本 {row['unit_cost']:.2f} NTD/kWh  "
+              f"邊際成本 {row['marginal_cost']:.2f} NTD/kWh")
+
+
+if __name__ == "__main__":
+    main()
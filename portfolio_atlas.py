@@ -0,0 +1,316 @@
+import numpy as np
+import os
+import time
+
+from renewable_energy_optimization import (
+    RenewableEnergyOptimizer, SITE_TYPES, TECHNOLOGIES, build_portfolio_lp, format_result
+)
+
+
+def parametric_path(solve, t_max, rtol=1e-6, min_width=1e-9, max_depth=60):
+    """
+    沿右手邊參數 t 做參數分析，找出最佳值函數的所有斷點
+
+    線性規劃的最佳值 f(t) 對右手邊為凸分段線性函數，其斜率即為該約束的對偶值。
+    每個區間以兩端的切線交點作為候選斷點 (Eisner-Severance 夾擠法)：若交點上的 f
+    與兩條切線相符，即為唯一斷點；否則在交點處切分後繼續。區間為線性時，
+    兩端最佳解的線性內插在區間內亦為最佳解。
+
+    參數:
+    solve (callable): solve(t) -> (最佳值, 解向量, 斜率)
+    t_max (float): 參數上限 (須為可行)
+    rtol (float): 判斷線性的相對容許誤差
+    min_width (float): 相對於 t_max 的最小區間寬度
+    max_depth (int): 最大切分深度
+
+    返回:
+    tuple: (斷點 np.ndarray (k,), 最佳值 np.ndarray (k,), 解 np.ndarray (k, d))
+    """
+    t_max = float(t_max)
+    points = {0.0: solve(0.0), t_max: solve(t_max)}
+    width = min_width * max(t_max, 1.0)
+    stack = [(0.0, t_max, 0)]
+    while stack:
+        a, b, depth = stack.pop()
+        (f_a, _, g_a), (f_b, _, g_b) = points[a], points[b]
+        tol = rtol * max(abs(f_a), abs(f_b), 1.0)
+
+        # 任一端的切線通過另一端: 區間為線性
+        if abs(f_b - f_a - g_a * (b - a)) <= tol or abs(f_a - f_b + g_b * (b - a)) <= tol:
+            continue
+        if depth >= max_depth or b - a <= width:
+            continue
+
+        # 兩端切線交點，數值不佳時改用中點
+        t = (f_b - f_a + g_a * a - g_b * b) / (g_a - g_b) if g_b > g_a else 0.5 * (a + b)
+        if not a + width < t < b - width:
+            t = 0.5 * (a + b)
+        points[t] = solve(t)
+        f_t = points[t][0]
+        if abs(f_t - f_a - g_a * (t - a)) <= tol and abs(f_t - f_b - g_b * (t - b)) <= tol:
+            # 交點即為斷點，兩側皆為線性
+            continue
+        stack.append((t, b, depth + 1))
+        stack.append((a, t, depth + 1))
+
+    ts = np.array(sorted(points))
+    values = np.array([points[t][0] for t in ts])
+    solutions = np.array([points[t][1] for t in ts])
+
+    # 移除落在相鄰點弦線上的多餘點
+    keep = np.ones(len(ts), dtype=bool)
+    for i in range(1, len(ts) - 1):
+        j = np.flatnonzero(keep[:i])[-1]
+        chord = values[j] + (values[i + 1] - values[j]) * (ts[i] - ts[j]) / (ts[i + 1] - ts[j])
+        if abs(values[i] - chord) <= rtol * max(abs(chord), 1.0):
+            keep[i] = False
+    return ts[keep], values[keep], solutions[keep]
+
+
+class PortfolioAtlas:
+    def __init__(self, optimizer=None, gap_tolerance=1e-3):
+        """
+        初始化參數化最佳解圖譜
+
+        圖譜在一組年用電量網格上，沿可再生能源目標做參數分析，儲存每個場址類型的
+        分段線性最佳容量。最佳成本 f(年用電量, 目標) 為聯合凸函數:
+        年用電量恰為網格值時直接內插即為最佳解；落在兩個網格值之間時，
+        以兩側最佳解的凸組合作為可行解，並用各斷點的對偶平面作為下界，
+        差距在容許範圍內才採用，否則改為實際求解。
+        圖譜只適用於不含儲能與容量區塊的連續線性規劃，並記錄建立時優化器的數據指紋；
+        供需數據、成本係數或容量上限之後改變時，查詢一律改為實際求解。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 用於建立圖譜與後備求解的優化器
+        gap_tolerance (float): 網格之間查詢可接受的相對最佳性差距
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        self.gap_tolerance = gap_tolerance
+        self.paths = {}
+        self.data_fingerprint = None  # 建立圖譜時優化器的數據指紋
+
+    def _parameters(self):
+        """
+        目前優化器的成本係數與容量上限 (依 TECHNOLOGIES 順序)
+        """
+        cost = np.array([self.optimizer.cost_coefficients[tech] for tech in TECHNOLOGIES], dtype=float)
+        capacity = np.array([self.optimizer.constraints[f"{tech}_max"] for tech in TECHNOLOGIES], dtype=float)
+        return cost, capacity
+
+    def _solver(self, site_type, annual_consumption):
+        """
+        建立 t -> (最佳成本, [最佳容量, 對偶平面], 目標約束對偶值) 的求解函數
+
+        對偶平面 (截距, 目標斜率, 年用電量斜率) 由對偶解導出，
+        對任意 (年用電量, 目標) 皆為最佳成本的下界。
+        """
+        factors = self.optimizer.demand_matrix[:, SITE_TYPES.index(site_type)]
+        supply = self.optimizer.supply_matrix
+        cost, capacity = self._parameters()
+        n, m = supply.shape
+
+        def solve(re_target):
+            lp = build_portfolio_lp(supply, annual_consumption * factors, cost, capacity, re_target)
+            status, values, duals = self.optimizer.solve_lp(lp)
+            if status != 'Optimal':
+                raise ValueError(f"圖譜建立失敗: 目標 {re_target:.2f} kWh 狀態為 {status}")
+
+            # 餘電變數無上限，其對偶可行性要求 y_i <= 0
+            y, y_target = np.minimum(duals[:n], 0.0), float(duals[n])
+            slope_c = float(factors @ np.minimum(0.0, -(y + y_target)))
+            intercept = float(capacity @ np.minimum(0.0, cost + supply.T @ y))
+            plane = [intercept, y_target, slope_c]
+            return float(cost @ values[:m]), np.concatenate([values[:m], plane]), y_target
+
+        return solve
+
+    def max_target(self, site_type, annual_consumption):
+        """
+        在容量上限內可達成的最大實際使用可再生能源 (kWh)
+        """
+        _, capacity = self._parameters()
+        demand = annual_consumption * self.optimizer.demand_matrix[:, SITE_TYPES.index(site_type)]
+        return float(np.minimum(demand, self.optimizer.supply_matrix @ capacity).sum())
+
+    def build(self, site_types=SITE_TYPES, consumption_levels=None):
+        """
+        離線建立圖譜
+
+        參數:
+        site_types (list): 要建立的場址類型
+        consumption_levels (array-like): 年用電量網格 (kWh)，預設為 1e6 至 1e10 的等比網格
+        """
+        if consumption_levels is None:
+            consumption_levels = np.geomspace(1e6, 1e10, 25)
+        consumption_levels = np.unique(np.asarray(consumption_levels, dtype=float))
+        m = len(TECHNOLOGIES)
+        if self.optimizer.storage is not None or self.optimizer.capacity_blocks is not None:
+            raise ValueError("圖譜的分段線性路徑不適用於儲能或容量區塊，請停用後再建立")
+        data_fingerprint = self.optimizer.data_fingerprint()
+        if self.paths and data_fingerprint != self.data_fingerprint:
+            # 舊圖譜來自不同的數據或設定，不與新建立的場址類型混用
+            self.paths = {}
+
+        solver_msg = self.optimizer.solver_msg
+        self.optimizer.solver_msg = False
+        try:
+            for site_type in site_types:
+                start = time.perf_counter()
+                level_paths, planes = [], []
+                for consumption in consumption_levels:
+                    # 略低於理論上限，避免求解器在邊界上的數值誤差
+                    targets, _, solutions = parametric_path(
+                        self._solver(site_type, consumption),
+                        self.max_target(site_type, consumption) * (1 - 1e-7)
+                    )
+                    level_paths.append((targets, solutions[:, :m]))
+                    planes.append(solutions[:, m:])
+                self.paths[site_type] = {
+                    "levels": consumption_levels.copy(),
+                    "level_paths": level_paths,
+                    "planes": np.concatenate(planes)
+                }
+                print(f"場址類型 {site_type} 圖譜建立完成，耗時 {time.perf_counter() - start:.2f} 秒")
+            self.data_fingerprint = data_fingerprint
+        finally:
+            self.optimizer.solver_msg = solver_msg
+
+    def lookup(self, site_type, annual_consumption, re_target):
+        """
+        從圖譜查詢最佳容量
+
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        re_target (float): 可再生能源目標值 (kWh)
+
+        返回:
+        tuple or None: (最佳容量 np.ndarray 或 'Infeasible', 相對最佳性差距)；
+                       超出圖譜範圍、差距過大或圖譜已過期 (數據指紋與優化器不同) 時回傳 None
+        """
+        entry = self.paths.get(site_type)
+        if entry is None or self.data_fingerprint != self.optimizer.data_fingerprint():
+            return None
+        levels = entry["levels"]
+        if not levels[0] <= annual_consumption <= levels[-1]:
+            return None
+        if re_target > self.max_target(site_type, annual_consumption) * (1 + 1e-9):
+            return 'Infeasible', 0.0
+
+        def interpolate(k, target):
+            targets, capacities = entry["level_paths"][k]
+            return np.array([np.interp(target, targets, capacities[:, j]) for j in range(capacities.shape[1])])
+
+        # 年用電量恰為網格值: 路徑內插即為最佳解
+        k = int(np.searchsorted(levels, annual_consumption))
+        if levels[k] == annual_consumption:
+            if re_target > entry["level_paths"][k][0][-1]:
+                return None
+            return interpolate(k, re_target), 0.0
+
+        # 介於兩個網格值之間: 兩側最佳解的凸組合為可行解
+        low, high = levels[k - 1], levels[k]
+        weight = (high - annual_consumption) / (high - low)
+        target_low, target_high = re_target * low / annual_consumption, re_target * high / annual_consumption
+        max_low, max_high = entry["level_paths"][k - 1][0][-1], entry["level_paths"][k][0][-1]
+        if target_low > max_low or target_high > max_high:
+            scale = re_target / (weight * max_low + (1 - weight) * max_high)
+            if scale > 1:
+                return None
+            target_low, target_high = max_low * scale, max_high * scale
+        capacities = weight * interpolate(k - 1, target_low) + (1 - weight) * interpolate(k, target_high)
+
+        # 對偶平面下界估計最佳性差距
+        cost, _ = self._parameters()
+        upper = float(cost @ capacities)
+        planes = entry["planes"]
+        lower = float(np.max(planes[:, 0] + planes[:, 1] * re_target + planes[:, 2] * annual_consumption))
+        gap = max(upper - lower, 0.0) / upper if upper > 0 else 0.0
+        if gap > self.gap_tolerance:
+            return None
+        return capacities, gap
+
+    def query(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+        """
+        以圖譜回答優化請求，超出圖譜範圍時改為實際求解
+
+        參數與返回格式同 RenewableEnergyOptimizer.optimize_portfolio，
+        結果另附 source ('atlas' 或 'solver') 與 gap (相對最佳性差距) 欄位。
+        """
+        start = time.perf_counter()
+        re_target = self.optimizer.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        found = self.lookup(site_type, annual_consumption, re_target)
+
+        if found is None:
+            result = self.optimizer.optimize_portfolio(site_type, annual_consumption, target_ratio, target_year, growth_rate)
+            result["source"] = "solver"
+            result["gap"] = 0.0
+            return result
+
+        capacities, gap = found
+        if isinstance(capacities, str):
+            result = {"status": capacities, "message": "無法找到最佳解決方案"}
+        else:
+            # 總餘電量 = 總發電量 - 實際使用量
+            total_generation = float((self.optimizer.supply_matrix @ capacities).sum())
+            cost, _ = self._parameters()
+            result = format_result(capacities, cost, re_target, max(total_generation - re_target, 0.0))
+        result["build_time"] = 0.0
+        result["solve_time"] = time.perf_counter() - start
+        result["source"] = "atlas"
+        result["gap"] = gap
+        return result
+
+    def save(self, path):
+        """
+        將圖譜儲存為 .npz 檔案 (連同建立時的成本係數、容量上限與數據指紋)
+        """
+        cost, capacity = self._parameters()
+        arrays = {"cost": cost, "capacity": capacity, "site_types": np.array(sorted(self.paths)),
+                  "data_fingerprint": np.array(self.data_fingerprint or "")}
+        for site_type, entry in self.paths.items():
+            arrays[f"levels_{site_type}"] = entry["levels"]
+            arrays[f"planes_{site_type}"] = entry["planes"]
+            arrays[f"offsets_{site_type}"] = np.cumsum([0] + [len(t) for t, _ in entry["level_paths"]])
+            arrays[f"targets_{site_type}"] = np.concatenate([t for t, _ in entry["level_paths"]])
+            arrays[f"capacities_{site_type}"] = np.concatenate([c for _, c in entry["level_paths"]])
+        np.savez_compressed(path, **arrays)
+
+    def load(self, path):
+        """
+        從 .npz 檔案載入圖譜
+
+        成本係數、容量上限或數據指紋與目前優化器不一致時，圖譜已過期，拋出 ValueError。
+        """
+        with np.load(path) as data:
+            cost, capacity = self._parameters()
+            if not (np.allclose(data["cost"], cost) and np.allclose(data["capacity"], capacity)):
+                raise ValueError(f"圖譜 {os.path.basename(path)} 的成本係數或容量上限與優化器不一致，請重新建立")
+            data_fingerprint = self.optimizer.data_fingerprint()
+            if "data_fingerprint" in data.files and str(data["data_fingerprint"]) != data_fingerprint:
+                raise ValueError(f"圖譜 {os.path.basename(path)} 的供需數據或設定與優化器不一致，請重新建立")
+
+            self.paths = {}
+            for site_type in data["site_types"].tolist():
+                offsets = data[f"offsets_{site_type}"]
+                targets = data[f"targets_{site_type}"]
+                capacities = data[f"capacities_{site_type}"]
+                self.paths[site_type] = {
+                    "levels": data[f"levels_{site_type}"],
+                    "planes": data[f"planes_{site_type}"],
+                    "level_paths": [(targets[a:b], capacities[a:b])
+                                    for a, b in zip(offsets[:-1], offsets[1:])]
+                }
+            self.data_fingerprint = data_fingerprint
+
+
+def main():
+    atlas = PortfolioAtlas()
+    atlas.build()
+    output_file = os.path.join(atlas.optimizer.base_path, "portfolio_atlas.npz")
+    atlas.save(output_file)
+    print(f"\n已將圖譜保存至：{output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import numpy as np
+from scipy.optimize import linprog
+
+# 收斂與可行性的相對容許誤差
+TOLERANCE = 1e-9
+
+# 內點與主問題下界之間的相對成本差距低於此值時視為收斂
+GAP_TOLERANCE = 1e-8
+
+# 每個場址類型保留的割平面數量上限
+MAX_CUTS = 12
+
+# 稠密對偶單純形法的樞軸次數上限: 至少 MIN_PIVOTS 次，並隨變數數量增加
+MIN_PIVOTS = 200
+PIVOTS_PER_VARIABLE = 50
+
+
+def matched_energy(supply_matrix, demand, capacities):
+    """
+    給定容量時各時段實際可使用的可再生能源 min(供應, 需求)
+
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+    capacities (np.ndarray): (m,) 或 (k, m) 容量 (kW)
+
+    返回:
+    np.ndarray: (n,) 或 (k, n) 各時段實際使用量 (kWh)
+    """
+    return np.minimum(np.asarray(capacities) @ supply_matrix.T, demand)
+
+
+def solve_small_lp(G, h, cost, max_pivots=None):
+    """
+    以稠密對偶單純形法求解小型線性規劃 min cost·x s.t. G x >= h, x >= 0
+
+    成本係數非負時，x = 0 (所有剩餘變數為基底) 即為對偶可行的起始基底，
+    不需第一階段；每次加入割平面後重新求解通常只需少數幾次樞軸運算。
+
+    參數:
+    G (np.ndarray): (r, d) 約束係數
+    h (np.ndarray): (r,) 約束右手邊
+    cost (np.ndarray): (d,) 非負成本係數
+    max_pivots (int): 最大樞軸次數，None 表示 max(MIN_PIVOTS, PIVOTS_PER_VARIABLE x d)
+
+    返回:
+    tuple: (PuLP 狀態字串, 最佳解 np.ndarray 或 None)；
+           證明不可行時為 "Infeasible"，達到樞軸次數上限時為 "Not Solved"
+    """
+    r, d = G.shape
+    if max_pivots is None:
+        max_pivots = max(MIN_PIVOTS, PIVOTS_PER_VARIABLE * d)
+
+    # 列正規化 (除以係數與右手邊的最大尺度)，使每一列的容許誤差都與數據尺度無關
+    norms = np.maximum(np.linalg.norm(G, axis=1), np.abs(h))
+    norms[norms == 0] = 1.0
+    G, h = G / norms[:, None], h / norms
+    tol = TOLERANCE
+
+    # 以剩餘變數 w = G x - h 為基底: -G x + w = -h
+    tableau = np.hstack([-G, np.eye(r), -h[:, None]])
+    reduced = np.concatenate([np.asarray(cost, dtype=float), np.zeros(r)])
+    basis = np.arange(d, d + r)
+
+    for _ in range(max_pivots):
+        p = int(np.argmin(tableau[:, -1]))
+        if tableau[p, -1] >= -tol:
+            x = np.zeros(d + r)
+            x[basis] = tableau[:, -1]
+            return "Optimal", np.maximum(x[:d], 0.0)
+
+        row = tableau[p, :-1]
+        candidates = np.flatnonzero(row < -1e-12)
+        if candidates.size == 0:
+            # 此列無法被滿足: 對偶無界，原問題不可行
+            return "Infeasible", None
+        q = candidates[np.argmin(reduced[candidates] / -row[candidates])]
+
+        tableau[p] /= tableau[p, q]
+        tableau -= np.outer(tableau[:, q], tableau[p]) * (np.arange(r) != p)[:, None]
+        reduced -= reduced[q] * tableau[p, :-1]
+        basis[p] = q
+
+    return "Not Solved", None
+
+
+def solve_cut_lp(G, h, cost):
+    """
+    求解割平面主問題 min cost·x s.t. G x >= h, x >= 0
+
+    先以 solve_small_lp 求解；達到樞軸次數上限時改以 HiGHS 求解，
+    因此只有問題確實不可行時才回傳 "Infeasible"。
+
+    返回:
+    tuple: (PuLP 狀態字串, 最佳解 np.ndarray 或 None)
+    """
+    status, x = solve_small_lp(G, h, cost)
+    if status != "Not Solved":
+        return status, x
+    res = linprog(cost, A_ub=-G, b_ub=-h, bounds=(0, None), method="highs")
+    if res.status == 0:
+        return "Optimal", np.maximum(res.x, 0.0)
+    return {2: "Infeasible"}.get(res.status, "Not Solved"), None
+
+
+def solve_portfolio_exact(supply_matrix, demand, cost, capacity, re_target, cuts=None, max_iterations=200):
+    """
+    以割平面法精確求解低維度的組合優化問題，不需一般線性規劃求解器
+
+    問題為 min cost·x s.t. Σ_i min(supply_i·x, demand_i) >= re_target, 0 <= x <= capacity。
+    左式為容量的凹分段線性函數，可寫成對所有時段子集合 A 的線性約束
+    Σ_{i∈A} supply_i·x >= re_target - Σ_{i∉A} demand_i。
+    每次以目前解中供應不足的時段集合作為最違反的割平面加入，直到目標達成；
+    主問題只有 m 個變數與少數割平面，以稠密對偶單純形法精確求解。
+    
+    時段數多時 (每小時、10 分鐘) 單純的割平面法收斂很慢，因此採用 in-out 分離:
+    在可行的內點與主問題解的中點分離割平面，中點可行時內點移向主問題解；
+    內點成本與主問題下界的相對差距低於 GAP_TOLERANCE 時回傳內點。
+
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+    cost (np.ndarray): (m,) 成本係數 (NTD/kW)，須為正
+    capacity (np.ndarray): (m,) 容量上限 (kW)，可為 inf
+    re_target (float): 可再生能源目標值 (kWh)
+    cuts (np.ndarray): (k, n) 布林矩陣，先前求解累積的割平面 (時段子集合)，可跨目標重複使用
+    max_iterations (int): 最大割平面迭代次數
+
+    返回:
+    tuple: (PuLP 狀態字串, 最佳容量 np.ndarray 或 None, 更新後的割平面)
+    """
+    supply_matrix = np.asarray(supply_matrix, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    cost = np.asarray(cost, dtype=float)
+    capacity = np.asarray(capacity, dtype=float)
+    n, m = supply_matrix.shape
+    if cuts is None:
+        cuts = np.zeros((0, n), dtype=bool)
+
+    # 容量全開仍無法達成目標: 不可行 (實際使用量對容量單調遞增)
+    target_tol = TOLERANCE * max(abs(re_target), 1.0)
+    upper_capacity = np.where(np.isinf(capacity), 1e30, capacity)
+    if matched_energy(supply_matrix, demand, upper_capacity).sum() < re_target - target_tol:
+        return "Infeasible", None, cuts
+    if re_target <= 0:
+        return "Optimal", np.zeros(m), cuts
+
+    # 容量上限 (-x >= -capacity)
+    finite = np.flatnonzero(np.isfinite(capacity))
+    bound_G = -np.eye(m)[finite]
+    bound_h = -capacity[finite]
+
+    if len(cuts) == 0:
+        # 初始割平面: 所有時段 (總供應 >= 目標)
+        cuts = np.ones((1, n), dtype=bool)
+    cut_G = cuts.astype(float) @ supply_matrix
+    cut_h = re_target - (~cuts).astype(float) @ demand
+
+    def feasible(x):
+        return matched_energy(supply_matrix, demand, x).sum() >= re_target - target_tol
+
+    # 內點: 容量全開 (已確認可行)
+    x_in = upper_capacity
+    for _ in range(max_iterations):
+        status, x = solve_cut_lp(np.vstack([cut_G, bound_G]), np.concatenate([cut_h, bound_h]), cost)
+        if status != "Optimal":
+            return status, None, _active_cuts(cuts, cut_G, cut_h, x_in)
+        if feasible(x):
+            return "Optimal", x, _active_cuts(cuts, cut_G, cut_h, x)
+
+        # in-out 分離: 中點可行時內點移向主問題解，直到找到不可行的分離點
+        lower_bound = cost @ x
+        y = (x_in + x) / 2
+        while feasible(y):
+            x_in = y
+            if cost @ x_in - lower_bound <= GAP_TOLERANCE * max(lower_bound, 1.0):
+                return "Optimal", x_in, _active_cuts(cuts, cut_G, cut_h, x_in)
+            y = (x_in + x) / 2
+
+        # 分離: 分離點中供應低於需求的時段構成最違反的割平面
+        cut = supply_matrix @ y < demand
+        cuts = np.vstack([cuts, cut[None, :]])
+        cut_G = np.vstack([cut_G, cut @ supply_matrix])
+        cut_h = np.append(cut_h, re_target - demand[~cut].sum())
+
+    return "Not Solved", None, _active_cuts(cuts, cut_G, cut_h, x_in)
+
+
+def _active_cuts(cuts, cut_G, cut_h, x):
+    """
+    依與目前解的鬆弛量排序，保留最接近緊約束的割平面供下次求解使用
+    """
+    slack = (cut_G @ x - cut_h) / np.maximum(np.linalg.norm(cut_G, axis=1), 1e-300)
+    return cuts[np.argsort(slack)[:MAX_CUTS]]
+
+
+def cross_check(optimizer, scenarios, reference_solver="cbc", rtol=1e-6):
+    """
+    以精確解法與一般線性規劃求解器求解相同情境並比較
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 提供數據與參數的優化器
+    scenarios (list): 每個元素為 (site_type, annual_consumption, target_ratio, target_year, growth_rate)
+    reference_solver (str): 作為基準的求解器後端
+    rtol (float): 總成本的相對容許誤差
+
+    返回:
+    list: 狀態或總成本不一致的情境與兩邊結果
+    """
+    solver = optimizer.solver
+    mismatches = []
+    try:
+        for scenario in scenarios:
+            optimizer.solver = "exact"
+            exact = optimizer.optimize_portfolio(*scenario)
+            optimizer.solver = reference_solver
+            reference = optimizer.optimize_portfolio(*scenario)
+            if exact["status"] != reference["status"] or (
+                    "total_cost" in reference and
+                    not np.isclose(exact["total_cost"], reference["total_cost"], rtol=rtol)):
+                mismatches.append({"scenario": scenario, "exact": exact, "reference": reference})
+    finally:
+        optimizer.solver = solver
+    return mismatches
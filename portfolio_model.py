@@ -0,0 +1,365 @@
+import numpy as np
+import highspy
+import scipy.sparse as sp
+import time
+
+from renewable_energy_optimization import SITE_TYPES, TECHNOLOGIES, add_storage_result, format_result, solve_lp_highs
+
+# HiGHS 模型狀態對應到 PuLP 的狀態字串
+HIGHS_STATUS = {
+    highspy.HighsModelStatus.kOptimal: "Optimal",
+    highspy.HighsModelStatus.kInfeasible: "Infeasible",
+    highspy.HighsModelStatus.kUnboundedOrInfeasible: "Infeasible",
+    highspy.HighsModelStatus.kUnbounded: "Unbounded",
+    highspy.HighsModelStatus.kNotset: "Not Solved",
+    highspy.HighsModelStatus.kTimeLimit: "Not Solved",
+}
+
+
+def highs_status(model_status):
+    """
+    將 HiGHS 模型狀態轉換為 PuLP 狀態字串
+    """
+    return HIGHS_STATUS.get(model_status, "Undefined")
+
+
+def lp_to_highs(lp):
+    """
+    將稀疏矩陣形式的線性規劃載入新的 HiGHS 物件
+
+    參數:
+    lp (dict): build_portfolio_lp 的輸出
+
+    返回:
+    highspy.Highs: 已載入模型的 HiGHS 物件
+    """
+    # 等式列在前，不等式列 (含儲能時) 在後
+    A = lp["A_eq"].tocsc()
+    row_lower = np.asarray(lp["b_eq"], dtype=float)
+    row_upper = row_lower
+    if lp.get("A_ub") is not None:
+        A = sp.vstack([A, lp["A_ub"]]).tocsc()
+        row_lower = np.concatenate([row_lower, np.full(lp["A_ub"].shape[0], -highspy.kHighsInf)])
+        row_upper = np.concatenate([row_upper, np.asarray(lp["b_ub"], dtype=float)])
+
+    model = highspy.HighsLp()
+    model.num_col_ = A.shape[1]
+    model.num_row_ = A.shape[0]
+    model.col_cost_ = np.asarray(lp["c"], dtype=float)
+    model.col_lower_ = np.asarray(lp["lb"], dtype=float)
+    model.col_upper_ = np.minimum(lp["ub"], highspy.kHighsInf).astype(float)
+    model.row_lower_ = row_lower
+    model.row_upper_ = row_upper
+    model.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    model.a_matrix_.start_ = A.indptr
+    model.a_matrix_.index_ = A.indices
+    model.a_matrix_.value_ = A.data
+    if "integrality" in lp:
+        model.integrality_ = [highspy.HighsVarType.kInteger if flag else highspy.HighsVarType.kContinuous
+                              for flag in lp["integrality"]]
+
+    highs = highspy.Highs()
+    highs.setOptionValue("output_flag", False)
+    highs.passModel(model)
+    return highs
+
+
+def rounded_solution(lp, capacities):
+    """
+    將連續容量向上取整為合約區塊，建立整數規劃的可行起始解
+
+    各技術容量不低於連續解時，每個時段的可用發電量只增不減，因此連續解可行時
+    取整後的容量通常仍可達成目標；超過容量上限或無法達成目標時返回 None。
+
+    參數:
+    lp (dict): build_portfolio_lp 的輸出 (含 blocks)
+    capacities (np.ndarray): (m,) 連續容量 (kW)
+
+    返回:
+    np.ndarray or None: 完整的變數值
+    """
+    n, m = lp["n_buckets"], lp["n_units"]
+    block_size, min_size = lp["blocks"]["block_size"], lp["blocks"]["min_size"]
+    capacity = np.asarray(lp["ub"][:m], dtype=float)
+    blocked, minimal = np.flatnonzero(block_size > 0), np.flatnonzero(min_size > 0)
+
+    x = np.maximum(np.asarray(capacities, dtype=float), 0.0)
+    x[minimal] = np.where(x[minimal] > 0, np.maximum(x[minimal], min_size[minimal]), 0.0)
+    x[blocked] = np.ceil(x[blocked] / block_size[blocked] - 1e-9) * block_size[blocked]
+    if (x > capacity * (1 + 1e-12)).any() or ((x[minimal] > 0) & (x[minimal] < min_size[minimal])).any():
+        return None
+
+    # 依可用量等比例分配實際使用量，使總和恰為目標值
+    supply = -(lp["A_eq"][:n, :m] @ x)
+    usable = np.minimum(lp["ub"][m:m + n], supply)
+    re_target = lp["b_eq"][n]
+    if usable.sum() < re_target:
+        return None
+    used = usable * (re_target / usable.sum()) if re_target > 0 else np.zeros(n)
+
+    values = np.zeros(len(lp["c"]))
+    values[:m], values[m:m + n], values[m + n:m + 2 * n] = x, used, supply - used
+    integer = np.flatnonzero(lp["integrality"])
+    values[integer[:len(blocked)]] = np.round(x[blocked] / block_size[blocked])
+    values[integer[len(blocked):]] = x[minimal] > 0
+    return values
+
+
+def solve_mip_highs(lp, time_limit, mip_rel_gap, stats=None):
+    """
+    以 HiGHS 分支定界法求解含整數變數的組合優化問題
+
+    先求解連續鬆弛 (不可行時立即返回)，並以向上取整的容量作為起始可行解，
+    使分支定界開始前就有可返回的解。達到時間上限時不拋出錯誤，
+    而是返回目前最佳的可行解 (incumbent) 與已證明的相對最佳性差距。
+
+    參數:
+    lp (dict): build_portfolio_lp 的輸出 (含 integrality 與 blocks)
+    time_limit (float): 求解時間上限 (秒)，包含連續鬆弛的求解時間
+    mip_rel_gap (float): 可接受的相對最佳性差距
+    stats (dict): 若提供，寫入 build、solve、iterations (分支節點數) 與 solver_status
+
+    返回:
+    tuple: ("Optimal"、"Incumbent" (未證明最佳的可行解) 或其他 PuLP 狀態字串,
+            變數值 np.ndarray 或 None, 相對最佳性差距 float 或 None)
+    """
+    start = time.perf_counter()
+    relaxed_status, relaxed, _ = solve_lp_highs(lp, time_limit=time_limit)
+    if relaxed_status != "Optimal":
+        # 不可行、或連續鬆弛已用完時間 ("Not Solved")，不再進入分支定界
+        if stats is not None:
+            stats.update(build=0.0, solve=time.perf_counter() - start, iterations=0,
+                         solver_status=f"Relaxation {relaxed_status}")
+        return relaxed_status, None, None
+    lower = float(lp["c"] @ relaxed)
+    incumbent = rounded_solution(lp, relaxed[:lp["n_units"]])
+
+    def gap(values):
+        objective = float(lp["c"] @ values)
+        return max(objective - lower, 0.0) / abs(objective) if objective != 0 else 0.0
+
+    def clean(values):
+        # 容量不為負 (並將 -0.0 轉為 0.0)
+        values[:lp["n_units"]] = np.maximum(values[:lp["n_units"]], 0.0) + 0.0
+        return values
+
+    if incumbent is not None:
+        incumbent = clean(incumbent)
+    if time.perf_counter() - start >= time_limit:
+        # 連續鬆弛已用完時間: 不建立整數模型，直接返回取整解
+        if stats is not None:
+            stats.update(build=0.0, solve=time.perf_counter() - start, iterations=0,
+                         solver_status="Rounded relaxation")
+        if incumbent is None:
+            return "Not Solved", None, None
+        return ("Optimal" if gap(incumbent) <= mip_rel_gap else "Incumbent"), incumbent, gap(incumbent)
+
+    build_start = time.perf_counter()
+    highs = lp_to_highs(lp)
+    highs.setOptionValue("mip_rel_gap", float(mip_rel_gap))
+    if incumbent is not None:
+        highs.setSolution(len(incumbent), np.arange(len(incumbent), dtype=np.int32), incumbent)
+    build_time = time.perf_counter() - build_start
+
+    remaining = time_limit - (time.perf_counter() - start)
+    if remaining <= 0 or (incumbent is not None and gap(incumbent) <= mip_rel_gap):
+        # 連續鬆弛已用完時間，或取整解已達到差距要求
+        if stats is not None:
+            stats.update(build=build_time, solve=time.perf_counter() - start - build_time, iterations=0,
+                         solver_status="Rounded relaxation")
+        if incumbent is None:
+            return "Not Solved", None, None
+        return ("Optimal" if gap(incumbent) <= mip_rel_gap else "Incumbent"), incumbent, gap(incumbent)
+
+    highs.setOptionValue("time_limit", float(remaining))
+    highs.run()
+    model_status = highs.getModelStatus()
+    info = highs.getInfo()
+    if stats is not None:
+        stats.update(build=build_time, solve=time.perf_counter() - start - build_time,
+                     iterations=int(info.mip_node_count), solver_status=highs.modelStatusToString(model_status))
+
+    status = highs_status(model_status)
+    if status == "Optimal" or info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+        # 容量以整數區塊數重新計算，去除求解器的容許誤差
+        values = np.asarray(highs.getSolution().col_value)
+        integer = np.flatnonzero(lp["integrality"])
+        blocked = np.flatnonzero(lp["blocks"]["block_size"] > 0)
+        values[integer] = np.round(values[integer])
+        values[blocked] = values[integer[:len(blocked)]] * lp["blocks"]["block_size"][blocked]
+        values = clean(values)
+        if status == "Optimal":
+            return status, values, float(info.mip_gap)
+        return "Incumbent", values, min(float(info.mip_gap), gap(values))
+    if incumbent is not None:
+        return "Incumbent", incumbent, gap(incumbent)
+    return "Not Solved" if status == "Undefined" else status, None, None
+
+
+class PortfolioModel:
+    def __init__(self, optimizer, site_type, annual_consumption=0.0, re_target=0.0):
+        """
+        初始化可修改的常駐優化模型
+
+        模型只建立一次並保存在 HiGHS 中；修改目標、成本、容量上限或年用電量時，
+        只更新對應的係數或邊界，重新求解時由前一次的基底熱啟動。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供供需數據、約束條件與成本係數
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        re_target (float): 可再生能源目標值 (kWh)
+        """
+        self.site_type = site_type
+        self.demand_factors = optimizer.demand_matrix[:, SITE_TYPES.index(site_type)].copy()
+        self.cost_coefficients = dict(optimizer.cost_coefficients)
+        self.constraints = dict(optimizer.constraints)
+        self.storage = optimizer.storage
+        self.annual_consumption = float(annual_consumption)
+        self.re_target = float(re_target)
+
+        self.lp = optimizer.build_lp(site_type, annual_consumption, re_target)
+        self.n_buckets, self.n_units = self.lp["n_buckets"], self.lp["n_units"]
+        self.highs = lp_to_highs(self.lp)
+
+    def set_re_target(self, re_target):
+        """
+        修改可再生能源目標值 (kWh)
+        """
+        self.re_target = float(re_target)
+        self.highs.changeRowBounds(self.n_buckets, self.re_target, self.re_target)
+
+    def set_cost_coefficients(self, cost_coefficients):
+        """
+        修改成本係數 (NTD/kW)，可只提供部分技術
+        """
+        self.cost_coefficients.update(cost_coefficients)
+        for tech, value in cost_coefficients.items():
+            self.highs.changeColCost(TECHNOLOGIES.index(tech), float(value))
+
+    def set_constraints(self, constraints):
+        """
+        修改容量上限 (kW)，可只提供部分技術，例如 {"ow_max": 300000}
+        """
+        self.constraints.update(constraints)
+        for key, value in constraints.items():
+            self.highs.changeColBounds(TECHNOLOGIES.index(key[:-len("_max")]), 0.0, float(value))
+
+    def set_annual_consumption(self, annual_consumption):
+        """
+        修改2024年年度用電量 (kWh)，即各時段實際使用量的上限
+        """
+        self.annual_consumption = float(annual_consumption)
+        n, m = self.n_buckets, self.n_units
+        demand = self.annual_consumption * self.demand_factors
+        self.highs.changeColsBounds(n, np.arange(m, m + n, dtype=np.int32), np.zeros(n), demand)
+        if self.lp["storage"]:
+            # 含儲能時需求上限另有不等式列 (實際使用量 + 放電 <= 需求)
+            first = self.lp["A_eq"].shape[0]
+            self.highs.changeRowsBounds(
+                n, np.arange(first, first + n, dtype=np.int32), np.full(n, -highspy.kHighsInf), demand
+            )
+
+    def run(self, stats=None, time_limit=None):
+        """
+        求解目前的模型 (由前一次的基底熱啟動)，返回原始變數值
+
+        參數:
+        stats (dict): 若提供，寫入 build、solve、iterations 與 solver_status
+        time_limit (float): 求解時間上限 (秒)，達到時返回 "Not Solved"；None 表示不限制
+
+        返回:
+        tuple: (PuLP 狀態字串, 變數值 np.ndarray 或 None)
+        """
+        self.highs.setOptionValue("time_limit", highspy.kHighsInf if time_limit is None else float(time_limit))
+        start = time.perf_counter()
+        self.highs.run()
+        solve_time = time.perf_counter() - start
+
+        model_status = self.highs.getModelStatus()
+        status = highs_status(model_status)
+        if stats is not None:
+            stats.update(build=0.0, solve=solve_time, iterations=self.highs.getInfo().simplex_iteration_count,
+                         solver_status=self.highs.modelStatusToString(model_status))
+        if status != "Optimal":
+            return status, None
+        return status, np.asarray(self.highs.getSolution().col_value)
+
+    def solve(self):
+        """
+        求解目前的模型 (由前一次的基底熱啟動)
+
+        返回:
+        dict: 與 optimize_portfolio 相同格式的結果，另附 iterations (單純形法迭代次數)
+        """
+        stats = {}
+        status, values = self.run(stats)
+        if status != "Optimal":
+            return {
+                "status": status,
+                "message": "無法找到最佳解決方案",
+                "build_time": 0.0,
+                "solve_time": stats["solve"],
+                "iterations": stats["iterations"]
+            }
+
+        n, m = self.n_buckets, self.n_units
+        cost = [self.cost_coefficients[tech] for tech in TECHNOLOGIES]
+        total_surplus = values[m + n:m + 2 * n].sum()
+        if self.lp["storage"]:
+            storage_values = values[m + 2 * n:]
+            total_surplus += storage_values[1:n + 1].sum() - storage_values[n + 1:2 * n + 1].sum()
+        result = format_result(values[:m], cost, self.re_target, total_surplus)
+        if self.lp["storage"]:
+            add_storage_result(result, storage_values, self.storage)
+        result["build_time"] = 0.0
+        result["solve_time"] = stats["solve"]
+        result["iterations"] = stats["iterations"]
+        return result
+
+    def sensitivity(self):
+        """
+        目前最佳解的對偶值與範圍分析 (需先以 solve 求得最佳解)
+
+        對偶值與範圍來自同一個最佳單純形法基底，不需重新求解:
+        - target_dual: 目標值約束的對偶值，即每增加 1 kWh 目標的邊際成本 (NTD/kWh)
+        - target_range: 目標值在此範圍內時對偶值不變
+        - 各技術的 reduced_cost、cost_range (成本係數在此範圍內最佳容量不變)、
+          capacity_dual (容量上限每增加 1 kW 的成本變化，上限未綁定時為 0)
+          與 capacity_range (容量上限在此範圍內 capacity_dual 不變；上限未綁定時為 (目前容量, inf))
+
+        返回:
+        dict: target_dual、target_range 與 technologies (依技術代號)
+        """
+        if highs_status(self.highs.getModelStatus()) != "Optimal":
+            raise ValueError("範圍分析需要最佳解，請先求解模型")
+        _, ranging = self.highs.getRanging()
+        if not ranging.valid:
+            raise ValueError("HiGHS 無法提供範圍分析 (需要單純形法的最佳基底)")
+
+        solution = self.highs.getSolution()
+        row_dual = np.asarray(solution.row_dual)
+        col_dual = np.asarray(solution.col_dual)
+        col_value = np.asarray(solution.col_value)
+        target_row = self.n_buckets
+
+        technologies = {}
+        for j, tech in enumerate(TECHNOLOGIES):
+            at_upper = col_value[j] >= self.constraints[f"{tech}_max"] - 1e-9 * max(1.0, col_value[j])
+            technologies[tech] = {
+                "capacity": float(col_value[j]),
+                "cost": float(self.cost_coefficients[tech]),
+                "reduced_cost": float(col_dual[j]),
+                "cost_range": (float(ranging.col_cost_dn.value_[j]), float(ranging.col_cost_up.value_[j])),
+                "capacity_dual": float(col_dual[j]) if at_upper else 0.0,
+                # 上限未綁定時 HiGHS 的範圍屬於作用中的下限，改為上限不低於目前容量時對偶值維持 0
+                "capacity_range": ((float(ranging.col_bound_dn.value_[j]), float(ranging.col_bound_up.value_[j]))
+                                   if at_upper else (float(col_value[j]), np.inf))
+            }
+
+        return {
+            "target_dual": float(row_dual[target_row]),
+            "target_range": (float(ranging.row_bound_dn.value_[target_row]),
+                             float(ranging.row_bound_up.value_[target_row])),
+            "technologies": technologies
+        }
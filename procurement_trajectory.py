@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+import time
+
+from portfolio_exact_solver import GAP_TOLERANCE, MAX_CUTS, TOLERANCE, solve_cut_lp
+from renewable_energy_optimization import SITE_TYPES, TECHNOLOGIES, RenewableEnergyOptimizer
+
+# 需求成長與目標比例的基準年 (年度用電量為該年數值)
+BASE_YEAR = 2024
+
+
+def solve_trajectory_exact(supply_matrix, demands, cost, capacities, re_targets, lower, cuts=None,
+                           max_iterations=500):
+    """
+    以割平面法精確求解多年期組合問題
+
+    問題為 min Σ_t cost·x_t s.t. 各年 Σ_i min(supply_i·x_t, demand_t,i) >= re_target_t、
+    lower <= x_1 <= x_2 <= ... 且 x_t <= capacity_t。各年份的實際使用量約束與
+    portfolio_exact_solver 相同，以時段子集合割平面外逼近；割平面只與該年的需求與
+    目標有關，因此可在滾動時域之間沿用。採用 in-out 分離: 容量不減少的可行集合為
+    凸集合，內點與主問題解的中點仍滿足容量不減少，只需逐年檢查實際使用量。
+
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demands (np.ndarray): (T, n) 各年份各時段實際需求 (kWh)
+    cost (np.ndarray): (m,) 成本係數 (NTD/kW)，須為正
+    capacities (np.ndarray): (T, m) 各年份容量上限 (kW)，可為 inf
+    re_targets (np.ndarray): (T,) 各年份可再生能源目標值 (kWh)
+    lower (np.ndarray): (m,) 第一年容量下限 (已持有的容量, kW)
+    cuts (list): 各年份先前累積的割平面 ((k, n) 布林矩陣或 None)
+    max_iterations (int): 最大割平面迭代次數
+
+    返回:
+    tuple: (PuLP 狀態字串, (T, m) 最佳容量 np.ndarray 或 None, 更新後的各年份割平面 list)
+    """
+    supply_matrix = np.asarray(supply_matrix, dtype=float)
+    demands = np.asarray(demands, dtype=float)
+    capacities = np.asarray(capacities, dtype=float)
+    re_targets = np.asarray(re_targets, dtype=float)
+    n_years, (n, m) = len(re_targets), supply_matrix.shape
+    cuts = [np.ones((1, n), dtype=bool) if c is None or len(c) == 0 else c for c in (cuts or [None] * n_years)]
+    target_tol = TOLERANCE * np.maximum(np.abs(re_targets), 1.0)
+
+    def infeasible_years(X):
+        matched = np.minimum(X @ supply_matrix.T, demands).sum(axis=1)
+        return np.flatnonzero(matched < re_targets - target_tol)
+
+    # 容量不減少且不超過各年上限的最大容量: 實際使用量對容量單調遞增，此點不可行即整個問題不可行
+    upper = np.where(np.isinf(capacities), 1e30, capacities)
+    x_in = np.minimum.accumulate(upper[::-1], axis=0)[::-1]
+    if (x_in[0] < lower - TOLERANCE * np.maximum(np.abs(lower), 1.0)).any() or len(infeasible_years(x_in)):
+        return "Infeasible", None, cuts
+
+    # 固定約束: 容量上限、容量不減少、第一年下限
+    blocks = np.arange(n_years * m).reshape(n_years, m)
+    identity = np.eye(n_years * m)
+    finite = np.flatnonzero(np.isfinite(capacities.ravel()))
+    fixed_G = [-identity[finite], identity[blocks[1:].ravel()] - identity[blocks[:-1].ravel()], identity[blocks[0]]]
+    fixed_h = [-capacities.ravel()[finite], np.zeros((n_years - 1) * m), np.asarray(lower, dtype=float)]
+
+    def cut_rows(t, year_cuts):
+        G = np.zeros((len(year_cuts), n_years * m))
+        G[:, blocks[t]] = year_cuts.astype(float) @ supply_matrix
+        return G, re_targets[t] - (~year_cuts).astype(float) @ demands[t]
+
+    rows = [cut_rows(t, cuts[t]) for t in range(n_years)]
+    cut_G, cut_h = np.vstack([G for G, _ in rows]), np.concatenate([h for _, h in rows])
+    full_cost = np.tile(np.asarray(cost, dtype=float), n_years)
+
+    for _ in range(max_iterations):
+        status, x = solve_cut_lp(np.vstack([cut_G] + fixed_G), np.concatenate([cut_h] + fixed_h), full_cost)
+        if status != "Optimal":
+            return status, None, cuts
+        X = x.reshape(n_years, m)
+        if not len(infeasible_years(X)):
+            return "Optimal", X, _carry_cuts(cuts, supply_matrix, demands, re_targets, X)
+
+        # in-out 分離: 中點可行時內點移向主問題解，直到找到不可行的分離點
+        lower_bound = full_cost @ x
+        y = (x_in + X) / 2
+        while not len(infeasible_years(y)):
+            x_in = y
+            if full_cost @ x_in.ravel() - lower_bound <= GAP_TOLERANCE * max(lower_bound, 1.0):
+                return "Optimal", x_in, _carry_cuts(cuts, supply_matrix, demands, re_targets, x_in)
+            y = (x_in + X) / 2
+
+        # 每個不可行的年份加入分離點中供應低於需求的時段割平面
+        for t in infeasible_years(y):
+            cut = (supply_matrix @ y[t] < demands[t])[None, :]
+            cuts[t] = np.vstack([cuts[t], cut])
+            G, h = cut_rows(t, cut)
+            cut_G, cut_h = np.vstack([cut_G, G]), np.concatenate([cut_h, h])
+
+    return "Not Solved", None, _carry_cuts(cuts, supply_matrix, demands, re_targets, x_in)
+
+
+def _carry_cuts(cuts, supply_matrix, demands, re_targets, X):
+    """
+    各年份只保留最接近緊約束的割平面供下一個時域使用
+    """
+    carried = []
+    for t, year_cuts in enumerate(cuts):
+        G = year_cuts.astype(float) @ supply_matrix
+        h = re_targets[t] - (~year_cuts).astype(float) @ demands[t]
+        slack = (G @ X[t] - h) / np.maximum(np.linalg.norm(G, axis=1), 1e-300)
+        carried.append(year_cuts[np.argsort(slack)[:MAX_CUTS]])
+    return carried
+
+
+class ProcurementTrajectory:
+    def __init__(self, optimizer=None, window=3):
+        """
+        初始化多年期採購軌跡的滾動時域求解器
+
+        每次以 solve_trajectory_exact 聯合求解 window 個年份 (相鄰年份以容量不減少
+        x_t <= x_{t+1} 連結)，只採用第一年的容量，再往後移動一年。移動時沿用前一個
+        時域中各年份累積的割平面，因此後續時域通常只需少數幾次迭代。
+        window 不小於總年數時即為一次求解的完整問題。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供供需數據、約束條件與成本係數
+        window (int): 每次聯合求解的年份數
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        if self.optimizer.storage is not None or self.optimizer.capacity_blocks is not None:
+            raise ValueError("多年期採購軌跡不支援儲能與容量區塊")
+        if window < 1:
+            raise ValueError("滾動時域的年份數至少為 1")
+        self.window = int(window)
+
+    def solve(self, site_type, annual_consumption, target_ratio, target_year, growth_rate, start_year=2025,
+              start_ratio=0.0, target_ratios=None, yearly_constraints=None, initial_capacities=None):
+        """
+        建議 start_year 至 target_year 每年的採購容量
+
+        各年份目標比例預設由基準年的 start_ratio 線性增加到目標年的 target_ratio，
+        需求依年度用電增長率成長；容量逐年不減少且不超過各年份的容量上限。
+
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        target_ratio (float): 目標年的可再生能源目標比例 (百分比)
+        target_year (int): 目標年份 (2026-2050)
+        growth_rate (float): 年度用電增長率 (百分比)
+        start_year (int): 軌跡的第一年
+        start_ratio (float): 基準年的目標比例 (百分比)
+        target_ratios (dict): 覆寫特定年份的目標比例，例如 {2027: 20}
+        yearly_constraints (dict): 特定年份的容量上限，例如 {2026: {"ow_max": 100000}}，未指定者沿用優化器的約束條件
+        initial_capacities (dict): 目前已持有的容量 (kW)，例如 {"s": 5000}
+
+        返回:
+        pd.DataFrame: 每年一列，含 status、目標值、各技術容量與新增容量、年度成本與餘電量
+        """
+        if not BASE_YEAR < start_year <= target_year:
+            raise ValueError(f"起始年份須介於 {BASE_YEAR + 1} 與目標年份之間")
+        years = list(range(start_year, target_year + 1))
+        target_ratios = dict(target_ratios or {})
+        yearly_constraints = dict(yearly_constraints or {})
+        factors = self.optimizer.demand_matrix[:, SITE_TYPES.index(site_type)]
+
+        # 各年份的目標值、需求與容量上限
+        self.plan = {}
+        for year in years:
+            ratio = target_ratios.get(
+                year, start_ratio + (target_ratio - start_ratio) * (year - BASE_YEAR) / (target_year - BASE_YEAR))
+            constraints = {**self.optimizer.constraints, **yearly_constraints.get(year, {})}
+            consumption = annual_consumption * (1 + growth_rate / 100) ** (year - BASE_YEAR)
+            self.plan[year] = {
+                "target_ratio": ratio,
+                "re_target": self.optimizer.calculate_renewable_target(annual_consumption, ratio, year, growth_rate),
+                "consumption": consumption,
+                "demand": consumption * factors,
+                "capacity": np.array([constraints[f"{tech}_max"] for tech in TECHNOLOGIES], dtype=float)
+            }
+
+        window = min(self.window, len(years))
+        committed = np.array([(initial_capacities or {}).get(tech, 0.0) for tech in TECHNOLOGIES], dtype=float)
+        cost = self.optimizer.cost_vector()
+        supply = self.optimizer.supply_matrix
+        cuts = {}
+
+        records = []
+        for i, year in enumerate(years):
+            horizon = years[i:i + window]
+            start = time.perf_counter()
+            status, capacities, horizon_cuts = solve_trajectory_exact(
+                supply,
+                np.array([self.plan[y]["demand"] for y in horizon]),
+                cost,
+                np.array([self.plan[y]["capacity"] for y in horizon]),
+                np.array([self.plan[y]["re_target"] for y in horizon]),
+                committed,
+                cuts=[cuts.get(y) for y in horizon]
+            )
+            solve_time = time.perf_counter() - start
+            cuts.update(zip(horizon, horizon_cuts))
+
+            record = {"year": year, "status": status, "target_ratio": self.plan[year]["target_ratio"],
+                      "re_target": self.plan[year]["re_target"], "solve_time": solve_time}
+            if status != "Optimal":
+                record["message"] = "無法找到最佳解決方案"
+                records.append(record)
+                break
+
+            capacities = np.maximum(capacities[0], committed)
+            for tech, capacity, previous in zip(TECHNOLOGIES, capacities, committed):
+                record[f"{tech}_prime"] = float(capacity)  # 該年持有容量 (kW)
+                record[f"{tech}_added"] = float(capacity - previous)  # 該年新增容量 (kW)
+            record["total_cost"] = float(cost @ capacities)  # 該年成本 (NTD)
+            record["unit_cost"] = record["total_cost"] / record["re_target"] if record["re_target"] > 0 else 0
+            # 該年餘電量 = 總發電量 - 目標值
+            record["total_surplus"] = max(float((supply @ capacities).sum()) - record["re_target"], 0.0)
+            records.append(record)
+            committed = capacities
+        return pd.DataFrame(records)
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="highs")
+    site_type, annual_consumption, target_ratio, target_year, growth_rate = 0, 1e8, 80, 2035, 2
+    # 離岸風電的市場容量逐年開放 (假設值)
+    yearly_constraints = {year: {"ow_max": 40000 * (year - 2024)} for year in range(2025, 2036)}
+
+    for window in [1, 3, target_year - 2024]:
+        trajectory = ProcurementTrajectory(optimizer, window=window)
+        start = time.perf_counter()
+        plan = trajectory.solve(site_type, annual_consumption, target_ratio, target_year, growth_rate,
+                                yearly_constraints=yearly_constraints)
+        elapsed = time.perf_counter() - start
+        print("=" * 60)
+        print(f"滾動時域 {window} 年: 耗時 {elapsed:.3f} 秒，累計成本 {plan['total_cost'].sum():,.0f} NTD")
+        print("=" * 60)
+        for _, row in plan.iterrows():
+            added = "  ".join(f"{tech} +{row[f'{tech}_added']:,.0f}" for tech in TECHNOLOGIES)
+            print(f"{row['year']}: 目標 {row['target_ratio']:5.1f}%  {added} kW")
+
+
+if __name__ == "__main__":
+    main()
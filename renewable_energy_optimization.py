@@ -1,19 +1,527 @@
 import pandas as pd
 import numpy as np
 import pulp as plp
+import scipy.sparse as sp
+from scipy.optimize import linprog
 import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from high_resolution_profiles import PROFILE_FILES, SLOT_MINUTES, TIME_RESOLUTIONS, build_high_resolution_matrices, load_performance_profiles
+from optimization_cache import OptimizationCache, hash_file, hash_object, request_fingerprint
+from portfolio_exact_solver import matched_energy, solve_portfolio_exact
+
+# 技術代號與對應的 TOU 供應欄位 (每 kW 容量在該時段的發電量, kWh)
+TECHNOLOGIES = ["s", "w", "h", "ow"]
+SUPPLY_COLUMNS = ["SAP_kWh", "WAP_kWh", "HAP_kWh", "OWAP_kWh"]
+
+# 場址類型 (對應需求檔案中的 "0"-"3" 欄位)
+SITE_TYPES = [0, 1, 2, 3]
+
+# 可選用的求解器後端: PuLP 呼叫外部 CBC 程序、在同一程序內以 SciPy 的 HiGHS 求解，
+# 或以 portfolio_exact_solver 的割平面法直接求解低維度組合問題
+SOLVER_BACKENDS = ["cbc", "highs", "exact"]
+
+# 時段數達此值時，程序內 HiGHS 改用內點法 (每小時與 10 分鐘解析度下遠快於單純形法)。
+# 單核心實測: 每小時約 1-3 秒，10 分鐘約 14-32 秒；精確解法在兩者皆低於 0.1 秒
+IPM_MIN_BUCKETS = 2000
+
+# 未指定求解器時各時間解析度的預設後端 (10 分鐘解析度的線性規劃需數十秒，改用精確解法)
+DEFAULT_SOLVERS = {"tou": "cbc", "hourly": "cbc", "10min": "exact"}
+
+# 含儲能時 exact 後端 (無法處理時間耦合) 改用的線性規劃後端。單核心實測每小時解析度一次求解
+# (約 4.4 萬個變數、5.3 萬條約束): cbc 約 51 秒，highs 內點法約 66 秒、對偶單純形法約 92 秒；
+# 10 分鐘解析度 (約 26 萬個變數) 兩者皆超過 25 分鐘仍未完成
+STORAGE_SOLVER = "cbc"
+
+# 儲能的預設參數: 年化成本 (NTD/kWh, 1年，假設值)、充放電效率、
+# 額定功率下充滿所需小時數與最大容量 (kWh)
+DEFAULT_STORAGE_PARAMETERS = {
+    "cost": 1500.0,
+    "charge_efficiency": 0.95,
+    "discharge_efficiency": 0.95,
+    "duration": 4.0,
+    "max_capacity": np.inf
+}
+
+# 整數容量區塊模式 (MILP) 的預設求解時間上限 (秒) 與相對最佳性差距
+DEFAULT_MIP_OPTIONS = {
+    "time_limit": 60.0,
+    "mip_rel_gap": 1e-4
+}
+
+# 可行性預檢的相對容許誤差 (目標超過最大實際使用量此比例以上才判定不可行)
+PRECHECK_TOLERANCE = 1e-9
+
+# evaluate_portfolio 每批計算的 (組合數 x 時段數) 元素上限，避免 10 分鐘解析度下佔用過多記憶體
+EVALUATION_CHUNK_ELEMENTS = 2 ** 22
+
+# scipy.optimize.linprog 狀態碼對應到 PuLP 的狀態字串
+LINPROG_STATUS = {0: "Optimal", 1: "Not Solved", 2: "Infeasible", 3: "Unbounded", 4: "Undefined"}
+
+# 批次情境的輸入欄位
+SCENARIO_FIELDS = ["site_type", "annual_consumption", "target_ratio", "target_year", "growth_rate"]
+
+# 批次結果欄位
+BATCH_RESULT_FIELDS = ["status", "message", "s_prime", "w_prime", "h_prime", "ow_prime",
+                       "total_cost", "re_target", "unit_cost", "total_surplus",
+                       "total_generation", "surplus_ratio", "build_time", "solve_time"]
+
+# 批次工作程序內的優化器 (每個程序只載入一次數據)
+_batch_optimizer = None
+
+
+def build_portfolio_lp(supply_matrix, demand, cost, capacity, re_target, storage=None, blocks=None):
+    """
+    以稀疏矩陣形式一次建立組合優化線性規劃
+    
+    變數順序為 [各技術容量 x (m), 實際使用量 u (n), 餘電 s (n)]，約束為:
+    u_i + s_i - supply_i · x = 0 (每個時段)，以及 Σ u_i = re_target。
+    u_i <= 實際需求 以變數上限表示。
+    
+    提供 storage 時，時段須依時間順序排列，並加入 [儲能容量 E, 充電 c (n),
+    放電 q (n), 蓄電量 soc (n)]:
+    u_i + s_i + c_i - supply_i · x = 0，Σ (u_i + q_i) = re_target，
+    soc_i - soc_{i-1} - η_c c_i + q_i / η_d = 0 (首尾循環)，
+    以及不等式 u_i + q_i <= 實際需求、c_i, q_i <= power_ratio · E、soc_i <= E。
+    
+    提供 blocks 時在最後加入整數變數: 有區塊大小 b_j 的技術 x_j = b_j · k_j (k_j 為整數)，
+    有最低採購量 l_j 的技術 l_j · z_j <= x_j <= 容量上限 · z_j (z_j 為 0/1)。
+    
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+    cost (np.ndarray): (m,) 各技術成本係數 (NTD/kW)
+    capacity (np.ndarray): (m,) 各技術容量上限 (kW)
+    re_target (float): 可再生能源目標值 (kWh)
+    storage (dict): 儲能參數 cost (NTD/kWh)、charge_efficiency、discharge_efficiency、
+                    power_ratio (每時段可充放電量 / 容量) 與 max_capacity (kWh)，None 表示不含儲能
+    blocks (dict): block_size 與 min_size ((m,) kW，0 表示不限制)，None 表示連續容量
+    
+    返回:
+    dict: c, A_eq (csr), b_eq, lb, ub, n_buckets, n_units, storage；
+          含儲能或最低採購量時另有 A_ub (csr) 與 b_ub，
+          含 blocks 時另有 integrality (1 為整數變數) 與 blocks
+    """
+    supply_matrix = np.asarray(supply_matrix, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    n, m = supply_matrix.shape
+    buckets = np.arange(n)
+    
+    # 供需平衡列: -supply_i · x + u_i + s_i = 0
+    rows = np.concatenate([np.repeat(buckets, m), buckets, buckets, np.full(n, n)])
+    cols = np.concatenate([np.tile(np.arange(m), n), m + buckets, m + n + buckets, m + buckets])
+    data = np.concatenate([-supply_matrix.ravel(), np.ones(3 * n)])
+    A_eq = sp.csr_matrix((data, (rows, cols)), shape=(n + 1, m + 2 * n))
+    A_eq.eliminate_zeros()
+    
+    b_eq = np.zeros(n + 1)
+    b_eq[n] = re_target
+    
+    c = np.concatenate([np.asarray(cost, dtype=float), np.zeros(2 * n)])
+    lb = np.zeros(m + 2 * n)
+    ub = np.concatenate([np.asarray(capacity, dtype=float), demand, np.full(n, np.inf)])
+    
+    lp = {
+        "c": c,
+        "A_eq": A_eq,
+        "b_eq": b_eq,
+        "lb": lb,
+        "ub": ub,
+        "n_buckets": n,
+        "n_units": m,
+        "storage": storage is not None
+    }
+    if storage is not None:
+        _add_storage(lp, demand, storage)
+    if blocks is not None:
+        _add_capacity_blocks(lp, capacity, blocks)
+    return lp
+
+
+def _add_storage(lp, demand, storage):
+    """
+    在組合優化線性規劃中加入時間耦合的儲能變數與約束 (直接修改 lp)
+    """
+    n, m = lp["n_buckets"], lp["n_units"]
+    buckets = np.arange(n)
+    e = m + 2 * n  # 儲能容量 E 的欄位
+    charge, discharge, soc = e + 1 + buckets, e + 1 + n + buckets, e + 1 + 2 * n + buckets
+    n_vars = e + 1 + 3 * n
+    
+    # 等式: 充電來自發電 (平衡列)、放電計入目標、蓄電量逐時段遞推
+    eta_c, eta_d = storage["charge_efficiency"], storage["discharge_efficiency"]
+    rows = np.concatenate([buckets, np.full(n, n),
+                           n + 1 + buckets, n + 1 + buckets, n + 1 + buckets, n + 1 + buckets])
+    cols = np.concatenate([charge, discharge, soc, np.roll(soc, 1), charge, discharge])
+    data = np.concatenate([np.ones(2 * n), np.ones(n), -np.ones(n), np.full(n, -eta_c), np.full(n, 1 / eta_d)])
+    A_storage = sp.csr_matrix((data, (rows, cols)), shape=(2 * n + 1, n_vars))
+    A_eq = sp.hstack([lp["A_eq"], sp.csr_matrix((n + 1, 3 * n + 1))])
+    lp["A_eq"] = (sp.vstack([A_eq, sp.csr_matrix((n, n_vars))]) + A_storage).tocsr()
+    lp["b_eq"] = np.concatenate([lp["b_eq"], np.zeros(n)])
+    
+    # 不等式: 實際使用量 + 放電 <= 需求、充放電功率與蓄電量上限
+    ratio = storage["power_ratio"]
+    rows = np.concatenate([buckets, buckets, n + buckets, n + buckets,
+                           2 * n + buckets, 2 * n + buckets, 3 * n + buckets, 3 * n + buckets])
+    cols = np.concatenate([m + buckets, discharge, charge, np.full(n, e),
+                           discharge, np.full(n, e), soc, np.full(n, e)])
+    data = np.concatenate([np.ones(n), np.ones(n), np.ones(n), np.full(n, -ratio),
+                           np.ones(n), np.full(n, -ratio), np.ones(n), -np.ones(n)])
+    lp["A_ub"] = sp.csr_matrix((data, (rows, cols)), shape=(4 * n, n_vars))
+    lp["b_ub"] = np.concatenate([demand, np.zeros(3 * n)])
+    
+    lp["c"] = np.concatenate([lp["c"], [storage["cost"]], np.zeros(3 * n)])
+    lp["lb"] = np.concatenate([lp["lb"], np.zeros(3 * n + 1)])
+    lp["ub"] = np.concatenate([lp["ub"], [storage["max_capacity"]], np.full(3 * n, np.inf)])
+
+
+def _add_capacity_blocks(lp, capacity, blocks):
+    """
+    在線性規劃最後加入容量區塊與最低採購量的整數變數與約束 (直接修改 lp)
+    """
+    m, n_vars = lp["n_units"], len(lp["c"])
+    capacity = np.asarray(capacity, dtype=float)
+    block_size = np.asarray(blocks["block_size"], dtype=float)
+    min_size = np.asarray(blocks["min_size"], dtype=float)
+    blocked, minimal = np.flatnonzero(block_size > 0), np.flatnonzero(min_size > 0)
+    if np.isinf(capacity[minimal]).any():
+        raise ValueError("最低採購量需要有限的容量上限")
+    k = n_vars + np.arange(len(blocked))  # 區塊數
+    z = n_vars + len(blocked) + np.arange(len(minimal))  # 是否採購
+    n_total = n_vars + len(blocked) + len(minimal)
+    
+    # 等式: x_j - b_j · k_j = 0
+    first = lp["A_eq"].shape[0]
+    rows = np.concatenate([np.arange(len(blocked))] * 2)
+    A_block = sp.csr_matrix((np.concatenate([np.ones(len(blocked)), -block_size[blocked]]),
+                             (rows, np.concatenate([blocked, k]))), shape=(len(blocked), n_total))
+    lp["A_eq"] = sp.vstack([sp.hstack([lp["A_eq"], sp.csr_matrix((first, n_total - n_vars))]), A_block]).tocsr()
+    lp["b_eq"] = np.concatenate([lp["b_eq"], np.zeros(len(blocked))])
+    
+    # 不等式: l_j · z_j - x_j <= 0、x_j - 容量上限 · z_j <= 0
+    rows = np.concatenate([np.arange(len(minimal))] * 2 + [len(minimal) + np.arange(len(minimal))] * 2)
+    cols = np.concatenate([z, minimal, minimal, z])
+    data = np.concatenate([min_size[minimal], -np.ones(len(minimal)), np.ones(len(minimal)), -capacity[minimal]])
+    A_min = sp.csr_matrix((data, (rows, cols)), shape=(2 * len(minimal), n_total))
+    if lp.get("A_ub") is None:
+        lp["A_ub"], lp["b_ub"] = A_min, np.zeros(2 * len(minimal))
+    else:
+        A_ub = sp.hstack([lp["A_ub"], sp.csr_matrix((lp["A_ub"].shape[0], n_total - n_vars))])
+        lp["A_ub"] = sp.vstack([A_ub, A_min]).tocsr()
+        lp["b_ub"] = np.concatenate([lp["b_ub"], np.zeros(2 * len(minimal))])
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_blocks = np.floor(capacity[blocked] / block_size[blocked])
+    lp["c"] = np.concatenate([lp["c"], np.zeros(n_total - n_vars)])
+    lp["lb"] = np.concatenate([lp["lb"], np.zeros(n_total - n_vars)])
+    lp["ub"] = np.concatenate([lp["ub"], max_blocks, np.ones(len(minimal))])
+    lp["integrality"] = np.concatenate([np.zeros(n_vars, dtype=int), np.ones(n_total - n_vars, dtype=int)])
+    lp["blocks"] = {"block_size": block_size, "min_size": min_size}
+
+
+def lp_to_pulp(lp, unit_names):
+    """
+    將稀疏矩陣形式的線性規劃轉換為 PuLP 問題
+    
+    參數:
+    lp (dict): build_portfolio_lp 的輸出
+    unit_names (list): 容量變數名稱
+    
+    返回:
+    tuple: (plp.LpProblem, list of plp.LpVariable)
+    """
+    n, m = lp["n_buckets"], lp["n_units"]
+    names = (list(unit_names) +
+             [f"actual_re_used_{i}" for i in range(n)] +
+             [f"surplus_{i}" for i in range(n)])
+    if lp.get("storage"):
+        names += (["storage_capacity"] +
+                  [f"charge_{i}" for i in range(n)] +
+                  [f"discharge_{i}" for i in range(n)] +
+                  [f"soc_{i}" for i in range(n)])
+    if "variable_names" in lp:
+        # 其他模組建立的線性規劃自行提供容量以外的變數名稱
+        names = list(unit_names) + list(lp["variable_names"])
+    variables = [
+        plp.LpVariable(name, None if np.isinf(lb) else lb, None if np.isinf(ub) else ub)
+        for name, lb, ub in zip(names, lp["lb"], lp["ub"])
+    ]
+    
+    prob = plp.LpProblem("RenewableEnergyPortfolioOptimization", plp.LpMinimize)
+    prob += plp.LpAffineExpression(
+        [(variables[j], coef) for j, coef in enumerate(lp["c"]) if coef != 0]
+    )
+    
+    A_eq = lp["A_eq"]
+    for r in range(A_eq.shape[0]):
+        start, end = A_eq.indptr[r], A_eq.indptr[r + 1]
+        expr = plp.LpAffineExpression(
+            [(variables[j], coef) for j, coef in zip(A_eq.indices[start:end], A_eq.data[start:end])]
+        )
+        prob += plp.LpConstraint(expr, plp.LpConstraintEQ, f"balance_{r}", lp["b_eq"][r])
+    
+    A_ub = lp.get("A_ub")
+    for r in range(0 if A_ub is None else A_ub.shape[0]):
+        start, end = A_ub.indptr[r], A_ub.indptr[r + 1]
+        expr = plp.LpAffineExpression(
+            [(variables[j], coef) for j, coef in zip(A_ub.indices[start:end], A_ub.data[start:end])]
+        )
+        prob += plp.LpConstraint(expr, plp.LpConstraintLE, f"limit_{r}", lp["b_ub"][r])
+    
+    return prob, variables
+
+
+def solve_lp_cbc(lp, msg=True, stats=None, time_limit=None):
+    """
+    以 PuLP 呼叫 CBC 求解稀疏矩陣形式的線性規劃
+    
+    參數:
+    lp (dict): build_portfolio_lp 的輸出 (可另以 unit_names 提供容量變數名稱)
+    msg (bool): 是否顯示求解器輸出
+    stats (dict): 若提供，寫入 build (PuLP 模型轉換時間)、solve、iterations 與 solver_status
+    time_limit (float): 求解時間上限 (秒)，達到時返回 "Not Solved"；None 表示不限制
+    
+    返回:
+    tuple: (PuLP 狀態字串, 變數值 np.ndarray 或 None, 等式約束對偶值 np.ndarray 或 None)
+    """
+    start = time.perf_counter()
+    prob, variables = lp_to_pulp(lp, lp.get("unit_names", [f"{tech}_prime" for tech in TECHNOLOGIES]))
+    build_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    prob.solve(plp.PULP_CBC_CMD(msg=msg, timeLimit=time_limit))
+    status = plp.LpStatus[prob.status]
+    if status == 'Optimal' and prob.sol_status != plp.LpSolutionOptimal:
+        # CBC 因時間上限中止時仍回報 Optimal，需以解的狀態判斷
+        status = 'Not Solved'
+    if stats is not None:
+        # PuLP 的 CBC 介面不回傳迭代次數
+        stats.update(build=build_time, solve=time.perf_counter() - start,
+                     iterations=None, solver_status=status)
+    if status != 'Optimal':
+        return status, None, None
+    values = np.array([v.value() or 0.0 for v in variables])
+    duals = np.array([constraint.pi or 0.0 for constraint in prob.constraints.values()])
+    return status, values, duals
+
+
+def solve_lp_highs(lp, stats=None, time_limit=None):
+    """
+    在同一程序內以 SciPy 的 HiGHS 求解稀疏矩陣形式的線性規劃 (不產生子程序與暫存檔)
+    
+    參數:
+    lp (dict): build_portfolio_lp 的輸出
+    stats (dict): 若提供，寫入 solve、iterations 與 solver_status
+    time_limit (float): 求解時間上限 (秒)，達到時返回 "Not Solved"；None 表示不限制
+    
+    返回:
+    tuple: (PuLP 狀態字串, 變數值 np.ndarray 或 None, 等式約束對偶值 np.ndarray 或 None)
+    """
+    start = time.perf_counter()
+    method = "highs-ipm" if lp["n_buckets"] >= IPM_MIN_BUCKETS else "highs"
+    res = linprog(lp["c"], A_ub=lp.get("A_ub"), b_ub=lp.get("b_ub"), A_eq=lp["A_eq"], b_eq=lp["b_eq"],
+                  bounds=np.column_stack([lp["lb"], lp["ub"]]), method=method,
+                  options={} if time_limit is None else {"time_limit": float(time_limit)})
+    status = LINPROG_STATUS.get(res.status, "Undefined")
+    if stats is not None:
+        stats.update(build=0.0, solve=time.perf_counter() - start,
+                     iterations=int(res.nit), solver_status=res.message)
+    if status != 'Optimal':
+        return status, None, None
+    return status, res.x, res.eqlin.marginals
+
+
+def feasibility_precheck(supply_matrix, demand, capacity, re_target):
+    """
+    不呼叫求解器，直接計算容量上限內可達成的最大實際使用可再生能源
+    
+    實際使用量 Σ_i min(supply_i·x, demand_i) 對容量單調遞增，因此容量全開時即為最大值；
+    最大值低於目標時問題不可行。對每種技術另計算放寬其容量上限的邊際效益
+    (每 kW 增加的實際使用量，大於 0 表示該上限為綁定約束)，以及只放寬該技術時
+    補足缺口所需的額外容量 (沿各時段的飽和點排序後精確計算)。
+    
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+    capacity (np.ndarray): (m,) 各技術容量上限 (kW)
+    re_target (float): 可再生能源目標值 (kWh)
+    
+    返回:
+    dict: feasible、max_achievable (kWh)、shortfall (kWh)、binding_caps (技術代號 list)、
+          demand_limited (放寬任何容量上限都無法補足)、marginal_gain (kWh/kW) 與
+          additional_capacity (kW，只放寬該技術無法補足時為 None)
+    """
+    supply_matrix = np.asarray(supply_matrix, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    capacity = np.asarray(capacity, dtype=float)
+    
+    # 容量上限為 inf 的技術以極大值代替
+    supply = supply_matrix @ np.where(np.isinf(capacity), 1e30, capacity)
+    max_achievable = float(np.minimum(supply, demand).sum())
+    shortfall = max(re_target - max_achievable, 0.0)
+    feasible = re_target <= max_achievable + PRECHECK_TOLERANCE * max(abs(re_target), 1.0)
+    
+    # 供應不足的時段: 放寬容量上限可增加實際使用量
+    gap = np.maximum(demand - supply, 0.0)
+    unmet = gap > 0
+    marginal = supply_matrix[unmet].sum(axis=0)
+    
+    additional = {}
+    for j, tech in enumerate(TECHNOLOGIES):
+        rows = unmet & (supply_matrix[:, j] > 0)
+        if shortfall == 0 or gap[rows].sum() < shortfall:
+            additional[tech] = 0.0 if shortfall == 0 else None
+            continue
+        # 每個時段在額外容量 gap_i / supply_ij 時飽和，依飽和點排序後找出補足缺口的區段
+        saturation = gap[rows] / supply_matrix[rows, j]
+        order = np.argsort(saturation)
+        saturation, gaps, slopes = saturation[order], gap[rows][order], supply_matrix[rows, j][order]
+        saturated = np.concatenate([[0.0], np.cumsum(gaps)])
+        remaining = np.concatenate([np.cumsum(slopes[::-1])[::-1], [0.0]])
+        gained = saturated[1:] + saturation * remaining[1:]
+        k = int(np.searchsorted(gained, shortfall))
+        additional[tech] = float((shortfall - saturated[k]) / remaining[k])
+    
+    return {
+        "feasible": bool(feasible),
+        "re_target": float(re_target),
+        "max_achievable": max_achievable,  # 容量上限內最大實際使用量 (kWh)
+        "shortfall": shortfall,  # 與目標的差距 (kWh)
+        "binding_caps": [tech for tech, gain in zip(TECHNOLOGIES, marginal) if gain > 0],
+        "demand_limited": bool(shortfall > 0 and not (marginal > 0).any()),  # 目標超過各時段需求可吸收的總量
+        "marginal_gain": dict(zip(TECHNOLOGIES, marginal.astype(float).tolist())),  # 每 kW 容量增加的實際使用量 (kWh/kW)
+        "additional_capacity": additional  # 只放寬該技術時補足缺口所需的額外容量 (kW)
+    }
+
+
+def format_result(capacities, cost, re_target, total_surplus):
+    """
+    將最佳容量整理為標準結果格式
+    
+    參數:
+    capacities (array-like): 各技術容量 (kW)，依 TECHNOLOGIES 順序
+    cost (array-like): 各技術成本係數 (NTD/kW)
+    re_target (float): 可再生能源目標值 (kWh)
+    total_surplus (float): 總餘電量 (kWh)
+    
+    返回:
+    dict: 與 optimize_portfolio 相同格式的結果
+    """
+    s_prime, w_prime, h_prime, ow_prime = (float(v) for v in capacities)
+    
+    # 計算總成本
+    total_cost = float(np.dot(cost, capacities))
+    total_surplus = float(total_surplus)
+    
+    # 計算總採購量 (總發電量)
+    total_generation = re_target + total_surplus
+    
+    # 計算餘電比例
+    surplus_ratio = total_surplus / total_generation if total_generation > 0 else 0
+    
+    return {
+        "status": "最佳解決方案找到",
+        "s_prime": s_prime,  # 太陽能容量 (kW)
+        "w_prime": w_prime,  # 陸上風電容量 (kW)
+        "h_prime": h_prime,  # 小水電容量 (kW)
+        "ow_prime": ow_prime,  # 離岸風電容量 (kW)
+        "total_cost": total_cost,  # 總成本 (NTD)
+        "re_target": re_target,  # 可再生能源目標 (kWh)
+        "unit_cost": total_cost / re_target if re_target > 0 else 0,  # 單位成本 (NTD/kWh)
+        "total_surplus": total_surplus,  # 總餘電量 (kWh)
+        "total_generation": total_generation,  # 總發電量 (kWh)
+        "surplus_ratio": surplus_ratio  # 餘電比例
+    }
+
+
+def add_storage_result(result, storage_values, storage):
+    """
+    在結果中加入儲能容量與回收的餘電，並將儲能成本計入總成本
+    
+    參數:
+    result (dict): format_result 的輸出 (直接修改)
+    storage_values (np.ndarray): 儲能變數值 [E, 充電 (n), 放電 (n), 蓄電量 (n)]
+    storage (dict): 優化器的儲能參數
+    """
+    n = (len(storage_values) - 1) // 3
+    capacity = float(storage_values[0])
+    storage_cost = storage["cost"] * capacity
+    
+    result["storage_capacity"] = capacity  # 儲能容量 (kWh)
+    result["storage_power"] = capacity / storage["duration"]  # 儲能功率 (kW)
+    result["storage_charged"] = float(storage_values[1:n + 1].sum())  # 充入儲能的餘電 (kWh)
+    result["recovered_surplus"] = float(storage_values[n + 1:2 * n + 1].sum())  # 儲能放電供應需求的電量 (kWh)
+    result["storage_cost"] = storage_cost  # 儲能成本 (NTD)
+    result["total_cost"] += storage_cost
+    result["unit_cost"] = result["total_cost"] / result["re_target"] if result["re_target"] > 0 else 0
+
+
+def _init_batch_worker(demand_file, supply_file, profile_dir, constraints, cost_coefficients, solver, resolution,
+                       storage, capacity_blocks):
+    """
+    初始化批次工作程序: 建立優化器並載入一次數據
+    """
+    global _batch_optimizer
+    optimizer = RenewableEnergyOptimizer(solver=solver, resolution=resolution)
+    if (demand_file, supply_file, profile_dir) != (optimizer.demand_file, optimizer.supply_file, optimizer.profile_dir):
+        optimizer.demand_file = demand_file
+        optimizer.supply_file = supply_file
+        optimizer.profile_dir = profile_dir
+        optimizer.load_data()
+    optimizer.constraints = dict(constraints)
+    optimizer.cost_coefficients = dict(cost_coefficients)
+    optimizer.storage = storage
+    optimizer.capacity_blocks = capacity_blocks
+    optimizer.solver_msg = False
+    _batch_optimizer = optimizer
+
+
+def _solve_batch_chunk(scenarios):
+    """
+    在工作程序中依序求解一組情境
+    
+    參數:
+    scenarios (list): 每個元素為 SCENARIO_FIELDS 順序的參數 tuple
+    
+    返回:
+    list: 每個情境的結果 dict
+    """
+    results = []
+    for scenario in scenarios:
+        try:
+            results.append(_batch_optimizer.optimize_portfolio(*scenario))
+        except Exception as e:
+            results.append({"status": "Error", "message": str(e)})
+    return results
+
+
 class RenewableEnergyOptimizer:
-    def __init__(self):
+    def __init__(self, solver=None, resolution="tou"):
         """
         初始化可再生能源組合優化器
+        
+        參數:
+        solver (str): 求解器後端，"cbc" (PuLP 外部程序)、"highs" (SciPy 程序內求解)
+                      或 "exact" (低維度精確解法)；None 表示依解析度使用 DEFAULT_SOLVERS
+        resolution (str): 供需匹配的時間解析度，"tou" (月份 x TOU 時段)、
+                          "hourly" (8,760 小時) 或 "10min" (52,560 個 10 分鐘時段)
         """
+        if resolution not in TIME_RESOLUTIONS:
+            raise ValueError(f"不支援的時間解析度: {resolution}，請選擇 {TIME_RESOLUTIONS}")
+        solver = solver or DEFAULT_SOLVERS[resolution]
+        if solver not in SOLVER_BACKENDS:
+            raise ValueError(f"不支援的求解器: {solver}，請選擇 {SOLVER_BACKENDS}")
+        self.solver = solver
+        self.resolution = resolution
         self.base_path = os.path.dirname(os.path.abspath(__file__))
         
         # 數據文件路徑
         self.demand_file = os.path.join(self.base_path, "D usage_analysis", "4 clustor TOU.csv")
         self.supply_file = os.path.join(self.base_path, "G3.TOU_weighted_performance", "monthly_tou_averages_2025.csv")
+        self.profile_dir = os.path.join(self.base_path, "G2.weighted_performance")  # 10 分鐘發電表現
         
         # 約束條件（kW）
         self.constraints = {
@@ -31,6 +539,38 @@ class RenewableEnergyOptimizer:
             "ow": 3464.44 * 6.2    # 離岸風電
         }
         
+        # 是否顯示求解器輸出
+        self.solver_msg = True
+        
+        # cbc 與 highs 後端每次線性規劃求解的時間上限 (秒)，達到時狀態為 "Not Solved"；None 表示不限制
+        self.time_limit = None
+        
+        # 效能指標回呼: metrics_hook(metrics, scenario)，每次求解後呼叫
+        self.metrics_hook = None
+        
+        # 記錄效能指標時是否另外求解一次量測峰值記憶體 (tracemalloc 會拖慢求解，不與計時同時進行)
+        self.profile_memory = False
+        
+        # 儲能參數 (由 enable_storage 啟用，None 表示不含儲能)
+        self.storage = None
+        
+        # 容量區塊與最低採購量 (由 enable_capacity_blocks 啟用，None 表示連續容量)
+        self.capacity_blocks = None
+        
+        # 精確解法各場址類型累積的割平面
+        self.exact_cuts = {}
+        
+        # 各場址類型的常駐優化模型 (由 get_model 建立) 與建立時的數據指紋
+        self.models = {}
+        self._models_fingerprint = None
+        
+        # 是否以常駐模型作為 highs 後端 (只更新年用電量與目標值並熱啟動，例如常駐服務)
+        self.resident_models = False
+        
+        # 優化結果快取 (由 enable_cache 啟用)
+        self.cache = None
+        self._cache_data_fingerprint = None
+        
         # 載入數據
         self.load_data()
     
@@ -41,8 +581,298 @@ class RenewableEnergyOptimizer:
         # 載入需求數據
         self.demand_data = pd.read_csv(self.demand_file)
         
-        # 載入供應數據
-        self.supply_data = pd.read_csv(self.supply_file)
+        # 載入供應數據 (TOU 彙總表或 10 分鐘發電表現)
+        if self.resolution == "tou":
+            self.supply_data = pd.read_csv(self.supply_file)
+        else:
+            self.supply_data = load_performance_profiles(self.profile_dir)
+        
+        # 記錄檔案雜湊值與狀態，用於判斷數據是否改變
+        self.data_hashes = {path: hash_file(path) for path in self.data_files()}
+        self.data_signatures = {path: self._file_signature(path) for path in self.data_files()}
+        
+        # 對齊供需表
+        self.align_data()
+    
+    def data_files(self):
+        """
+        目前時間解析度使用的供需檔案路徑
+        """
+        if self.resolution == "tou":
+            return [self.demand_file, self.supply_file]
+        return [self.demand_file] + [os.path.join(self.profile_dir, name) for name in PROFILE_FILES.values()]
+    
+    @staticmethod
+    def _file_signature(path):
+        """
+        檔案的修改時間與大小
+        """
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def data_fingerprint(self):
+        """
+        計算供需檔案、約束條件與成本係數的合併指紋
+        
+        供需檔案在載入後被修改時會重新載入數據，使指紋隨之改變。
+        
+        返回:
+        str: 數據指紋
+        """
+        if any(self._file_signature(path) != signature for path, signature in self.data_signatures.items()):
+            self.load_data()
+        return hash_object([
+            self.resolution,
+            [self.data_hashes[path] for path in self.data_files()],
+            self.constraints,
+            self.cost_coefficients,
+            self.storage,
+            self.capacity_blocks
+        ])
+    
+    def enable_storage(self, **parameters):
+        """
+        在組合優化中加入儲能，回收各時段的餘電於之後的時段使用
+        
+        儲能使相鄰時段互相耦合，只適用於依時間順序排列的每小時或 10 分鐘解析度。
+        模型規模約為不含儲能時的 2.5 倍且無法使用精確解法 (exact 後端改以 STORAGE_SOLVER 求解)；
+        每小時解析度一次求解約需 1 分鐘，10 分鐘解析度超過 25 分鐘，建議使用每小時解析度，
+        並可設定 time_limit 限制求解時間。
+        
+        參數:
+        **parameters: 覆寫 DEFAULT_STORAGE_PARAMETERS 中的 cost、charge_efficiency、
+                      discharge_efficiency、duration (小時) 或 max_capacity (kWh)
+        """
+        if self.resolution == "tou":
+            raise ValueError("儲能需要依時間順序排列的時段，請使用 hourly 或 10min 解析度")
+        if getattr(self, "representative_days", None) is not None:
+            raise ValueError("代表日縮減後的時段不相鄰，無法加入儲能，請在全年優化器上啟用")
+        unknown = set(parameters) - set(DEFAULT_STORAGE_PARAMETERS)
+        if unknown:
+            raise ValueError(f"不支援的儲能參數: {', '.join(sorted(unknown))}")
+        self.storage = {**DEFAULT_STORAGE_PARAMETERS, **parameters}
+    
+    def enable_capacity_blocks(self, block_sizes=None, min_sizes=None, time_limit=DEFAULT_MIP_OPTIONS["time_limit"],
+                               mip_rel_gap=DEFAULT_MIP_OPTIONS["mip_rel_gap"]):
+        """
+        以合約區塊採購容量 (整數規劃)
+        
+        啟用後 optimize_portfolio 一律以程序內 HiGHS 的分支定界法求解，並在時間上限內
+        返回目前最佳的可行解與已證明的最佳性差距，不會無限期等待。
+        
+        參數:
+        block_sizes (dict): 各技術的區塊大小 (kW)，例如 {"ow": 100000}；容量須為區塊大小的整數倍
+        min_sizes (dict): 各技術的最低採購量 (kW)；容量須為 0 或不低於最低採購量
+        time_limit (float): 每次求解的時間上限 (秒)
+        mip_rel_gap (float): 可接受的相對最佳性差距，達到即停止
+        """
+        block_sizes, min_sizes = dict(block_sizes or {}), dict(min_sizes or {})
+        unknown = (set(block_sizes) | set(min_sizes)) - set(TECHNOLOGIES)
+        if unknown:
+            raise ValueError(f"不支援的技術代號: {', '.join(sorted(unknown))}")
+        if any(value < 0 for value in list(block_sizes.values()) + list(min_sizes.values())):
+            raise ValueError("區塊大小與最低採購量不可為負數")
+        if time_limit <= 0 or mip_rel_gap < 0:
+            raise ValueError("時間上限須為正數，最佳性差距不可為負數")
+        self.capacity_blocks = {
+            "block_size": {tech: float(block_sizes.get(tech, 0.0)) for tech in TECHNOLOGIES},
+            "min_size": {tech: float(min_sizes.get(tech, 0.0)) for tech in TECHNOLOGIES},
+            "time_limit": float(time_limit),
+            "mip_rel_gap": float(mip_rel_gap)
+        }
+    
+    def block_lp_parameters(self):
+        """
+        轉換為 build_portfolio_lp 的 blocks 參數 (未啟用容量區塊時為 None)
+        """
+        if self.capacity_blocks is None:
+            return None
+        return {key: np.array([self.capacity_blocks[key][tech] for tech in TECHNOLOGIES])
+                for key in ["block_size", "min_size"]}
+    
+    def storage_lp_parameters(self):
+        """
+        轉換為 build_portfolio_lp 的儲能參數 (未啟用儲能時為 None)
+        """
+        if self.storage is None:
+            return None
+        slot_hours = SLOT_MINUTES[self.resolution] / 60
+        return {
+            "cost": self.storage["cost"],
+            "charge_efficiency": self.storage["charge_efficiency"],
+            "discharge_efficiency": self.storage["discharge_efficiency"],
+            "power_ratio": slot_hours / self.storage["duration"],
+            "max_capacity": self.storage["max_capacity"]
+        }
+    
+    def enable_cache(self, max_entries=256, path=None, max_age=None):
+        """
+        啟用優化結果快取
+        
+        持久化檔案中此優化器數據來源 (時間解析度與供需檔案) 先前數據版本的結果會立即清除，
+        包括上一次執行程序時寫入的結果。
+        
+        參數:
+        max_entries (int): 記憶體 LRU 最多保留的結果數
+        path (str): SQLite 持久化檔案路徑，None 表示只使用記憶體
+        max_age (float): 持久化結果的最長保留秒數，None 表示不依時間清除
+        
+        返回:
+        OptimizationCache: 快取物件
+        """
+        self.cache = OptimizationCache(max_entries=max_entries, path=path)
+        self._cache_data_fingerprint = None
+        if max_age is not None:
+            self.cache.prune(max_age=max_age)
+        self._cache_fingerprint()
+        return self.cache
+    
+    def _cache_fingerprint(self):
+        """
+        目前的數據指紋；數據改變時清除此數據來源先前數據版本的快取結果
+        """
+        data_fingerprint = self.data_fingerprint()
+        if data_fingerprint != self._cache_data_fingerprint:
+            self.cache.update_data_version(hash_object([self.resolution, self.data_files()]), data_fingerprint)
+            self._cache_data_fingerprint = data_fingerprint
+        return data_fingerprint
+    
+    def align_data(self):
+        """
+        將供應與需求表依 (month, tou) 對齊為 NumPy 陣列
+        
+        只保留兩表都有的時段，順序與供應表相同；需求表重複的時段取第一筆。
+        每小時與 10 分鐘解析度下，供應取自 10 分鐘發電表現，需求由 (month, tou)
+        的用電占比平均分配到各時段。
+        """
+        if self.resolution != "tou":
+            self.bucket_index, self.supply_matrix, self.demand_matrix = build_high_resolution_matrices(
+                self.supply_data, self.demand_data, [str(t) for t in SITE_TYPES], self.resolution
+            )
+            return
+        
+        demand = self.demand_data.drop_duplicates(["month", "tou"])
+        merged = self.supply_data.merge(demand, on=["month", "tou"], how="inner", sort=False)
+        
+        self.bucket_index = merged[["month", "tou"]].reset_index(drop=True)
+        self.supply_matrix = merged[SUPPLY_COLUMNS].to_numpy(dtype=float)  # (n, 4) kWh/kW
+        self.demand_matrix = merged[[str(t) for t in SITE_TYPES]].to_numpy(dtype=float)  # (n, 4) 需求歸一化係數
+    
+    def build_lp(self, site_type, annual_consumption, re_target):
+        """
+        建立指定場址類型的組合優化線性規劃 (稀疏矩陣形式)
+        
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        re_target (float): 可再生能源目標值 (kWh)
+        
+        返回:
+        dict: build_portfolio_lp 的輸出
+        """
+        demand = self.demand_vector(site_type, annual_consumption)
+        return build_portfolio_lp(self.supply_matrix, demand, self.cost_vector(), self.capacity_vector(), re_target,
+                                  storage=self.storage_lp_parameters())
+    
+    def demand_vector(self, site_type, annual_consumption):
+        """
+        各對齊時段的實際需求 (kWh)
+        """
+        return annual_consumption * self.demand_matrix[:, SITE_TYPES.index(site_type)]
+    
+    def cost_vector(self):
+        """
+        依 TECHNOLOGIES 順序的成本係數 (NTD/kW)
+        """
+        return np.array([self.cost_coefficients[tech] for tech in TECHNOLOGIES], dtype=float)
+    
+    def capacity_vector(self):
+        """
+        依 TECHNOLOGIES 順序的容量上限 (kW)
+        """
+        return np.array([self.constraints[f"{tech}_max"] for tech in TECHNOLOGIES], dtype=float)
+    
+    def check_feasibility(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+        """
+        不呼叫求解器檢查目標是否可在容量上限內達成
+        
+        參數與 optimize_portfolio 相同。
+        
+        返回:
+        dict: feasibility_precheck 的輸出，另附 max_ratio (可達成的最大目標比例, 百分比)
+        """
+        re_target = self.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        check = feasibility_precheck(self.supply_matrix, self.demand_vector(site_type, annual_consumption),
+                                     self.capacity_vector(), re_target)
+        check["max_ratio"] = target_ratio * check["max_achievable"] / re_target if re_target > 0 else 0.0
+        return check
+    
+    def evaluate_portfolio(self, capacities, site_type, annual_consumption, per_bucket=False):
+        """
+        不呼叫求解器，直接計算給定容量組合的供應、實際使用量、餘電與成本
+        
+        每個時段的實際使用量為 min(供應, 需求)，全部以陣列運算完成；可一次評估數千個
+        候選組合，組合數與時段數的乘積超過 EVALUATION_CHUNK_ELEMENTS 時分批計算。
+        不含儲能 (餘電不會移到其他時段)。
+        
+        參數:
+        capacities (array-like or dict): (4,) 或 (k, 4) 依 TECHNOLOGIES 順序的容量 (kW)，
+                                         或技術代號對應容量的 dict (未列出的技術為 0)
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        per_bucket (bool): 是否另外返回各時段的 supply、matched 與 surplus
+        
+        返回:
+        dict: total_supply、matched_energy、total_surplus (kWh)、total_cost (NTD)、
+              unit_cost (每 kWh 實際使用量的成本, NTD/kWh)、coverage (實際使用量 / 總需求)
+              與 surplus_ratio；輸入為單一組合時為 float，否則為 (k,) np.ndarray。
+              per_bucket 為 True 時另有 bucket_supply、bucket_matched 與 bucket_surplus ((n,) 或 (k, n) kWh)
+        """
+        if isinstance(capacities, dict):
+            unknown = sorted(set(capacities) - set(TECHNOLOGIES))
+            if unknown:
+                raise ValueError(f"未知的技術代號: {unknown}")
+            capacities = [capacities.get(tech, 0.0) for tech in TECHNOLOGIES]
+        capacities = np.asarray(capacities, dtype=float)
+        single = capacities.ndim == 1
+        capacities = np.atleast_2d(capacities)
+        if capacities.ndim != 2 or capacities.shape[1] != len(TECHNOLOGIES):
+            raise ValueError(f"容量須為 ({len(TECHNOLOGIES)},) 或 (k, {len(TECHNOLOGIES)}) 的陣列")
+        if (capacities < 0).any():
+            raise ValueError("容量不可為負數")
+        
+        demand = self.demand_vector(site_type, annual_consumption)
+        k, n = len(capacities), len(demand)
+        total_supply, matched_total = np.empty(k), np.empty(k)
+        buckets = {"bucket_supply": [], "bucket_matched": [], "bucket_surplus": []}
+        size = max(1, EVALUATION_CHUNK_ELEMENTS // max(n, 1))
+        for start in range(0, k, size):
+            supply = capacities[start:start + size] @ self.supply_matrix.T  # (chunk, n)
+            matched = np.minimum(supply, demand)
+            total_supply[start:start + size] = supply.sum(axis=1)
+            matched_total[start:start + size] = matched.sum(axis=1)
+            if per_bucket:
+                buckets["bucket_supply"].append(supply)
+                buckets["bucket_matched"].append(matched)
+                buckets["bucket_surplus"].append(supply - matched)
+        
+        total_cost = capacities @ self.cost_vector()
+        total_surplus = total_supply - matched_total
+        total_demand = demand.sum()
+        result = {
+            "total_supply": total_supply,  # 總發電量 (kWh)
+            "matched_energy": matched_total,  # 實際使用量 (kWh)
+            "total_surplus": total_surplus,  # 總餘電量 (kWh)
+            "total_cost": total_cost,  # 總成本 (NTD)
+            "unit_cost": np.divide(total_cost, matched_total, out=np.zeros(k), where=matched_total > 0),
+            "coverage": matched_total / total_demand if total_demand > 0 else np.zeros(k),  # 實際使用量 / 總需求
+            "surplus_ratio": np.divide(total_surplus, total_supply, out=np.zeros(k), where=total_supply > 0)
+        }
+        if per_bucket:
+            result.update({key: np.concatenate(chunks) for key, chunks in buckets.items()})
+        if single:
+            result = {key: float(value[0]) if value.ndim == 1 else value[0] for key, value in result.items()}
+        return result
     
     def calculate_renewable_target(self, annual_consumption, target_ratio, target_year, growth_rate):
         """
@@ -61,7 +891,8 @@ class RenewableEnergyOptimizer:
         target = annual_consumption * (target_ratio / 100) * (1 + growth_rate / 100) ** years
         return target
     
-    def optimize_portfolio(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+    def optimize_portfolio(self, site_type, annual_consumption, target_ratio, target_year, growth_rate,
+                           instrument=False):
         """
         優化可再生能源組合
         
@@ -71,113 +902,387 @@ class RenewableEnergyOptimizer:
         target_ratio (float): 可再生能源目標比例 (百分比)
         target_year (int): 目標年份 (2026-2050)
         growth_rate (float): 年度用電增長率 (百分比)
+        instrument (bool): 是否在結果中附上 instrumentation 效能指標 (快取命中時不附)
         
         返回:
         dict: 優化結果
         """
-        # 計算可再生能源目標值
+        scenario = (site_type, annual_consumption, target_ratio, target_year, growth_rate)
+        return self._cached_solve(scenario, instrument)
+    
+    def _cached_solve(self, scenario, instrument=False, site_demand=None, sites=None):
+        """
+        經過結果快取求解 (未啟用快取時直接求解)，啟用快取時結果附上 cache_hit
+        
+        參數:
+        scenario (tuple): 依 SCENARIO_FIELDS 順序的參數
+        instrument (bool): 是否在結果中附上 instrumentation 效能指標 (快取命中時不附)
+        site_demand (np.ndarray): 多場址合併時 (n, k) 各場址在各時段的需求，見 _solve_portfolio
+        sites (list): 多場址合併時依順序的 (場址類型, 年度用電量)，作為快取鍵的一部分
+        """
+        if self.cache is None:
+            return self._solve_portfolio(*scenario, instrument=instrument, site_demand=site_demand)
+        
+        data_fingerprint = self._cache_fingerprint()
+        key = request_fingerprint(*scenario, data_fingerprint, self.solver, self.storage, self.capacity_blocks,
+                                  sites=sites)
+        result = self.cache.get(key)
+        if result is not None:
+            result["cache_hit"] = True
+            return result
+        
+        result = self._solve_portfolio(*scenario, instrument=instrument, site_demand=site_demand)
+        self.cache.put(key, {k: v for k, v in result.items() if k != "instrumentation"}, data_fingerprint)
+        result["cache_hit"] = False
+        return result
+    
+    def optimize_sites(self, sites, target_ratio, target_year, growth_rate, instrument=False):
+        """
+        將同一買家的多個場址合併為一個需求，以一次優化求解共同的可再生能源組合
+        
+        合併需求為各場址類型的 TOU 需求因子乘上各自的用電量後加總，目標值以總用電量計算。
+        各場址分得的實際使用量為每個時段的合併實際使用量依該時段各場址需求比例分配
+        (含儲能時，放電供應的電量以相同方式分配)。啟用快取時與 optimize_portfolio 相同經過
+        結果快取 (快取鍵包含各場址的類型與用電量)，結果附上 cache_hit。
+        
+        參數:
+        sites (list of dict or pd.DataFrame): 每個場址需包含 site_type 與 annual_consumption
+        target_ratio (float): 可再生能源目標比例 (百分比)
+        target_year (int): 目標年份 (2026-2050)
+        growth_rate (float): 年度用電增長率 (百分比)
+        instrument (bool): 是否在結果中附上 instrumentation 效能指標
+        
+        返回:
+        dict: 與 optimize_portfolio 相同格式的合併結果，最佳解時另附 sites
+              (各場址的 site_type、annual_consumption、matched_energy (kWh)、
+              matched_share (佔總實際使用量比例) 與 coverage (實際使用量 / 該場址年度需求))
+        """
+        sites = pd.DataFrame(sites, columns=["site_type", "annual_consumption"])
+        if sites.empty:
+            raise ValueError("至少需要一個場址")
+        unknown = sorted(set(sites["site_type"]) - set(SITE_TYPES))
+        if unknown:
+            raise ValueError(f"未知的場址類型: {unknown}")
+        consumption = sites["annual_consumption"].to_numpy(dtype=float)
+        if (consumption < 0).any():
+            raise ValueError("年度用電量不可為負數")
+        
+        # 各場址的需求向量: 需求因子矩陣的對應欄位一次乘上各場址用電量 (n, k)
+        site_types = sites["site_type"].astype(int).tolist()
+        site_demand = self.demand_matrix[:, site_types] * consumption
+        
+        scenario = (tuple(sorted(set(site_types))), float(consumption.sum()), target_ratio, target_year, growth_rate)
+        result = self._cached_solve(scenario, instrument, site_demand=site_demand,
+                                    sites=list(zip(site_types, consumption.tolist())))
+        if "site_matched" not in result:
+            return result
+        
+        # 快取命中時 site_matched 為 JSON 還原的 list
+        matched = np.asarray(result.pop("site_matched"), dtype=float)
+        total_matched = matched.sum()
+        annual_demand = site_demand.sum(axis=0)
+        result["sites"] = [
+            {
+                "site_type": site_type,
+                "annual_consumption": float(consumption[k]),
+                "matched_energy": float(matched[k]),  # 分得的實際使用量 (kWh)
+                "matched_share": float(matched[k] / total_matched) if total_matched > 0 else 0.0,
+                "coverage": float(matched[k] / annual_demand[k]) if annual_demand[k] > 0 else 0.0
+            }
+            for k, site_type in enumerate(site_types)
+        ]
+        return result
+    
+    def _solve_portfolio(self, site_type, annual_consumption, target_ratio, target_year, growth_rate,
+                         instrument=False, site_demand=None):
+        """
+        建立並求解優化問題 (不經過快取)，參數與返回同 optimize_portfolio
+        
+        提供 site_demand ((n, k) 各場址在各時段的需求) 時以其總和作為需求向量，
+        並在結果中附上 site_matched: 各場址依需求比例分得的實際使用量 (kWh)。
+        
+        求解前先以 feasibility_precheck 檢查目標是否可達成，不可行時直接返回並附上
+        feasibility (缺口與綁定的容量上限)。
+        
+        instrument 為 True 或設定了 metrics_hook 時，記錄各階段時間 (對齊、預檢、建模、求解、
+        結果整理)、模型規模、求解器狀態與迭代次數。各階段時間在未啟用 tracemalloc 的情況下量測；
+        profile_memory 為 True 時另以 tracemalloc 重新求解一次記錄 Python 端的峰值記憶體
+        (呼叫端已在追蹤記憶體時不干擾其追蹤，記為 None)。
+        """
+        scenario = (site_type, annual_consumption, target_ratio, target_year, growth_rate)
+        result, metrics = self._run_portfolio(*scenario, site_demand=site_demand)
+        if instrument or self.metrics_hook is not None:
+            metrics["peak_memory_bytes"] = self._peak_memory(scenario, site_demand) if self.profile_memory else None
+            if self.metrics_hook is not None:
+                self.metrics_hook(metrics, dict(zip(SCENARIO_FIELDS, scenario)))
+            if instrument:
+                result["instrumentation"] = metrics
+        return result
+    
+    def _peak_memory(self, scenario, site_demand):
+        """
+        以 tracemalloc 重新求解一次，返回 Python 端的峰值記憶體 (bytes)
+        
+        呼叫端已在追蹤記憶體時返回 None，不重設或停止不是由此方法啟動的追蹤。
+        """
+        if tracemalloc.is_tracing():
+            return None
+        tracemalloc.start()
+        try:
+            self._run_portfolio(*scenario, site_demand=site_demand)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    
+    def _run_portfolio(self, site_type, annual_consumption, target_ratio, target_year, growth_rate,
+                       site_demand=None):
+        """
+        _solve_portfolio 的求解流程
+        
+        返回:
+        tuple: (結果 dict, 效能指標 dict (不含峰值記憶體))
+        """
+        phases = {}
+        stats = {}
+        
+        # 計算可再生能源目標值與需求向量
+        start = time.perf_counter()
         re_target = self.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        if site_demand is None:
+            demand = self.demand_vector(site_type, annual_consumption)
+        else:
+            demand = site_demand.sum(axis=1)
+        cost, capacity = self.cost_vector(), self.capacity_vector()
+        phases["alignment"] = time.perf_counter() - start
+        
+        # 可行性預檢 (儲能可將餘電移到其他時段，容量全開的實際使用量不再是上限)
+        precheck = None
+        if self.storage is None:
+            start = time.perf_counter()
+            precheck = feasibility_precheck(self.supply_matrix, demand, capacity, re_target)
+            phases["precheck"] = time.perf_counter() - start
         
-        # 創建優化問題
-        prob = plp.LpProblem("RenewableEnergyPortfolioOptimization", plp.LpMinimize)
-        
-        # 決策變數
-        s_prime = plp.LpVariable("s_prime", 0, self.constraints["s_max"])  # 太陽能容量 (kW)
-        w_prime = plp.LpVariable("w_prime", 0, self.constraints["w_max"])  # 陸上風電容量 (kW)
-        h_prime = plp.LpVariable("h_prime", 0, self.constraints["h_max"])  # 小水電容量 (kW)
-        ow_prime = plp.LpVariable("ow_prime", 0, self.constraints["ow_max"])  # 離岸風電容量 (kW)
-        
-        # 目標函數: 最小化總採購成本
-        prob += (s_prime * self.cost_coefficients["s"] + 
-                 w_prime * self.cost_coefficients["w"] + 
-                 h_prime * self.cost_coefficients["h"] + 
-                 ow_prime * self.cost_coefficients["ow"])
-        
-        # 計算實際用電需求和可再生能源供應
-        total_re_used = 0
-        surplus_variables = []  # 用於存儲所有的餘電變數
-        
-        # 處理每個月和TOU時段的供需匹配
-        for _, supply_row in self.supply_data.iterrows():
-            month = supply_row['month']
-            tou = supply_row['tou']
+        if precheck is not None and not precheck["feasible"]:
+            # 目標超過容量上限內的最大實際使用量，不需呼叫求解器
+            phases["build"] = phases["solve"] = 0.0
+            status = 'Infeasible'
+            stats.update(iterations=None, solver_status="Precheck infeasible")
+            size = {"n_variables": None, "n_constraints": None, "nonzeros": None}
+            start = time.perf_counter()
+        elif self.solver == "exact" and self.storage is None and self.capacity_blocks is None:
+            # 精確解法不建立線性規劃 (含儲能或容量區塊時改以線性規劃求解)
+            phases["build"] = 0.0
+            start = time.perf_counter()
+            status, capacities, self.exact_cuts[site_type] = solve_portfolio_exact(
+                self.supply_matrix, demand, cost, capacity, re_target, cuts=self.exact_cuts.get(site_type)
+            )
+            phases["solve"] = time.perf_counter() - start
+            stats.update(iterations=None, solver_status=status)
+            size = {"n_variables": len(TECHNOLOGIES), "n_constraints": len(self.exact_cuts[site_type]),
+                    "nonzeros": None}
             
-            # 找到對應的需求數據
-            demand_row = self.demand_data[(self.demand_data['month'] == month) & 
-                                         (self.demand_data['tou'] == tou)]
+            start = time.perf_counter()
+            if status == 'Optimal':
+                # 總餘電量 = 總發電量 - 實際使用量
+                total_surplus = max(float((self.supply_matrix @ capacities).sum()) - re_target, 0.0)
+                matched = matched_energy(self.supply_matrix, demand, capacities)
+        else:
+            # 建立優化問題 (常駐模型只更新年用電量與目標值)
+            start = time.perf_counter()
+            model = None
+            if (self.resident_models and self.solver == "highs" and self.capacity_blocks is None
+                    and site_demand is None):
+                model = self.get_model(site_type, annual_consumption, re_target)
+                model.set_annual_consumption(annual_consumption)
+                model.set_re_target(re_target)
+                lp = model.lp
+            else:
+                lp = build_portfolio_lp(self.supply_matrix, demand, cost, capacity, re_target,
+                                        storage=self.storage_lp_parameters(), blocks=self.block_lp_parameters())
+            phases["build"] = time.perf_counter() - start
+            matrices = [lp["A_eq"]] + ([lp["A_ub"]] if lp.get("A_ub") is not None else [])
+            size = {"n_variables": lp["A_eq"].shape[1],
+                    "n_constraints": sum(A.shape[0] for A in matrices),
+                    "nonzeros": sum(int(A.nnz) for A in matrices)}
             
-            if not demand_row.empty:
-                # 需求歸一化係數
-                demand_factor = float(demand_row[str(site_type)].values[0])
-                
-                # 計算實際需求
-                actual_demand = annual_consumption * demand_factor
-                
-                # 供應量 (kWh)
-                supply = (s_prime * supply_row['SAP_kWh'] + 
-                          w_prime * supply_row['WAP_kWh'] + 
-                          h_prime * supply_row['HAP_kWh'] + 
-                          ow_prime * supply_row['OWAP_kWh'])
-                
-                # 實際使用的可再生能源 = min(供應, 需求)
-                # 由於我們不能在PuLP中直接使用min函數，因此使用額外的變數和約束
-                actual_re_used = plp.LpVariable(f"actual_re_used_{month}_{tou}", 0, None)
-                surplus = plp.LpVariable(f"surplus_{month}_{tou}", 0, None)
-                
-                # 記錄餘電變數
-                surplus_variables.append(surplus)
-                
-                # 約束: actual_re_used + surplus = supply
-                prob += actual_re_used + surplus == supply
-                
-                # 約束: actual_re_used <= actual_demand
-                prob += actual_re_used <= actual_demand
+            # 解決優化問題 (容量區塊以 HiGHS 分支定界法求解，常駐模型由前一次的基底熱啟動)
+            if model is not None:
+                status, values = model.run(stats, time_limit=self.time_limit)
+            elif self.capacity_blocks is None:
+                status, values, _ = self.solve_lp(lp, stats)
+            else:
+                from portfolio_model import solve_mip_highs
                 
-                # 累加實際使用的可再生能源
-                total_re_used += actual_re_used
-        
-        # 約束: 總實際使用的可再生能源必須等於可再生能源目標
-        prob += total_re_used == re_target
-        
-        # 解決優化問題
-        prob.solve()
+                status, values, mip_gap = solve_mip_highs(lp, self.capacity_blocks["time_limit"],
+                                                          self.capacity_blocks["mip_rel_gap"], stats)
+            phases["build"] += stats["build"]
+            phases["solve"] = stats["solve"]
+            
+            # 計算總餘電量
+            start = time.perf_counter()
+            if status in ('Optimal', 'Incumbent'):
+                n, m = lp["n_buckets"], lp["n_units"]
+                capacities, total_surplus = values[:m], values[m + n:m + 2 * n].sum()
+                matched = values[m:m + n]
+                if lp["storage"]:
+                    storage_values = values[m + 2 * n:m + 5 * n + 1]
+                    # 餘電含儲能充放電損失，即總發電量 - 目標值
+                    total_surplus += storage_values[1:n + 1].sum() - storage_values[n + 1:2 * n + 1].sum()
+                    # 儲能放電同樣供應該時段的需求
+                    matched = matched + storage_values[n + 1:2 * n + 1]
         
-        # 檢查解決方案狀態
-        if plp.LpStatus[prob.status] != 'Optimal':
-            return {
-                "status": plp.LpStatus[prob.status],
+        # 檢查解決方案狀態並整理結果
+        if status not in ('Optimal', 'Incumbent'):
+            result = {
+                "status": status,
                 "message": "無法找到最佳解決方案"
             }
+            if precheck is not None and not precheck["feasible"]:
+                result["feasibility"] = precheck  # 最大實際使用量、缺口與綁定的容量上限
+        else:
+            result = format_result(capacities, cost, re_target, total_surplus)
+            if self.storage is not None:
+                add_storage_result(result, storage_values, self.storage)
+            if site_demand is not None:
+                # 各時段的實際使用量依各場址在該時段的需求比例分配
+                share = np.divide(matched, demand, out=np.zeros(len(demand)), where=demand > 0)
+                result["site_matched"] = share @ site_demand
+        if self.capacity_blocks is not None and status in ('Optimal', 'Incumbent'):
+            result["mip_gap"] = mip_gap  # 已證明的相對最佳性差距
+            if status == 'Incumbent':
+                # 時間上限內未證明最佳，返回目前最佳的可行解
+                result["status"] = "時間上限內的可行解"
+                result["message"] = f"最佳性差距 {mip_gap:.2%}"
+        phases["extraction"] = time.perf_counter() - start
+        result["build_time"] = phases["build"]  # 模型建立時間 (秒)
+        result["solve_time"] = phases["solve"]  # 求解時間 (秒)
+        
+        metrics = {
+            "phases": phases,
+            "total_time": sum(phases.values()),
+            **size,
+            "solver": self.solver,
+            "solver_status": stats["solver_status"],
+            "iterations": stats["iterations"],
+            "status": status
+        }
+        return result, metrics
+    
+    def solve_lp(self, lp, stats=None):
+        """
+        以此優化器選用的求解器後端求解稀疏矩陣形式的線性規劃
+        
+        精確解法只適用於 optimize_portfolio 的 4 技術問題，其他線性規劃
+        (例如參數分析) 在 "exact" 後端下改以程序內 HiGHS 求解，含儲能的線性規劃改以
+        較快的 STORAGE_SOLVER 求解。求解時間以 time_limit 為上限。
         
-        # 計算總成本
-        total_cost = (s_prime.value() * self.cost_coefficients["s"] + 
-                      w_prime.value() * self.cost_coefficients["w"] + 
-                      h_prime.value() * self.cost_coefficients["h"] + 
-                      ow_prime.value() * self.cost_coefficients["ow"])
+        參數:
+        lp (dict): build_portfolio_lp 的輸出
+        stats (dict): 若提供，由求解器後端寫入各階段時間、迭代次數與原始狀態
         
-        # 計算總餘電量
-        total_surplus = sum(surplus.value() for surplus in surplus_variables)
+        返回:
+        tuple: (PuLP 狀態字串, 變數值 np.ndarray 或 None, 等式約束對偶值 np.ndarray 或 None)
+        """
+        solver = self.solver
+        if solver == "exact":
+            solver = STORAGE_SOLVER if lp.get("storage") else "highs"
+        if solver == "cbc":
+            return solve_lp_cbc(lp, msg=self.solver_msg, stats=stats, time_limit=self.time_limit)
+        return solve_lp_highs(lp, stats=stats, time_limit=self.time_limit)
+    
+    def get_model(self, site_type, annual_consumption=0.0, re_target=0.0):
+        """
+        取得指定場址類型的常駐優化模型，第一次呼叫時建立
         
-        # 計算總採購量 (總發電量)
-        total_generation = re_target + total_surplus
+        供需數據、約束條件、成本係數、儲能或容量區塊設定改變 (數據指紋不同) 時，
+        先前建立的模型全部捨棄並重新建立。
         
-        # 計算餘電比例
-        surplus_ratio = total_surplus / total_generation if total_generation > 0 else 0
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 建立模型時的年度用電量 (kWh)
+        re_target (float): 建立模型時的可再生能源目標值 (kWh)
         
-        # 返回結果
-        return {
-            "status": "最佳解決方案找到",
-            "s_prime": s_prime.value(),  # 太陽能容量 (kW)
-            "w_prime": w_prime.value(),  # 陸上風電容量 (kW)
-            "h_prime": h_prime.value(),  # 小水電容量 (kW)
-            "ow_prime": ow_prime.value(),  # 離岸風電容量 (kW)
-            "total_cost": total_cost,  # 總成本 (NTD)
-            "re_target": re_target,  # 可再生能源目標 (kWh)
-            "unit_cost": total_cost / re_target if re_target > 0 else 0,  # 單位成本 (NTD/kWh)
-            "total_surplus": total_surplus,  # 總餘電量 (kWh)
-            "total_generation": total_generation,  # 總發電量 (kWh)
-            "surplus_ratio": surplus_ratio  # 餘電比例
-        }
+        返回:
+        PortfolioModel: 可修改參數並熱啟動重新求解的模型
+        """
+        from portfolio_model import PortfolioModel
+        
+        data_fingerprint = self.data_fingerprint()
+        if data_fingerprint != self._models_fingerprint:
+            self.models = {}
+            self._models_fingerprint = data_fingerprint
+        if site_type not in self.models:
+            self.models[site_type] = PortfolioModel(self, site_type, annual_consumption, re_target)
+        return self.models[site_type]
+    
+    def sensitivity_analysis(self, site_type, annual_consumption, target_ratio, target_year, growth_rate):
+        """
+        求解一次並附上對偶值與範圍分析，取代多次重新求解的有限差分
+        
+        參數與 optimize_portfolio 相同。
+        
+        返回:
+        dict: 與 optimize_portfolio 相同格式的結果，最佳解時另附 sensitivity
+              (PortfolioModel.sensitivity 的輸出，加上 marginal_cost_per_percent:
+              目標比例每增加 1 個百分點的邊際成本)
+        """
+        re_target = self.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        model = self.get_model(site_type, annual_consumption, re_target)
+        model.set_cost_coefficients(self.cost_coefficients)
+        model.set_constraints(self.constraints)
+        model.set_annual_consumption(annual_consumption)
+        model.set_re_target(re_target)
+        
+        result = model.solve()
+        if result["status"] != "最佳解決方案找到":
+            return result
+        sensitivity = model.sensitivity()
+        sensitivity["marginal_cost_per_percent"] = (
+            sensitivity["target_dual"] * re_target / target_ratio if target_ratio > 0 else 0.0
+        )
+        result["sensitivity"] = sensitivity
+        return result
+    
+    def optimize_batch(self, scenarios, max_workers=None, chunk_size=None):
+        """
+        以多個工作程序批次求解多個情境
+        
+        每個工作程序只載入一次供需數據，並沿用本優化器的約束條件與成本係數。
+        
+        參數:
+        scenarios (pd.DataFrame or list of dict): 每個情境需包含 SCENARIO_FIELDS 欄位
+        max_workers (int): 工作程序數量，預設為 CPU 核心數
+        chunk_size (int): 每次派送給工作程序的情境數量，預設自動決定
+        
+        返回:
+        pd.DataFrame: 依輸入順序排列的欄位式結果，每列附有 status 與 message
+        """
+        scenarios = pd.DataFrame(scenarios, columns=SCENARIO_FIELDS).reset_index(drop=True)
+        rows = list(zip(
+            scenarios["site_type"].astype(int),
+            scenarios["annual_consumption"].astype(float),
+            scenarios["target_ratio"].astype(float),
+            scenarios["target_year"].astype(int),
+            scenarios["growth_rate"].astype(float)
+        ))
+        if not rows:
+            return scenarios.reindex(columns=SCENARIO_FIELDS + BATCH_RESULT_FIELDS)
+        
+        max_workers = max_workers or os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = max(1, len(rows) // (max_workers * 4))
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_batch_worker,
+            initargs=(self.demand_file, self.supply_file, self.profile_dir, self.constraints,
+                      self.cost_coefficients, self.solver, self.resolution, self.storage, self.capacity_blocks)
+        ) as executor:
+            results = [result for chunk in executor.map(_solve_batch_chunk, chunks) for result in chunk]
+        
+        columns = {field: [result.get(field) for result in results] for field in BATCH_RESULT_FIELDS}
+        return pd.concat([scenarios, pd.DataFrame(columns)], axis=1)
     
     def run_interactive(self):
         """
@@ -244,6 +1349,8 @@ class RenewableEnergyOptimizer:
         print(f"總餘電量: {result['total_surplus']:.2f} kWh")
         print(f"總發電量: {result['total_generation']:.2f} kWh")
         print(f"餘電比例: {result['surplus_ratio']:.2%}")
+        print(f"\n建模時間: {result['build_time']:.4f} 秒")
+        print(f"求解時間: {result['solve_time']:.4f} 秒")
 
 def main():
     optimizer = RenewableEnergyOptimizer()
@@ -0,0 +1,196 @@
+import copy
+import numpy as np
+import time
+from scipy.cluster.vq import kmeans2
+
+from high_resolution_profiles import SLOT_MINUTES
+from optimization_cache import hash_object
+from portfolio_exact_solver import matched_energy
+from renewable_energy_optimization import SITE_TYPES, TECHNOLOGIES, RenewableEnergyOptimizer
+
+
+def daily_features(supply_matrix, demand_matrix, slots_per_day):
+    """
+    將供需矩陣整理為每日的形狀特徵
+
+    每一天為一列，依序串接各技術的供應曲線與各場址類型的需求曲線；
+    每個欄位除以全年平均，使不同技術與需求的尺度一致。
+
+    參數:
+    supply_matrix (np.ndarray): (n, m) 每 kW 容量在各時段的發電量 (kWh)
+    demand_matrix (np.ndarray): (n, k) 各場址類型的需求歸一化係數
+    slots_per_day (int): 每天的時段數
+
+    返回:
+    np.ndarray: (天數, slots_per_day x (m + k)) 每日特徵
+    """
+    profiles = np.hstack([supply_matrix, demand_matrix])
+    scale = profiles.mean(axis=0)
+    scale[scale == 0] = 1.0
+    profiles = profiles / scale
+    n_days = len(profiles) // slots_per_day
+    return profiles.reshape(n_days, slots_per_day * profiles.shape[1])
+
+
+def select_representative_days(optimizer, n_days=12, seed=0):
+    """
+    以 k-means 分群每日供需形狀，選出加權的代表日
+
+    每個群集取最接近群集中心的實際日期作為代表日，權重為群集內的天數。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 每小時或 10 分鐘解析度的優化器
+    n_days (int): 代表日數量
+    seed (int): k-means 初始化的亂數種子
+
+    返回:
+    tuple: (代表日索引 np.ndarray, 權重 np.ndarray，總和為全年天數)
+    """
+    if optimizer.resolution not in SLOT_MINUTES:
+        raise ValueError("代表日只適用於每小時或 10 分鐘解析度的優化器")
+    slots_per_day = 24 * 60 // SLOT_MINUTES[optimizer.resolution]
+    features = daily_features(optimizer.supply_matrix, optimizer.demand_matrix, slots_per_day)
+
+    centroids, labels = kmeans2(features, n_days, seed=seed, minit="++")
+    days, weights = [], []
+    for k in range(len(centroids)):
+        members = np.flatnonzero(labels == k)
+        if members.size == 0:
+            continue
+        distances = np.linalg.norm(features[members] - centroids[k], axis=1)
+        days.append(members[np.argmin(distances)])
+        weights.append(members.size)
+    order = np.argsort(days)
+    return np.asarray(days)[order], np.asarray(weights, dtype=float)[order]
+
+
+def reduce_to_representative_days(optimizer, n_days=12, seed=0):
+    """
+    建立只包含代表日時段的優化器
+
+    代表日各時段的供應與需求乘以權重; 因 min(w·a, w·b) = w·min(a, b)，
+    縮減後的問題等同於將每一天以其代表日取代的全年問題。各技術的供應與各場址
+    類型的需求再依欄位校正，使全年總量與原始數據相同。
+    儲能的蓄電量逐時段遞推，會把互不相鄰且加權的代表日串接在一起，因此不支援啟用儲能的優化器。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 每小時或 10 分鐘解析度的優化器
+    n_days (int): 代表日數量
+    seed (int): k-means 初始化的亂數種子
+
+    返回:
+    RenewableEnergyOptimizer: 供需矩陣已縮減的優化器 (另附 representative_days 與 day_weights)
+    """
+    if optimizer.storage is not None:
+        raise ValueError("代表日之間不相鄰，儲能的蓄電量無法跨日遞推，請先停用儲能 (storage = None)")
+    days, weights = select_representative_days(optimizer, n_days, seed)
+    slots_per_day = 24 * 60 // SLOT_MINUTES[optimizer.resolution]
+    rows = (days[:, None] * slots_per_day + np.arange(slots_per_day)).ravel()
+    row_weights = np.repeat(weights, slots_per_day)[:, None]
+
+    supply = optimizer.supply_matrix[rows] * row_weights
+    demand = optimizer.demand_matrix[rows] * row_weights
+
+    reduced = copy.copy(optimizer)
+    # 約束條件與成本係數等設定各自獨立，修改縮減後的優化器不影響原優化器
+    for name in ("constraints", "cost_coefficients", "capacity_blocks"):
+        setattr(reduced, name, copy.deepcopy(getattr(optimizer, name)))
+    reduced.bucket_index = optimizer.bucket_index.iloc[rows].reset_index(drop=True)
+    reduced.supply_matrix = supply * _column_scale(optimizer.supply_matrix, supply)
+    reduced.demand_matrix = demand * _column_scale(optimizer.demand_matrix, demand)
+    reduced.representative_days = days
+    reduced.day_weights = weights
+
+    # 數據指紋描述縮減後的數據 (原始檔案、代表日與權重)；縮減數據為快照，不隨檔案變更重新載入
+    reduction = ["representative_days", n_days, seed, days, weights]
+    reduced.data_hashes = {path: hash_object([digest, reduction]) for path, digest in optimizer.data_hashes.items()}
+    reduced.data_signatures = {}
+
+    # 縮減後的模型不能共用原優化器的快取、割平面與常駐模型
+    reduced.exact_cuts = {}
+    reduced.models = {}
+    reduced.cache = None
+    reduced._cache_data_fingerprint = None
+    return reduced
+
+
+def _column_scale(full, reduced):
+    """
+    使縮減後各欄位總和等於原始總和的校正係數
+    """
+    totals = reduced.sum(axis=0)
+    return np.divide(full.sum(axis=0), totals, out=np.ones_like(totals), where=totals > 0)
+
+
+def evaluate_reduction(optimizer, n_days_list=(4, 8, 12, 24), scenarios=None, seed=0):
+    """
+    比較代表日縮減與全解析度的優化結果
+
+    對每個代表日數量與情境，記錄總成本的相對誤差、縮減解的容量在全解析度
+    數據下實際達成的目標比例，以及求解時間與加速倍數。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 每小時或 10 分鐘解析度的優化器
+    n_days_list (tuple): 代表日數量
+    scenarios (list): (site_type, annual_consumption, target_ratio, target_year, growth_rate)，
+                      None 時使用預設情境
+    seed (int): k-means 初始化的亂數種子
+
+    返回:
+    list: 每個代表日數量與情境一筆的比較結果 dict
+    """
+    if scenarios is None:
+        scenarios = [(site_type, 1e8, ratio, 2030, 2) for site_type in SITE_TYPES for ratio in (30, 60, 80)]
+
+    full_results = []
+    for scenario in scenarios:
+        start = time.perf_counter()
+        full_results.append((optimizer.optimize_portfolio(*scenario), time.perf_counter() - start))
+
+    records = []
+    for n_days in n_days_list:
+        reduced = reduce_to_representative_days(optimizer, n_days, seed)
+        for scenario, (full, full_time) in zip(scenarios, full_results):
+            start = time.perf_counter()
+            result = reduced.optimize_portfolio(*scenario)
+            reduced_time = time.perf_counter() - start
+
+            record = {
+                "n_days": len(reduced.representative_days),
+                "site_type": scenario[0],
+                "target_ratio": scenario[2],
+                "status": result["status"],
+                "full_status": full["status"],
+                "full_time": full_time,
+                "reduced_time": reduced_time,
+                "speedup": full_time / reduced_time
+            }
+            if "total_cost" in result and "total_cost" in full:
+                capacities = np.array([result[f"{tech}_prime"] for tech in TECHNOLOGIES])
+                demand = optimizer.demand_vector(scenario[0], scenario[1])
+                achieved = matched_energy(optimizer.supply_matrix, demand, capacities).sum()
+                record["cost_error"] = (result["total_cost"] - full["total_cost"]) / full["total_cost"]
+                record["target_achieved"] = float(achieved / result["re_target"])
+            records.append(record)
+    return records
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="highs", resolution="hourly")
+    records = evaluate_reduction(optimizer)
+
+    print("=" * 80)
+    print("代表日縮減誤差 (每小時解析度)")
+    print("=" * 80)
+    for n_days in sorted({record["n_days"] for record in records}):
+        group = [record for record in records if record["n_days"] == n_days]
+        solved = [record for record in group if "cost_error" in record]
+        print(f"代表日 {n_days:>3} 天: 中位加速 {np.median([r['speedup'] for r in group]):.1f}x，"
+              f"狀態不一致 {sum(r['status'] != r['full_status'] for r in group)} 筆")
+        if solved:
+            print(f"    成本誤差 最大 {max(abs(r['cost_error']) for r in solved):.2%}，"
+                  f"全解析度下實際達成目標 最低 {min(r['target_achieved'] for r in solved):.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import numpy as np
+import os
+import pandas as pd
+import time
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import linprog
+
+from portfolio_exact_solver import solve_portfolio_exact
+from renewable_energy_optimization import (
+    LINPROG_STATUS, SCENARIO_FIELDS, SITE_TYPES, TECHNOLOGIES, RenewableEnergyOptimizer
+)
+
+# 定價工作程序內的供需數據 (每個程序只傳送一次)
+_pricing_data = None
+
+
+def _init_pricing_worker(supply_matrix, demand_matrix, capacity):
+    """
+    初始化定價工作程序: 保存供需矩陣與容量上限
+    """
+    global _pricing_data
+    _pricing_data = (supply_matrix, demand_matrix, capacity)
+
+
+def _price_buyers(tasks):
+    """
+    在工作程序中依序求解一組買家的定價子問題
+
+    參數:
+    tasks (list): 每個元素為 (site_type, annual_consumption, re_target, 成本係數, 割平面)
+
+    返回:
+    list: 每個買家的 (狀態, 容量, 更新後的割平面)
+    """
+    supply_matrix, demand_matrix, capacity = _pricing_data
+    results = []
+    for site_type, annual_consumption, re_target, cost, cuts in tasks:
+        demand = annual_consumption * demand_matrix[:, SITE_TYPES.index(site_type)]
+        results.append(solve_portfolio_exact(supply_matrix, demand, cost, capacity, re_target, cuts=cuts))
+    return results
+
+
+class SharedCapacityAllocator:
+    def __init__(self, optimizer=None, max_workers=None):
+        """
+        初始化多買家共享容量上限的聯合優化 (Dantzig-Wolfe 分解)
+
+        constraints 中的容量上限代表市場可供應的總容量，由所有買家共同分配:
+        min Σ_b cost·x_b s.t. 各買家的實際使用量達成目標，Σ_b x_b <= 容量上限。
+        主問題以各買家提出的容量方案的凸組合分配共享容量，以 linprog 求解；
+        定價子問題為各買家以 成本 - 容量對偶值 求解的單一買家問題
+        (portfolio_exact_solver 的割平面法)，由多個工作程序平行求解。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供供需數據、約束條件與成本係數
+        max_workers (int): 定價工作程序數量，預設為 CPU 核心數；1 表示在同一程序內求解
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def _solve_master(self, columns, owners, n_buyers, capacity, cost, phase_one):
+        """
+        求解限制主問題
+
+        第一階段以彈性變數 e (超出容量上限的量) 的總和為目標，e 降為 0 後
+        第二階段固定 e = 0 並以總成本為目標。
+
+        返回:
+        tuple: (狀態, 各方案權重, 彈性變數, 主問題目標值, 容量對偶值 π <= 0, 買家凸組合對偶值 μ)
+        """
+        X = np.array(columns)
+        n_columns, m = X.shape
+        finite = np.flatnonzero(np.isfinite(capacity))
+
+        # 變數: [各方案權重 λ, 各有限容量上限的彈性變數 e]
+        if phase_one:
+            c = np.concatenate([np.zeros(n_columns), np.ones(len(finite))])
+            bounds = [(0, None)] * (n_columns + len(finite))
+        else:
+            c = np.concatenate([X @ cost, np.zeros(len(finite))])
+            bounds = [(0, None)] * n_columns + [(0, 0)] * len(finite)
+        A_ub = np.hstack([X[:, finite].T, -np.eye(len(finite))])
+        A_eq = np.zeros((n_buyers, n_columns + len(finite)))
+        A_eq[owners, np.arange(n_columns)] = 1.0
+        res = linprog(c, A_ub=A_ub, b_ub=capacity[finite], A_eq=A_eq, b_eq=np.ones(n_buyers),
+                      bounds=bounds, method="highs")
+        status = LINPROG_STATUS.get(res.status, "Undefined")
+        if status != "Optimal":
+            return status, None, None, None, None, None
+
+        prices = np.zeros(m)
+        prices[finite] = res.ineqlin.marginals
+        return status, res.x[:n_columns], res.x[n_columns:], res.fun, prices, res.eqlin.marginals
+
+    def solve(self, buyers, tolerance=1e-6, max_iterations=200):
+        """
+        聯合求解所有買家的採購組合
+
+        參數:
+        buyers (pd.DataFrame or list of dict): 每個買家需包含 SCENARIO_FIELDS 欄位
+        tolerance (float): 主問題目標值與拉格朗日下界的相對差距低於此值時停止
+        max_iterations (int): 最大欄生成迭代次數
+
+        返回:
+        tuple: (pd.DataFrame: 每個買家的容量、成本與單位成本,
+                dict: status、total_cost、lower_bound、gap、iterations、solve_time、
+                      capacity_used (kW) 與 capacity_price (各容量上限的對偶值, NTD/kW；容量不足時為 None))
+        """
+        start = time.perf_counter()
+        buyers = pd.DataFrame(buyers, columns=SCENARIO_FIELDS).reset_index(drop=True)
+        n_buyers = len(buyers)
+        if n_buyers == 0:
+            raise ValueError("至少需要一個買家")
+        optimizer = self.optimizer
+        cost, capacity = optimizer.cost_vector(), optimizer.capacity_vector()
+        re_targets = np.array([
+            optimizer.calculate_renewable_target(row.annual_consumption, row.target_ratio, row.target_year,
+                                                 row.growth_rate)
+            for row in buyers.itertuples()
+        ])
+        scenarios = list(zip(buyers["site_type"].astype(int), buyers["annual_consumption"].astype(float), re_targets))
+        cuts = [None] * n_buyers
+
+        workers = min(self.max_workers, n_buyers)
+        executor = None
+        if workers > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_pricing_worker,
+                initargs=(optimizer.supply_matrix, optimizer.demand_matrix, capacity)
+            )
+        else:
+            _init_pricing_worker(optimizer.supply_matrix, optimizer.demand_matrix, capacity)
+
+        def price(prices, objective=cost):
+            tasks = [(site_type, consumption, re_target, objective - prices, cut)
+                     for (site_type, consumption, re_target), cut in zip(scenarios, cuts)]
+            if executor is None:
+                return _price_buyers(tasks)
+            size = max(1, -(-n_buyers // workers))
+            chunks = [tasks[i:i + size] for i in range(0, n_buyers, size)]
+            return [result for chunk in executor.map(_price_buyers, chunks) for result in chunk]
+
+        try:
+            # 初始方案: 各買家不考慮其他買家時的最佳容量
+            columns, owners = [], []
+            for b, (status, x, cuts[b]) in enumerate(price(np.zeros(len(TECHNOLOGIES)))):
+                if status != "Optimal":
+                    raise ValueError(f"買家 {b} 即使獨占容量上限也無法達成目標 (狀態為 {status})")
+                columns.append(x)
+                owners.append(b)
+
+            phase_one, proven_infeasible, lower_bound, iterations = True, False, -np.inf, 0
+            finite = np.isfinite(capacity)
+            scale = max(float(capacity[finite].sum()), 1.0)
+            for iterations in range(1, max_iterations + 1):
+                status, weights, elastic, upper_bound, prices, convexity = self._solve_master(
+                    columns, owners, n_buyers, capacity, cost, phase_one)
+                if status != "Optimal":
+                    break
+                if phase_one and upper_bound <= tolerance * scale:
+                    # 方案的凸組合已滿足共享容量上限，進入第二階段
+                    phase_one = False
+                    continue
+
+                # 定價: 以 (成本) - 容量對偶值 求解各買家，拉格朗日對偶提供目前階段目標值的下界
+                objective = np.zeros(len(cost)) if phase_one else cost
+                priced = price(prices, objective)
+                dual_bound = float(prices[finite] @ capacity[finite])
+                new_columns = 0
+                for b, (pricing_status, x, cuts[b]) in enumerate(priced):
+                    if pricing_status != "Optimal":
+                        # 定價未收斂時此輪下界無效
+                        dual_bound = -np.inf
+                        continue
+                    reduced = (objective - prices) @ x
+                    dual_bound += reduced
+                    if reduced - convexity[b] < -tolerance * max(abs(convexity[b]), 1.0):
+                        columns.append(x)
+                        owners.append(b)
+                        new_columns += 1
+
+                if phase_one:
+                    if new_columns == 0 or dual_bound > tolerance * scale:
+                        # 下界為正: 任何分配都超出共享容量上限
+                        proven_infeasible = True
+                        break
+                    continue
+                lower_bound = max(lower_bound, dual_bound)
+                if new_columns == 0 or upper_bound - lower_bound <= tolerance * max(abs(upper_bound), 1.0):
+                    break
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if status == "Optimal" and phase_one and not proven_infeasible:
+            # 迭代次數用盡時仍未找到滿足共享容量上限的分配
+            status = "Not Solved"
+        if status != "Optimal":
+            summary = {"status": status, "message": "無法找到最佳解決方案", "iterations": iterations,
+                       "solve_time": time.perf_counter() - start}
+            return buyers.assign(status=status), summary
+
+        # 各買家的容量為其方案的凸組合 (凸組合仍滿足該買家的目標)
+        # (最後一輪定價新增的方案尚未進入主問題)
+        X = np.array(columns[:len(weights)])
+        allocation = np.zeros((n_buyers, len(TECHNOLOGIES)))
+        np.add.at(allocation, owners[:len(weights)], weights[:, None] * X)
+        shortage = phase_one
+
+        table = buyers.copy()
+        table["status"] = "Infeasible" if shortage else "Optimal"
+        for j, tech in enumerate(TECHNOLOGIES):
+            table[f"{tech}_prime"] = allocation[:, j]
+        table["re_target"] = re_targets
+        table["total_cost"] = allocation @ cost
+        table["unit_cost"] = np.divide(table["total_cost"], re_targets, out=np.zeros(n_buyers), where=re_targets > 0)
+
+        summary = {
+            "status": "Infeasible" if shortage else "Optimal",
+            "message": "共享容量不足以達成所有買家的目標" if shortage else "最佳解決方案找到",
+            "total_cost": float(table["total_cost"].sum()),
+            "lower_bound": None if shortage else float(lower_bound),
+            "gap": None if shortage else float(max(upper_bound - lower_bound, 0.0) / abs(upper_bound)) if upper_bound else 0.0,
+            "capacity_excess": float(np.sum(elastic)),  # 超出共享容量上限的總量 (kW)，可行時為 0
+            "iterations": iterations,
+            "n_columns": len(columns),
+            "solve_time": time.perf_counter() - start,
+            "capacity_used": dict(zip(TECHNOLOGIES, allocation.sum(axis=0).tolist())),  # 分配的總容量 (kW)
+            # 共享容量的稀缺價格 (NTD/kW)；容量不足時對偶值來自第一階段 (缺口) 問題，不具價格意義
+            "capacity_price": None if shortage else dict(zip(TECHNOLOGIES, (-prices).tolist()))
+        }
+        return table, summary
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer()
+    rng = np.random.default_rng(0)
+    n_buyers = 200
+    buyers = pd.DataFrame({
+        "site_type": rng.choice(SITE_TYPES, n_buyers),
+        "annual_consumption": rng.uniform(1e6, 2e7, n_buyers),
+        "target_ratio": rng.choice([30, 50, 60, 70], n_buyers),
+        "target_year": 2030,
+        "growth_rate": 2.0
+    })
+
+    table, summary = SharedCapacityAllocator(optimizer).solve(buyers)
+    print("=" * 60)
+    print(f"{n_buyers} 個買家共享容量上限: {summary['message']}")
+    print("=" * 60)
+    if summary["gap"] is not None:
+        print(f"總成本: {summary['total_cost']:,.0f} NTD (最佳性差距 {summary['gap']:.2e})")
+    print(f"欄生成迭代: {summary['iterations']} 次，耗時 {summary['solve_time']:.2f} 秒")
+    for tech in TECHNOLOGIES:
+        price = summary["capacity_price"]
+        print(f"{tech:>3}: 分配 {summary['capacity_used'][tech]:>12,.0f} kW / 上限 "
+              f"{optimizer.constraints[f'{tech}_max']:>10,} kW" +
+              (f"，稀缺價格 {price[tech]:,.2f} NTD/kW" if price is not None else ""))
+
+
+if __name__ == "__main__":
+    main()
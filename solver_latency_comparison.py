@@ -0,0 +1,69 @@
+import itertools
+import numpy as np
+import time
+
+from renewable_energy_optimization import RenewableEnergyOptimizer, SITE_TYPES
+
+
+def compare_solver_latency(repeats=5, consumptions=(1e7, 1e8, 1e9), target_ratios=(20, 50, 80)):
+    """
+    比較 CBC (外部程序) 與 HiGHS (程序內) 兩種求解器後端的延遲
+
+    對每個情境重複求解，並檢查兩種後端的狀態與總成本一致。
+
+    參數:
+    repeats (int): 每個情境重複求解次數
+    consumptions (tuple): 年度用電量 (kWh)
+    target_ratios (tuple): 可再生能源目標比例 (百分比)
+
+    返回:
+    dict: 各後端的延遲統計 (毫秒) 與結果不一致的情境數
+    """
+    scenarios = list(itertools.product(SITE_TYPES, consumptions, target_ratios))
+    optimizers = {
+        "cbc": RenewableEnergyOptimizer(solver="cbc"),
+        "highs": RenewableEnergyOptimizer(solver="highs")
+    }
+    optimizers["cbc"].solver_msg = False
+
+    latencies = {name: [] for name in optimizers}
+    mismatches = 0
+    for site_type, consumption, ratio in scenarios:
+        results = {}
+        for name, optimizer in optimizers.items():
+            for _ in range(repeats):
+                start = time.perf_counter()
+                results[name] = optimizer.optimize_portfolio(site_type, consumption, ratio, 2030, 2)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+        cbc, highs = results["cbc"], results["highs"]
+        if cbc["status"] != highs["status"] or (
+                "total_cost" in cbc and not np.isclose(cbc["total_cost"], highs["total_cost"], rtol=1e-6)):
+            mismatches += 1
+
+    summary = {
+        name: {
+            "median_ms": float(np.median(values)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "mean_ms": float(np.mean(values))
+        }
+        for name, values in latencies.items()
+    }
+    summary["scenarios"] = len(scenarios)
+    summary["mismatches"] = mismatches
+    return summary
+
+
+def main():
+    summary = compare_solver_latency()
+    print("=" * 60)
+    print("求解器後端延遲比較")
+    print("=" * 60)
+    for name in ["cbc", "highs"]:
+        stats = summary[name]
+        print(f"{name:>6}: 中位數 {stats['median_ms']:.2f} ms, P95 {stats['p95_ms']:.2f} ms, 平均 {stats['mean_ms']:.2f} ms")
+    print(f"\n加速倍數 (中位數): {summary['cbc']['median_ms'] / summary['highs']['median_ms']:.1f}x")
+    print(f"情境數: {summary['scenarios']}，結果不一致: {summary['mismatches']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.cluster.vq import kmeans2
+
+from high_resolution_profiles import SLOT_MINUTES, load_facility_year_profiles, slot_calendar
+from renewable_energy_optimization import TECHNOLOGIES, RenewableEnergyOptimizer, format_result
+
+# 隨機優化的目標模式: 期望值達成目標，或以 CVaR 要求最差情境的平均短缺不超過 0
+STOCHASTIC_MODES = ["expectation", "cvar"]
+
+
+def bucket_aggregation(optimizer):
+    """
+    將全年 10 分鐘時段加總到優化器時段的稀疏矩陣
+
+    TOU 解析度下依 (month, tou) 對應；優化器沒有的 (month, tou) 時段不計入，
+    與 align_data 只保留供需兩表都有的時段一致。
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 提供時段索引的優化器
+
+    返回:
+    sp.csr_matrix: (優化器時段數, 52560) 0/1 加總矩陣
+    """
+    calendar = slot_calendar("10min")
+    n_slots = len(calendar)
+    if optimizer.resolution in SLOT_MINUTES:
+        rows = np.arange(n_slots) // (SLOT_MINUTES[optimizer.resolution] // 10)
+        if rows[-1] + 1 != len(optimizer.bucket_index):
+            raise ValueError("優化器的時段不是完整的全年時段 (例如代表日縮減後的優化器)")
+        return sp.csr_matrix((np.ones(n_slots), (rows, np.arange(n_slots))), shape=(rows[-1] + 1, n_slots))
+
+    keys = {(int(month), tou): i for i, (month, tou) in
+            enumerate(optimizer.bucket_index[["month", "tou"]].itertuples(index=False))}
+    rows = np.array([keys.get((month, tou), -1) for month, tou in zip(calendar["month"], calendar["tou"])])
+    cols = np.flatnonzero(rows >= 0)
+    return sp.csr_matrix((np.ones(cols.size), (rows[cols], cols)), shape=(len(keys), n_slots))
+
+
+def resample_scenarios(year_supply, months, n_samples=200, seed=0):
+    """
+    以月份為區塊重新抽樣歷史年份，產生供應情境
+
+    每個樣本對每個技術的每個月份獨立抽選一個歷史年份，以陣列索引一次建立所有樣本。
+
+    參數:
+    year_supply (np.ndarray): (年份數, n, m) 各歷史年份每 kW 的時段發電量 (kWh)
+    months (np.ndarray): (n,) 各時段的月份 (1-12)
+    n_samples (int): 抽樣數
+    seed (int): 亂數種子
+
+    返回:
+    np.ndarray: (n_samples, n, m) 供應情境
+    """
+    n_years, n, m = year_supply.shape
+    rng = np.random.default_rng(seed)
+    choice = rng.integers(n_years, size=(n_samples, 12, m))  # 每個樣本、月份、技術選用的年份
+    years = choice[:, np.asarray(months) - 1, :]  # (n_samples, n, m)
+    return year_supply[years, np.arange(n)[None, :, None], np.arange(m)[None, None, :]]
+
+
+def reduce_scenarios(scenarios, n_scenarios=10, seed=0):
+    """
+    以 k-means 將供應情境縮減為少數代表情境
+
+    每個群集取最接近群集中心的實際情境，機率為群集內情境的比例。
+
+    參數:
+    scenarios (np.ndarray): (S, n, m) 供應情境
+    n_scenarios (int): 代表情境數量
+    seed (int): k-means 初始化的亂數種子
+
+    返回:
+    tuple: (代表情境索引 np.ndarray, 機率 np.ndarray)
+    """
+    features = scenarios.reshape(len(scenarios), -1)
+    scale = features.mean(axis=0)
+    scale[scale == 0] = 1.0
+    features = features / scale
+
+    centroids, labels = kmeans2(features, min(n_scenarios, len(scenarios)), seed=seed, minit="++")
+    indices, counts = [], []
+    for k in range(len(centroids)):
+        members = np.flatnonzero(labels == k)
+        if members.size == 0:
+            continue
+        indices.append(members[np.argmin(np.linalg.norm(features[members] - centroids[k], axis=1))])
+        counts.append(members.size)
+    return np.asarray(indices), np.asarray(counts, dtype=float) / len(scenarios)
+
+
+def build_stochastic_lp(scenarios, probabilities, demand, cost, capacity, re_target, mode="expectation", alpha=0.9):
+    """
+    建立多情境的擴展式 (extensive form) 線性規劃
+
+    容量 x 為所有情境共用的第一階段決策；每個情境 k 有自己的實際使用量 u_k 與餘電 s_k:
+    u_ki + s_ki - supply_ki · x = 0。
+    expectation 模式: Σ_k p_k Σ_i u_ki >= re_target。
+    cvar 模式: 以短缺 L_k = re_target - Σ_i u_ki 的 CVaR_alpha(L) <= 0 作為
+    「在 alpha 比例的情境下達成目標」的保守線性近似:
+    η + Σ_k p_k ξ_k / (1 - alpha) <= 0，ξ_k >= L_k - η，ξ_k >= 0。
+
+    參數:
+    scenarios (np.ndarray): (K, n, m) 每 kW 容量在各情境各時段的發電量 (kWh)
+    probabilities (np.ndarray): (K,) 情境機率
+    demand (np.ndarray): (n,) 各時段實際需求 (kWh)
+    cost (np.ndarray): (m,) 各技術成本係數 (NTD/kW)
+    capacity (np.ndarray): (m,) 各技術容量上限 (kW)
+    re_target (float): 可再生能源目標值 (kWh)
+    mode (str): "expectation" 或 "cvar"
+    alpha (float): cvar 模式的信心水準
+
+    返回:
+    dict: 與 build_portfolio_lp 相同格式 (另有 A_ub、b_ub、n_scenarios 與 variable_names)
+    """
+    if mode not in STOCHASTIC_MODES:
+        raise ValueError(f"不支援的目標模式: {mode}，請選擇 {STOCHASTIC_MODES}")
+    scenarios = np.asarray(scenarios, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    K, n, m = scenarios.shape
+    kn = K * n
+    rows = np.arange(kn)
+    u, s = m + rows, m + kn + rows
+
+    # 各情境供需平衡列
+    A_eq = sp.csr_matrix((
+        np.concatenate([-scenarios.ravel(), np.ones(2 * kn)]),
+        (np.concatenate([np.repeat(rows, m), rows, rows]),
+         np.concatenate([np.tile(np.arange(m), kn), u, s]))
+    ), shape=(kn, m + 2 * kn))
+
+    c = np.concatenate([np.asarray(cost, dtype=float), np.zeros(2 * kn)])
+    lb = np.zeros(m + 2 * kn)
+    ub = np.concatenate([np.asarray(capacity, dtype=float), np.tile(demand, K), np.full(kn, np.inf)])
+    names = [f"actual_re_used_{k}_{i}" for k in range(K) for i in range(n)] + \
+            [f"surplus_{k}_{i}" for k in range(K) for i in range(n)]
+
+    scenario_of = np.repeat(np.arange(K), n)
+    if mode == "expectation":
+        A_ub = sp.csr_matrix((-probabilities[scenario_of], (np.zeros(kn, dtype=int), u)), shape=(1, m + 2 * kn))
+        b_ub = np.array([-re_target])
+    else:
+        # 附加變數 [η, ξ (K)]
+        eta, xi = m + 2 * kn, m + 2 * kn + 1 + np.arange(K)
+        n_vars = m + 2 * kn + 1 + K
+        A_eq = sp.hstack([A_eq, sp.csr_matrix((kn, K + 1))]).tocsr()
+        A_ub = sp.csr_matrix((
+            np.concatenate([-np.ones(kn), -np.ones(K), -np.ones(K), [1.0], probabilities / (1 - alpha)]),
+            (np.concatenate([scenario_of, np.arange(K), np.arange(K), [K], np.full(K, K)]),
+             np.concatenate([u, np.full(K, eta), xi, [eta], xi]))
+        ), shape=(K + 1, n_vars))
+        b_ub = np.concatenate([np.full(K, -re_target), [0.0]])
+        c = np.concatenate([c, np.zeros(K + 1)])
+        lb = np.concatenate([lb, [-np.inf], np.zeros(K)])
+        ub = np.concatenate([ub, np.full(K + 1, np.inf)])
+        names += ["shortfall_var"] + [f"shortfall_excess_{k}" for k in range(K)]
+
+    return {
+        "c": c,
+        "A_eq": A_eq.tocsr(),
+        "b_eq": np.zeros(kn),
+        "A_ub": A_ub,
+        "b_ub": b_ub,
+        "lb": lb,
+        "ub": ub,
+        "n_buckets": n,
+        "n_units": m,
+        "n_scenarios": K,
+        "storage": False,
+        "variable_names": names
+    }
+
+
+class StochasticPortfolioOptimizer:
+    def __init__(self, optimizer=None, n_samples=200, n_scenarios=10, seed=0, calibrate=True):
+        """
+        初始化多氣象年份的隨機組合優化器
+
+        由各案場的歷史年份欄位建立每年的供應曲線，加上以月份為區塊重新抽樣的
+        年份組合，再以 k-means 縮減為少數代表情境。
+
+        參數:
+        optimizer (RenewableEnergyOptimizer): 提供需求、時段與參數的優化器，None 時建立新的優化器
+        n_samples (int): 重新抽樣的情境數
+        n_scenarios (int): 縮減後的代表情境數
+        seed (int): 抽樣與分群的亂數種子
+        calibrate (bool): 是否將各技術的歷史年份供應縮放為與優化器相同的全年平均總量，
+                          使情境只反映年份間的變異 (案場平均與加權平均的水準不同)
+        """
+        self.optimizer = optimizer or RenewableEnergyOptimizer()
+        self.years, profiles = load_facility_year_profiles(self.optimizer.profile_dir)
+
+        # 每 kW 的 10 分鐘發電量加總到優化器時段: (年份數, n, 4)
+        aggregation = bucket_aggregation(self.optimizer)
+        slot_supply = profiles / 100 / 6
+        self.year_supply = np.stack([aggregation @ year for year in slot_supply])
+        if calibrate:
+            totals = self.year_supply.sum(axis=1).mean(axis=0)
+            scale = np.divide(self.optimizer.supply_matrix.sum(axis=0), totals,
+                              out=np.ones_like(totals), where=totals > 0)
+            self.year_supply = self.year_supply * scale
+
+        # 歷史年份 + 重新抽樣的年份組合
+        months = self.optimizer.bucket_index["month"].to_numpy(dtype=int)
+        self.samples = np.concatenate([self.year_supply,
+                                       resample_scenarios(self.year_supply, months, n_samples, seed)])
+        indices, self.probabilities = reduce_scenarios(self.samples, n_scenarios, seed)
+        self.scenarios = self.samples[indices]
+
+    def optimize(self, site_type, annual_consumption, target_ratio, target_year, growth_rate,
+                 mode="expectation", alpha=0.9):
+        """
+        求解擴展式線性規劃，取得在所有代表情境下共用的容量組合
+
+        參數:
+        site_type (int): 0-3 代表不同場址類型
+        annual_consumption (float): 2024年年度用電量 (kWh)
+        target_ratio (float): 可再生能源目標比例 (百分比)
+        target_year (int): 目標年份 (2026-2050)
+        growth_rate (float): 年度用電增長率 (百分比)
+        mode (str): "expectation" (期望值達成目標) 或 "cvar" (alpha 信心水準的 CVaR 近似)
+        alpha (float): cvar 模式的信心水準
+
+        返回:
+        dict: 與 optimize_portfolio 相同格式的結果 (餘電為期望值)，另附各代表情境與
+              全部抽樣情境下的目標達成率
+        """
+        optimizer = self.optimizer
+        re_target = optimizer.calculate_renewable_target(annual_consumption, target_ratio, target_year, growth_rate)
+        demand = optimizer.demand_vector(site_type, annual_consumption)
+        cost = optimizer.cost_vector()
+        lp = build_stochastic_lp(self.scenarios, self.probabilities, demand, cost,
+                                 optimizer.capacity_vector(), re_target, mode, alpha)
+
+        status, values, _ = optimizer.solve_lp(lp)
+        if status != 'Optimal':
+            return {
+                "status": status,
+                "message": "無法找到最佳解決方案"
+            }
+
+        capacities = values[:len(TECHNOLOGIES)]
+        generation = self.scenarios @ capacities  # (K, n)
+        expected_surplus = self.probabilities @ generation.sum(axis=1) - re_target
+        result = format_result(capacities, cost, re_target, max(expected_surplus, 0.0))
+
+        # 各情境實際使用量 / 目標值
+        scenario_ratio = np.minimum(generation, demand).sum(axis=1) / re_target
+        sample_ratio = np.minimum(self.samples @ capacities, demand).sum(axis=1) / re_target
+        result["mode"] = mode
+        result["alpha"] = alpha if mode == "cvar" else None
+        result["scenario_probabilities"] = self.probabilities.tolist()
+        result["scenario_target_ratio"] = scenario_ratio.tolist()
+        result["expected_target_ratio"] = float(self.probabilities @ scenario_ratio)
+        result["sample_target_probability"] = float(np.mean(sample_ratio >= 1 - 1e-6))  # 全部抽樣情境中達成目標的比例
+        result["sample_target_ratio_p10"] = float(np.percentile(sample_ratio, 10))
+        return result
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="highs")
+    stochastic = StochasticPortfolioOptimizer(optimizer)
+    print("=" * 60)
+    print(f"歷史年份: {stochastic.years}，抽樣情境 {len(stochastic.samples)} 個，"
+          f"代表情境 {len(stochastic.scenarios)} 個")
+    print("=" * 60)
+
+    deterministic = optimizer.optimize_portfolio(0, 1e8, 60, 2030, 2)
+    print(f"確定性模型 總成本: {deterministic['total_cost']:,.0f} NTD")
+    for mode, alpha in [("expectation", None), ("cvar", 0.8), ("cvar", 0.95)]:
+        result = stochastic.optimize(0, 1e8, 60, 2030, 2, mode=mode, alpha=alpha or 0.9)
+        if "total_cost" not in result:
+            print(f"{mode} {alpha}: {result['status']}")
+            continue
+        label = mode if alpha is None else f"{mode} (alpha={alpha})"
+        print(f"{label}: 總成本 {result['total_cost']:,.0f} NTD，"
+              f"抽樣情境達成率 {result['sample_target_probability']:.1%}，"
+              f"P10 目標達成 {result['sample_target_ratio_p10']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
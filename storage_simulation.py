@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import time
+
+from high_resolution_profiles import SLOT_MINUTES
+from renewable_energy_optimization import DEFAULT_STORAGE_PARAMETERS, TECHNOLOGIES, RenewableEnergyOptimizer
+
+
+def simulate_storage(supply, demand, storage_sizes, power, slot_hours,
+                     charge_efficiency=DEFAULT_STORAGE_PARAMETERS["charge_efficiency"],
+                     discharge_efficiency=DEFAULT_STORAGE_PARAMETERS["discharge_efficiency"],
+                     initial_soc=0.0):
+    """
+    以貪婪策略模擬多種儲能容量的充放電
+
+    每個時段先以發電供應需求，餘電在功率與剩餘容量限制內充入儲能，
+    不足時在功率與蓄電量限制內放電；所有儲能容量在同一次時間迴圈中以陣列同時計算。
+
+    參數:
+    supply (np.ndarray): (n,) 各時段發電量 (kWh)
+    demand (np.ndarray): (n,) 各時段需求 (kWh)
+    storage_sizes (np.ndarray): (k,) 儲能容量 (kWh)
+    power (np.ndarray): (k,) 儲能功率 (kW)
+    slot_hours (float): 每個時段的小時數
+    charge_efficiency (float): 充電效率
+    discharge_efficiency (float): 放電效率
+    initial_soc (float): 起始蓄電量占容量的比例
+
+    返回:
+    dict: 各儲能容量的 charged、recovered_surplus、residual_deficit 與 final_soc (皆為 (k,) 陣列, kWh)
+    """
+    supply = np.asarray(supply, dtype=float)
+    demand = np.asarray(demand, dtype=float)
+    sizes = np.asarray(storage_sizes, dtype=float)
+    step_limit = np.asarray(power, dtype=float) * slot_hours
+
+    surplus = np.maximum(supply - demand, 0.0)
+    deficit = np.maximum(demand - supply, 0.0)
+
+    soc = sizes * initial_soc
+    charged = np.zeros_like(sizes)
+    recovered = np.zeros_like(sizes)
+
+    # 只需模擬有餘電或有缺電的時段
+    for t in np.flatnonzero((surplus > 0) | (deficit > 0)):
+        if surplus[t] > 0:
+            charge = np.minimum(np.minimum(surplus[t], step_limit), (sizes - soc) / charge_efficiency)
+            soc += charge * charge_efficiency
+            charged += charge
+        else:
+            discharge = np.minimum(np.minimum(deficit[t], step_limit), soc * discharge_efficiency)
+            soc -= discharge / discharge_efficiency
+            recovered += discharge
+
+    return {
+        "charged": charged,
+        "recovered_surplus": recovered,
+        "residual_deficit": deficit.sum() - recovered,
+        "final_soc": soc
+    }
+
+
+def simulate_portfolio_storage(optimizer, result, site_type, annual_consumption, storage_sizes,
+                               duration=DEFAULT_STORAGE_PARAMETERS["duration"], **kwargs):
+    """
+    以 optimize_portfolio 的容量結果模擬多種儲能容量的餘電回收
+
+    參數:
+    optimizer (RenewableEnergyOptimizer): 每小時或 10 分鐘解析度的優化器
+    result (dict): optimize_portfolio 的結果 (需含 s_prime 等容量欄位)
+    site_type (int): 0-3 代表不同場址類型
+    annual_consumption (float): 2024年年度用電量 (kWh)
+    storage_sizes (array-like): 候選儲能容量 (kWh)
+    duration (float): 額定功率下充滿所需小時數，功率 = 容量 / duration
+    **kwargs: 傳給 simulate_storage 的效率與起始蓄電量參數
+
+    返回:
+    pd.DataFrame: 每個儲能容量一列，含回收餘電、剩餘缺電與達成的再生能源供應量
+    """
+    if optimizer.resolution not in SLOT_MINUTES:
+        raise ValueError("儲能模擬需要依時間順序排列的時段，請使用 hourly 或 10min 解析度")
+    capacities = np.array([result[f"{tech}_prime"] for tech in TECHNOLOGIES])
+    supply = optimizer.supply_matrix @ capacities
+    demand = optimizer.demand_vector(site_type, annual_consumption)
+    sizes = np.asarray(storage_sizes, dtype=float)
+
+    simulation = simulate_storage(supply, demand, sizes, sizes / duration,
+                                  SLOT_MINUTES[optimizer.resolution] / 60, **kwargs)
+    direct = np.minimum(supply, demand).sum()
+    return pd.DataFrame({
+        "storage_capacity": sizes,  # 儲能容量 (kWh)
+        "storage_power": sizes / duration,  # 儲能功率 (kW)
+        "storage_charged": simulation["charged"],  # 充入儲能的餘電 (kWh)
+        "recovered_surplus": simulation["recovered_surplus"],  # 儲能放電供應需求的電量 (kWh)
+        "residual_deficit": simulation["residual_deficit"],  # 仍未由再生能源供應的需求 (kWh)
+        "re_supplied": direct + simulation["recovered_surplus"]  # 再生能源實際供應量 (kWh)
+    })
+
+
+def main():
+    optimizer = RenewableEnergyOptimizer(solver="exact", resolution="10min")
+    site_type, annual_consumption = 0, 1e8
+    result = optimizer.optimize_portfolio(site_type, annual_consumption, 60, 2030, 2)
+    sizes = np.concatenate([[0.0], np.geomspace(1e2, 1e6, 299)])
+
+    start = time.perf_counter()
+    table = simulate_portfolio_storage(optimizer, result, site_type, annual_consumption, sizes)
+    elapsed = time.perf_counter() - start
+
+    print("=" * 60)
+    print(f"儲能容量篩選 ({len(sizes)} 種容量，10 分鐘解析度，耗時 {elapsed:.2f} 秒)")
+    print("=" * 60)
+    print(f"組合總餘電: {result['total_surplus']:,.0f} kWh")
+    for _, row in table.iloc[::30].iterrows():
+        print(f"容量 {row['storage_capacity']:>12,.0f} kWh: 回收 {row['recovered_surplus']:>14,.0f} kWh，"
+              f"剩餘缺電 {row['residual_deficit']:>14,.0f} kWh")
+
+
+if __name__ == "__main__":
+    main()